@@ -2,10 +2,11 @@ from flask import Blueprint, request, jsonify, current_app
 from backend.models import User, Student, Faculty, Course, CourseOffering, Enrollment, Prediction, Alert,AcademicTerm
 from backend.extensions import db
 from backend.models.alert import AlertType
-from backend.services import prediction_service
 from backend.utils.api import api_response, error_response
+from backend.utils.pagination import InvalidCursor, cached_count, invalidate_count, keyset_paginate
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.middleware.auth_middleware import admin_required
+from backend.middleware.jwt_middleware import invalidate_identity
 from werkzeug.security import generate_password_hash
 from sqlalchemy import desc, or_, func
 import logging
@@ -194,6 +195,8 @@ def get_users():
         search = request.args.get('search', '')
         user_type = request.args.get('user_type', '')
         status = request.args.get('status', '')
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'true').lower() == 'true'
         
         # Build query
         query = User.query
@@ -212,18 +215,18 @@ def get_users():
             is_active = status == 'active'
             query = query.filter(User.is_active == is_active)
         
-        # Order by created date if column exists, otherwise by user_id
-        try:
-            query = query.order_by(User.created_at.desc())
-        except:
-            query = query.order_by(User.user_id.desc())
-        
-        # Paginate
-        paginated = query.paginate(page=page, per_page=limit, error_out=False)
+        # Newest first; user_id follows creation order and is the keyset key
+        page_users, next_cursor = keyset_paginate(
+            query, [User.user_id], lambda user: (user.user_id,), limit,
+            cursor=cursor, offset=(max(page, 1) - 1) * limit
+        )
+        total = cached_count(
+            'admin_users', {'search': search, 'user_type': user_type, 'status': status}, query
+        ) if include_total else None
         
         # Format users
         users = []
-        for user in paginated.items:
+        for user in page_users:
             user_data = {
                 'user_id': user.user_id,
                 'username': user.username,
@@ -247,14 +250,19 @@ def get_users():
         return api_response(
             data={
                 'users': users,
-                'total': paginated.total,
+                'total': total,
+                'total_approximate': total is not None,
                 'current_page': page,
                 'per_page': limit,
-                'total_pages': paginated.pages
+                'total_pages': (total + limit - 1) // limit if total is not None and limit > 0 else None,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             },
             message="Users retrieved successfully"
         )
         
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"Error getting users: {str(e)}")
         return error_response("Failed to get users", 500)
@@ -375,6 +383,7 @@ def create_user():
             db.session.add(faculty)
         
         db.session.commit()
+        invalidate_count('admin_users')
         
         return api_response(
             data={'user_id': user.user_id},
@@ -421,6 +430,8 @@ def update_user(user_id):
             user.is_active = data['is_active']
         
         db.session.commit()
+        invalidate_identity(user_id)
+        invalidate_count('admin_users')
         
         return api_response(message="User updated successfully")
         
@@ -447,6 +458,8 @@ def update_user_status(user_id):
         if hasattr(user, 'is_active'):
             user.is_active = data['is_active']
             db.session.commit()
+            invalidate_identity(user_id)
+            invalidate_count('admin_users')
             status = "activated" if user.is_active else "deactivated"
             return api_response(message=f"User {status} successfully")
         else:
@@ -559,6 +572,29 @@ def update_system_config():
         logger.error(f"Error updating system config: {str(e)}")
         return error_response("Failed to update system configuration", 500)
 
+@admin_bp.route('/system/activity-buffer', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_activity_buffer_stats():
+    """Get activity tracker write buffer counters"""
+    try:
+        from backend.middleware.activity_tracker import get_activity_buffer
+        
+        buffer = get_activity_buffer()
+        if not buffer:
+            return api_response(
+                data={'enabled': False},
+                message="Activity write buffer is disabled"
+            )
+        
+        stats = buffer.get_stats()
+        stats['enabled'] = True
+        return api_response(data=stats, message="Activity buffer stats retrieved successfully")
+        
+    except Exception as e:
+        logger.error(f"Error getting activity buffer stats: {str(e)}")
+        return error_response("Failed to get activity buffer stats", 500)
+
 # Helper functions
 def format_time_ago(timestamp):
     """Format timestamp as 'X time ago'"""
@@ -714,6 +750,7 @@ def resolve_alert(alert_id):
     try:
         user_id = get_jwt_identity()
         alert_service.resolve_alert(alert_id, resolved_by=str(user_id))
+        invalidate_count('admin_alerts')
         
         return api_response({
             'id': alert_id,
@@ -749,8 +786,8 @@ def get_alert_stats():
         return error_response('Failed to fetch alert statistics', 500)
     
     
-def paginated_response(data, page, per_page, total, message='Success'):
-    """Create a paginated response"""
+def paginated_response(data, page, per_page, total, message='Success', next_cursor=None):
+    """Create a paginated response; total is an approximate cached count, or None when not requested"""
     return jsonify({
         'status': 'success',
         'message': message,
@@ -759,7 +796,10 @@ def paginated_response(data, page, per_page, total, message='Success'):
             'page': page,
             'per_page': per_page,
             'total': total,
-            'pages': (total + per_page - 1) // per_page if per_page > 0 else 0
+            'total_approximate': total is not None,
+            'pages': (total + per_page - 1) // per_page if total is not None and per_page > 0 else None,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         }
     })
 
@@ -804,6 +844,8 @@ def get_system_alerts():
         severity = request.args.get('severity', None)
         status = request.args.get('status', None)
         search = request.args.get('search', None)
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('include_total', 'true').lower() == 'true'
         
         # Build query with proper joins - return all entities
         query = db.session.query(Alert, Enrollment, Student, User, CourseOffering, Course, AlertType).join(
@@ -836,15 +878,22 @@ def get_system_alerts():
                 )
             )
         
-        # Order by triggered date (newest first)
-        query = query.order_by(desc(Alert.triggered_date))
-        
-        # Paginate
-        pagination = query.paginate(page=page, per_page=limit, error_out=False)
+        # Newest first, with alert_id as the unique tie-breaker
+        rows, next_cursor = keyset_paginate(
+            query,
+            [Alert.triggered_date, Alert.alert_id],
+            lambda row: (row[0].triggered_date, row[0].alert_id),
+            limit,
+            cursor=cursor,
+            offset=(max(page, 1) - 1) * limit
+        )
+        total = cached_count(
+            'admin_alerts', {'severity': severity, 'status': status, 'search': search}, query
+        ) if include_total else None
         
         # Format alerts
         alerts = []
-        for alert, enrollment, student, user, course_offering, course, alert_type in pagination.items:
+        for alert, enrollment, student, user, course_offering, course, alert_type in rows:
             alert_data = {
                 'id': alert.alert_id,
                 'alert_id': alert.alert_id,
@@ -870,10 +919,13 @@ def get_system_alerts():
             data=alerts,
             page=page,
             per_page=limit,
-            total=pagination.total,
-            message='Alerts retrieved successfully'
+            total=total,
+            message='Alerts retrieved successfully',
+            next_cursor=next_cursor
         )
         
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"Error fetching alerts: {str(e)}")
         return error_response(f'Failed to fetch alerts: {str(e)}', 500)
@@ -923,7 +975,11 @@ def get_predictions():
         filters = {k: v for k, v in filters.items() if v is not None}
         
         # Get predictions
-        result = prediction_analytics_service.get_predictions_list(page, per_page, filters)
+        result = prediction_analytics_service.get_predictions_list(
+            page, per_page, filters,
+            cursor=request.args.get('cursor'),
+            include_total=request.args.get('include_total', 'true').lower() == 'true'
+        )
         
         return api_response(
             data={
@@ -932,12 +988,17 @@ def get_predictions():
                     'page': result['current_page'],
                     'per_page': result['per_page'],
                     'total': result['total'],
-                    'pages': result['pages']
+                    'total_approximate': result['total'] is not None,
+                    'pages': result['pages'],
+                    'next_cursor': result['next_cursor'],
+                    'has_more': result['next_cursor'] is not None
                 }
             },
             message="Predictions retrieved successfully"
         )
         
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"Error getting predictions: {str(e)}")
         return error_response("Failed to get predictions", 500)
@@ -1269,7 +1330,13 @@ def get_model_performance():
 @jwt_required()
 @admin_required
 def export_predictions():
-    """Export predictions data"""
+    """
+    Export predictions as a streamed CSV
+    
+    Rows are paged through with keyset pagination and written out as they
+    are read, so any number of predictions exports at constant memory.
+    Pass gzip=true for a gzip-compressed .csv.gz download.
+    """
     try:
         # Get filters from query params
         filters = {
@@ -1279,51 +1346,65 @@ def export_predictions():
             'date_to': request.args.get('date_to')
         }
         filters = {k: v for k, v in filters.items() if v is not None}
+        compress = request.args.get('gzip', 'false').lower() == 'true'
         
-        # Get all predictions (no pagination for export)
-        result = prediction_service.get_predictions(1, 10000, filters)
-        
-        # Format for CSV
         import csv
+        import zlib
         from io import StringIO
-        from flask import Response
-        
-        output = StringIO()
-        writer = csv.writer(output)
+        from flask import Response, stream_with_context
         
-        # Write headers
-        writer.writerow([
-            'Student ID', 'Student Name', 'Course Code', 'Course Name',
-            'Predicted Grade', 'Current Grade', 'Risk Level', 'Confidence',
-            'Prediction Date'
-        ])
-        
-        # Write data
-        for pred in result['predictions']:
+        def generate_csv():
+            output = StringIO()
+            writer = csv.writer(output)
+            
+            # Write headers
             writer.writerow([
-                pred['student']['student_id'],
-                pred['student']['name'],
-                pred['course']['course_code'],
-                pred['course']['course_name'],
-                pred['predicted_grade'],
-                pred['current_grade'],
-                pred['risk_level'],
-                f"{pred['confidence_score']:.2%}",
-                pred['prediction_date']
+                'Student ID', 'Student Name', 'Course Code', 'Course Name',
+                'Predicted Grade', 'Current Grade', 'Risk Level', 'Confidence',
+                'Prediction Date'
             ])
+            
+            for page in prediction_analytics_service.iter_prediction_export_rows(filters):
+                for pred in page:
+                    writer.writerow([
+                        pred['student_id'],
+                        pred['student_name'],
+                        pred['course_code'],
+                        pred['course_name'],
+                        pred['predicted_grade'],
+                        pred['current_grade'],
+                        pred['risk_level'],
+                        f"{pred['confidence_score']:.2%}",
+                        pred['prediction_date']
+                    ])
+                
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+            
+            if output.tell():
+                yield output.getvalue()
+        
+        def generate_gzip():
+            compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+            for chunk in generate_csv():
+                data = compressor.compress(chunk.encode('utf-8'))
+                if data:
+                    yield data
+            yield compressor.flush()
+        
+        filename = f'predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        if compress:
+            body, mimetype, filename = generate_gzip(), 'application/gzip', filename + '.gz'
+        else:
+            body, mimetype = generate_csv(), 'text/csv'
         
-        # Create response
-        output.seek(0)
-        response = Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            }
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
         
-        return response
-        
     except Exception as e:
         logger.error(f"Error exporting predictions: {str(e)}")
         return error_response("Failed to export predictions", 500)
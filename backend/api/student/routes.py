@@ -1028,10 +1028,6 @@ def generate_student_predictions():
         
         student_id = user.student.student_id
         
-        # Import prediction service
-        from backend.services.prediction_service import PredictionService
-        prediction_service = PredictionService()
-        
         # Get all active enrollments
         enrollments = Enrollment.query.filter(
             Enrollment.student_id == student_id,
@@ -20,6 +20,7 @@ def create_app(config_name=None):
     
     # Load configuration
     app.config.from_object(config[config_name])
+    app.config['CONFIG_NAME'] = config_name
     
     # Set up logging
     from backend.utils.logger import setup_app_logging
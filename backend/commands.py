@@ -24,18 +24,102 @@ def generate_lms_summary():
         click.echo(f"Error generating LMS summary: {str(e)}", err=True)
 
 @click.command()
+@click.option('--start', 'start_date', required=True, type=click.DateTime(formats=['%Y-%m-%d']),
+              help='First day to summarize (YYYY-MM-DD)')
+@click.option('--end', 'end_date', required=True, type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Last day to summarize (YYYY-MM-DD)')
+@click.option('--chunk-days', default=7, show_default=True, help='Days per work chunk')
+@click.option('--workers', default=4, show_default=True, help='Parallel worker threads')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint of an earlier run')
 @with_appcontext
-def update_feature_cache():
+def backfill_lms_summary(start_date, end_date, chunk_days, workers, restart):
+    """Rebuild LMS daily summaries for a date range, resuming interrupted runs"""
+    try:
+        from backend.services.lms_summary_service import LMSSummaryService
+        
+        def report(chunk_start, chunk_end, rows, seconds):
+            rate = rows / seconds if seconds > 0 else 0
+            click.echo(f"  {chunk_start} to {chunk_end}: {rows} rows in {seconds:.1f}s ({rate:.0f} rows/sec)")
+        
+        stats = LMSSummaryService.backfill(
+            start_date.date(), end_date.date(),
+            chunk_days=chunk_days, workers=workers, restart=restart, progress=report
+        )
+        click.echo(
+            f"Backfilled {stats['rows']} summary rows in {stats['seconds']}s "
+            f"({stats['rows_per_second']} rows/sec), skipped {stats['skipped']} of {stats['chunks']} chunks"
+        )
+        if stats['failed']:
+            click.echo(f"Failed chunks (rerun to resume): {', '.join(stats['failed'])}", err=True)
+    except Exception as e:
+        click.echo(f"Error backfilling LMS summary: {str(e)}", err=True)
+
+@click.command()
+@click.option('--workers', type=int, default=None, help='Worker processes (default one per core)')
+@with_appcontext
+def update_feature_cache(workers):
     """Update feature cache for all students"""
     try:
         from backend.services.prediction_service import PredictionService
-        PredictionService.update_feature_cache_for_all_students()
+        report = PredictionService.update_feature_cache_for_all_students(workers=workers)
+        _echo_job_report(report)
         click.echo("Feature cache updated!")
     except Exception as e:
         click.echo(f"Error updating feature cache: {str(e)}", err=True)
 
+@click.command()
+@click.option('--workers', type=int, default=None, help='Worker processes (default one per core)')
+@with_appcontext
+def generate_predictions(workers):
+    """Generate predictions for all enrolled students, one batch per offering"""
+    try:
+        from backend.tasks.scheduled_tasks import generate_weekly_predictions
+        _echo_job_report(generate_weekly_predictions(workers=workers))
+    except Exception as e:
+        click.echo(f"Error generating predictions: {str(e)}", err=True)
+
+@click.command('reconcile-activity-accumulators')
+@with_appcontext
+def reconcile_activity_accumulators():
+    """Rebuild activity accumulators that are out of step with their source rows"""
+    try:
+        from backend.services.activity_accumulator_service import ActivityAccumulatorService
+        report = ActivityAccumulatorService.reconcile()
+        click.echo(
+            f"Checked {report['checked']} accumulators: "
+            f"{report['rebuilt']} rebuilt, {report['failed']} failed"
+        )
+    except Exception as e:
+        click.echo(f"Error reconciling activity accumulators: {str(e)}", err=True)
+
+@click.command('rebuild-latest-predictions')
+@with_appcontext
+def rebuild_latest_predictions():
+    """Recompute every enrollment's latest-prediction pointer from the predictions table"""
+    try:
+        from backend.services.latest_prediction_service import LatestPredictionService
+        count = LatestPredictionService.rebuild()
+        click.echo(f"Rebuilt {count} latest-prediction pointers")
+    except Exception as e:
+        click.echo(f"Error rebuilding latest predictions: {str(e)}", err=True)
+
+def _echo_job_report(report):
+    """Print a partitioned job runner report"""
+    if not report:
+        return
+    click.echo(
+        f"{report['job']}: {report['succeeded']}/{report['partitions']} partitions, "
+        f"{report['rows']} rows in {report['seconds']}s ({report['rows_per_second']} rows/sec)"
+    )
+    for offering_id, error in report['failed'].items():
+        click.echo(f"  offering {offering_id} failed: {error}", err=True)
+
 def register_commands(app):
     """Register all custom commands"""
     app.cli.add_command(run_daily_tasks)
     app.cli.add_command(generate_lms_summary)
-    app.cli.add_command(update_feature_cache)
\ No newline at end of file
+    app.cli.add_command(backfill_lms_summary)
+    app.cli.add_command(update_feature_cache)
+    app.cli.add_command(generate_predictions)
+    app.cli.add_command(reconcile_activity_accumulators)
+    app.cli.add_command(rebuild_latest_predictions)
\ No newline at end of file
@@ -1,12 +1,229 @@
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
 from datetime import datetime
-from flask import request, g
+from flask import request, g, current_app
 from backend.models.tracking import LMSSession, LMSActivity
 from backend.models import Enrollment
 from backend.extensions import db
+from backend.services.activity_accumulator_service import ActivityAccumulatorService, activity_change
+from backend.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Sessions older than this are rolled over to a new one
+SESSION_TIMEOUT_SECONDS = 3600
+
+# The LMS session a request's activities are recorded against
+ActiveSession = namedtuple('ActiveSession', ['session_id', 'enrollment_id', 'login_time'])
+
+# user_id -> {'student_id', 'enrollment_ids', 'session'} for tracked users
+_user_activity_cache = TTLCache(maxsize=10000, ttl=300)
+
+
+def invalidate_student_activity_cache(student_id):
+    """Forget cached enrollments and session for a student (e.g. after enroll/drop)"""
+    _user_activity_cache.pop_where(lambda entry: entry['student_id'] == student_id)
+
+
+def invalidate_enrollment_session(enrollment_id):
+    """Forget the cached session for an enrollment (e.g. after the session ends)"""
+    _user_activity_cache.pop_where(
+        lambda entry: entry['session'] is not None
+        and entry['session'].enrollment_id == enrollment_id
+    )
+
+
+def _session_expired(login_time):
+    """Check whether a session started at login_time should be rolled over"""
+    return (datetime.utcnow() - login_time).total_seconds() > SESSION_TIMEOUT_SECONDS
+
+class ActivityWriteBuffer:
+    """
+    Bounded in-process queue that writes tracked activities in batches
+    
+    Requests enqueue activity rows and return immediately; a background
+    thread turns them into multi-row inserts every flush interval or
+    every batch_size rows, whichever comes first. A batch that fails to
+    write is retried on later flushes, up to max_retries times.
+    """
+    
+    def __init__(self, app, max_size=10000, batch_size=500, flush_interval_ms=1000,
+                 max_retries=3):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_size)
+        self._retries = deque()  # (attempts, batch) awaiting another write
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'enqueued': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'failed': 0,
+            'requeued': 0,
+            'batches': 0
+        }
+        atexit.register(self.stop)
+    
+    def enqueue(self, row):
+        """Queue an activity row for writing; drops it if the buffer is full"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(row)
+            self._count('enqueued')
+            return True
+        except queue.Full:
+            self._count('dropped')
+            logger.warning("Activity buffer full, dropping activity row")
+            return False
+    
+    def get_stats(self):
+        """Get buffer counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        stats['retrying'] = sum(len(batch) for _, batch in list(self._retries))
+        stats['worker_alive'] = bool(self._thread and self._thread.is_alive())
+        return stats
+    
+    def flush(self):
+        """Write everything currently queued"""
+        self._write_retries()
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+    
+    def stop(self):
+        """Stop the background flusher and write any remaining rows"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval * 5)
+        self.flush()
+    
+    def _ensure_worker(self):
+        """Start the flusher lazily so forked workers each get their own thread"""
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop_event.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='activity-write-buffer', daemon=True
+            )
+            self._thread.start()
+    
+    def _run(self):
+        """Background loop: wait for rows, then flush by size or by time"""
+        while not self._stop_event.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write_retries()
+            if batch:
+                self._write(batch)
+    
+    def _drain(self, limit):
+        """Take up to limit rows off the queue without waiting"""
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write_retries(self):
+        """Write the batches that failed on an earlier flush"""
+        for _ in range(len(self._retries)):
+            try:
+                attempts, batch = self._retries.popleft()
+            except IndexError:
+                return
+            self._write(batch, attempts)
+    
+    def _write(self, batch, attempts=0):
+        """Insert a batch of activity rows in one statement, with their accumulator updates"""
+        try:
+            with self.app.app_context():
+                db.session.execute(LMSActivity.__table__.insert(), batch)
+                ActivityAccumulatorService.apply_changes(db.session.connection(), [
+                    activity_change(
+                        row['enrollment_id'], row['activity_timestamp'],
+                        row['activity_type'], row['resource_id']
+                    )
+                    for row in batch
+                ])
+                db.session.commit()
+            self._count('flushed', len(batch))
+            self._count('batches')
+        except Exception as e:
+            try:
+                with self.app.app_context():
+                    db.session.rollback()
+            except Exception:
+                pass
+            
+            if attempts < self.max_retries:
+                self._retries.append((attempts + 1, batch))
+                self._count('requeued', len(batch))
+                logger.warning(
+                    f"Error flushing {len(batch)} tracked activities "
+                    f"(attempt {attempts + 1}), will retry: {str(e)}"
+                )
+            else:
+                self._count('failed', len(batch))
+                logger.error(
+                    f"Error flushing {len(batch)} tracked activities, "
+                    f"giving up after {attempts + 1} attempts: {str(e)}"
+                )
+    
+    def _count(self, key, amount=1):
+        """Increment a counter"""
+        with self._lock:
+            self._stats[key] += amount
+
+
+def _activity_row(session_id, enrollment_id, activity_type, resource_id=None,
+                  resource_name=None, **kwargs):
+    """Build an lms_activities row for the write buffer"""
+    return {
+        'session_id': session_id,
+        'enrollment_id': enrollment_id,
+        'activity_type': activity_type,
+        'activity_timestamp': datetime.utcnow(),
+        'resource_id': resource_id,
+        'resource_name': resource_name,
+        'duration_seconds': kwargs.get('duration_seconds'),
+        'details': kwargs.get('details')
+    }
+
+
+def get_activity_buffer(app=None):
+    """Get the app's activity write buffer, or None when writes are synchronous"""
+    app = app or current_app
+    return app.extensions.get('activity_write_buffer')
+
+
 class ActivityTracker:
     """Middleware to track user activities in the system"""
     
@@ -25,6 +242,17 @@ class ActivityTracker:
             '/api/auth/refresh',
             '/static'
         ])
+        _user_activity_cache.ttl = app.config.get('ACTIVITY_SESSION_CACHE_TTL', 300)
+        
+        # Write tracked activities off the request path unless disabled
+        if app.config.get('ACTIVITY_TRACKER_ASYNC', True):
+            app.extensions['activity_write_buffer'] = ActivityWriteBuffer(
+                app,
+                max_size=app.config.get('ACTIVITY_BUFFER_MAX_SIZE', 10000),
+                batch_size=app.config.get('ACTIVITY_BUFFER_BATCH_SIZE', 500),
+                flush_interval_ms=app.config.get('ACTIVITY_BUFFER_FLUSH_INTERVAL_MS', 1000),
+                max_retries=app.config.get('ACTIVITY_BUFFER_MAX_RETRIES', 3)
+            )
     
     def before_request(self):
         """Called before each request"""
@@ -36,7 +264,7 @@ class ActivityTracker:
             return
         
         # Track session if user is authenticated
-        if hasattr(g, 'current_user') and g.current_user:
+        if g.get('current_identity'):
             self._ensure_session()
     
     def after_request(self, response):
@@ -46,7 +274,7 @@ class ActivityTracker:
             return response
         
         # Track activity if user is authenticated
-        if hasattr(g, 'current_user') and g.current_user and hasattr(g, 'current_session'):
+        if g.get('current_identity') and hasattr(g, 'current_session'):
             self._track_activity()
         
         return response
@@ -60,50 +288,68 @@ class ActivityTracker:
     
     def _ensure_session(self):
         """Ensure user has an active session"""
-        if not hasattr(g, 'current_session'):
-            # Get all active enrollments for the user
-            enrollments = self._get_user_enrollments()
-            
-            if enrollments:
-                # For now, we'll use the first enrollment
-                # In a real scenario, you might want to determine which course 
-                # the activity is related to based on the URL or request data
-                enrollment = enrollments[0]
-                
-                # Look for active session
-                session = LMSSession.query.filter_by(
-                    enrollment_id=enrollment.enrollment_id,
-                    logout_time=None
-                ).order_by(LMSSession.login_time.desc()).first()
-                
-                # Create new session if none exists or last one is too old
-                if not session or (datetime.utcnow() - session.login_time).seconds > 3600:
-                    session = LMSSession(
-                        enrollment_id=enrollment.enrollment_id,
-                        login_time=datetime.utcnow(),
-                        ip_address=request.remote_addr,
-                        user_agent=request.user_agent.string[:255] if request.user_agent else None
-                    )
-                    db.session.add(session)
-                    db.session.commit()
-                
-                g.current_session = session
-                g.current_enrollment_id = enrollment.enrollment_id
-    
-    def _get_user_enrollments(self):
-        """Get active enrollments for current user"""
-        if not g.current_user:
-            return []
+        if hasattr(g, 'current_session'):
+            return
         
-        # Check if user is a student
-        if hasattr(g.current_user, 'student'):
-            enrollments = Enrollment.query.filter_by(
-                student_id=g.current_user.student.student_id,
-                enrollment_status='enrolled'
-            ).all()
-            return enrollments
+        # Enrollments and the open session are cached per user
+        identity = g.current_identity
+        user_id = identity.user_id
+        entry = _user_activity_cache.get(user_id)
+        if entry is None:
+            student_id = identity.student_id if identity.user_type == 'student' else None
+            entry = {
+                'student_id': student_id,
+                'enrollment_ids': [e.enrollment_id for e in self._get_user_enrollments(student_id)],
+                'session': None
+            }
         
-        return []
+        if not entry['enrollment_ids']:
+            _user_activity_cache.set(user_id, entry)
+            return
+        
+        # For now, we'll use the first enrollment
+        # In a real scenario, you might want to determine which course 
+        # the activity is related to based on the URL or request data
+        enrollment_id = entry['enrollment_ids'][0]
+        
+        session = entry['session']
+        if session is None or session.enrollment_id != enrollment_id:
+            # Look for active session
+            open_session = LMSSession.query.filter_by(
+                enrollment_id=enrollment_id,
+                logout_time=None
+            ).order_by(LMSSession.login_time.desc()).first()
+            session = ActiveSession(
+                open_session.session_id, enrollment_id, open_session.login_time
+            ) if open_session else None
+        
+        # Create new session if none exists or last one is too old
+        if session is None or _session_expired(session.login_time):
+            new_session = LMSSession(
+                enrollment_id=enrollment_id,
+                login_time=datetime.utcnow(),
+                ip_address=request.remote_addr,
+                user_agent=request.user_agent.string[:255] if request.user_agent else None
+            )
+            db.session.add(new_session)
+            db.session.flush()
+            session = ActiveSession(new_session.session_id, enrollment_id, new_session.login_time)
+            db.session.commit()
+        
+        _user_activity_cache.set(user_id, dict(entry, session=session))
+        
+        g.current_session = session
+        g.current_enrollment_id = enrollment_id
+    
+    def _get_user_enrollments(self, student_id):
+        """Get active enrollments for a student"""
+        if not student_id:
+            return []
+        
+        return Enrollment.query.filter_by(
+            student_id=student_id,
+            enrollment_status='enrolled'
+        ).order_by(Enrollment.enrollment_id).all()
     
     def _track_activity(self):
         """Track the current activity"""
@@ -121,6 +367,19 @@ class ActivityTracker:
             if hasattr(g, 'request_start_time'):
                 duration = int((datetime.utcnow() - g.request_start_time).total_seconds())
             
+            # Hand the row to the write buffer when one is configured
+            buffer = get_activity_buffer()
+            if buffer:
+                buffer.enqueue(_activity_row(
+                    session_id=g.current_session.session_id,
+                    enrollment_id=g.current_enrollment_id,
+                    activity_type=activity_type,
+                    resource_id=self._get_resource_id(),
+                    resource_name=self._get_resource_name(),
+                    duration_seconds=duration
+                ))
+                return
+            
             # Create activity record with both session_id and enrollment_id
             activity = LMSActivity(
                 session_id=g.current_session.session_id,
@@ -193,6 +452,14 @@ def track_activity(activity_type, resource_id=None, resource_name=None, **kwargs
     """Manual activity tracking function"""
     try:
         if hasattr(g, 'current_session') and hasattr(g, 'current_enrollment_id'):
+            buffer = get_activity_buffer()
+            if buffer:
+                buffer.enqueue(_activity_row(
+                    g.current_session.session_id, g.current_enrollment_id,
+                    activity_type, resource_id, resource_name, **kwargs
+                ))
+                return
+            
             activity = LMSActivity(
                 session_id=g.current_session.session_id,
                 enrollment_id=g.current_enrollment_id,
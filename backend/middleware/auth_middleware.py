@@ -1,7 +1,7 @@
 from functools import wraps
 from flask import request, jsonify, current_app
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
-from backend.models import User
+from backend.middleware.jwt_middleware import resolve_identity, get_current_user
 import logging
 
 logger = logging.getLogger('auth')
@@ -17,11 +17,11 @@ def role_required(role):
             # Get identity from JWT
             user_id = get_jwt_identity()
             
-            # Get user from database
-            user = User.query.get(user_id)
+            # Resolve identity (cached per request and process-wide)
+            identity = resolve_identity(user_id)
             
             # Check if user exists and has required role
-            if not user or user.user_type != role:
+            if not identity or identity.user_type != role:
                 logger.warning(f"Role access denied: User {user_id} tried to access {role} resource")
                 return jsonify({
                     'status': 'error',
@@ -37,12 +37,6 @@ admin_required = role_required('admin')
 faculty_required = role_required('faculty')
 student_required = role_required('student')
 
-def get_current_user():
-    """Get current user from JWT identity"""
-    user_id = get_jwt_identity()
-    return User.query.get(user_id)
-
-
 def auth_required(fn):
     """Decorator to check if user is authenticated"""
     @wraps(fn)
@@ -53,11 +47,11 @@ def auth_required(fn):
         # Get user ID from JWT
         user_id = get_jwt_identity()
         
-        # Get user
-        user = User.query.get(user_id)
+        # Resolve identity
+        identity = resolve_identity(user_id)
         
         # Check if user exists
-        if not user:
+        if not identity:
             logger.warning(f"Access denied: User {user_id} not found")
             return jsonify({
                 'status': 'error',
@@ -75,10 +69,10 @@ def admin_required(fn):
         verify_jwt_in_request()
         current_user_id = get_jwt_identity()
         
-        # Get user from database
-        user = User.query.filter_by(user_id=current_user_id).first()
+        # Resolve identity
+        identity = resolve_identity(current_user_id)
         
-        if not user or user.user_type != 'admin':
+        if not identity or identity.user_type != 'admin':
             return jsonify({
                 'status': 'error',
                 'message': 'Admin access required'
@@ -1,16 +1,94 @@
-from flask import g
+from collections import namedtuple
+from flask import g, current_app, has_request_context
 from flask_jwt_extended import jwt_required, verify_jwt_in_request, get_jwt_identity
 from jwt.exceptions import DecodeError
-from backend.models import User
+from backend.models import User, Student, Faculty
+from backend.extensions import db
+from backend.utils.cache import TTLCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# What the auth layer needs to know about a user, without the full row
+UserIdentity = namedtuple(
+    'UserIdentity', ['user_id', 'user_type', 'is_active', 'student_id', 'faculty_id']
+)
+
+# Process-wide user_id -> UserIdentity; kept short-lived and cleared on user updates
+_identity_cache = TTLCache(maxsize=4096, ttl=60)
+
+
+def resolve_identity(user_id):
+    """
+    Resolve a user's identity once per request
+    
+    Looks at g first, then the process-wide cache, and only then the database.
+    
+    Args:
+        user_id: User ID (usually the JWT identity)
+    
+    Returns:
+        UserIdentity, or None if the user does not exist
+    """
+    if user_id is None:
+        return None
+    
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    
+    identity = g.get('current_identity') if has_request_context() else None
+    if identity is not None and identity.user_id == user_id:
+        return identity
+    
+    identity = _identity_cache.get(user_id)
+    if identity is None:
+        row = db.session.query(
+            User.user_type, User.is_active, Student.student_id, Faculty.faculty_id
+        ).outerjoin(
+            Student, Student.user_id == User.user_id
+        ).outerjoin(
+            Faculty, Faculty.user_id == User.user_id
+        ).filter(User.user_id == user_id).first()
+        
+        if not row:
+            return None
+        
+        identity = UserIdentity(user_id, row.user_type, row.is_active, row.student_id, row.faculty_id)
+        _identity_cache.set(user_id, identity, ttl=current_app.config.get('IDENTITY_CACHE_TTL'))
+    
+    if has_request_context():
+        g.current_identity = identity
+    return identity
+
+
+def get_current_user():
+    """Get the full User row for the request's identity, loading it at most once"""
+    identity = g.get('current_identity')
+    if identity is None:
+        return None
+    
+    user = g.get('current_user')
+    if user is None or user.user_id != identity.user_id:
+        user = User.query.get(identity.user_id)
+        g.current_user = user
+    return user
+
+
+def invalidate_identity(user_id):
+    """Drop a user's cached identity after their account changes"""
+    _identity_cache.pop(int(user_id))
+
+
 def load_logged_in_user():
     """
-    Load the logged-in user into g.current_user for each request
+    Resolve the logged-in user's identity into g.current_identity for each request
     This should be called in app.before_request
+    
+    The full User row is only loaded on demand through get_current_user().
     """
+    g.current_identity = None
     g.current_user = None
     
     try:
@@ -21,13 +99,11 @@ def load_logged_in_user():
         user_id = get_jwt_identity()
         
         if user_id:
-            # Load user and set in g
-            user = User.query.get(user_id)
-            if user:
-                g.current_user = user
-                logger.debug(f"Loaded user {user.username} into g.current_user")
-                
+            identity = resolve_identity(user_id)
+            if identity:
+                logger.debug(f"Resolved user {identity.user_id} into g.current_identity")
+    
     except Exception as e:
         # No valid JWT or other error - that's okay for public routes
         logger.debug(f"No JWT found or invalid: {str(e)}")
-        pass
\ No newline at end of file
+        pass
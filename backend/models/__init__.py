@@ -7,9 +7,9 @@ All SQLAlchemy models are imported here for easy access.
 # Import all models to make them available
 from .user import User, Student, Faculty
 from .academic import AcademicTerm, Course, CourseOffering, Enrollment
-from .tracking import Attendance, LMSSession, LMSActivity, LMSDailySummary
+from .tracking import Attendance, LMSSession, LMSActivity, LMSDailySummary, ActivityAccumulator, OfferingEngagementStats
 from .assessment import AssessmentType, Assessment, AssessmentSubmission
-from .prediction import Prediction, FeatureCache,MLFeatureStaging
+from .prediction import Prediction, LatestPrediction, FeatureCache,MLFeatureStaging
 from .alert import AlertType, Alert, Intervention
 from .system import SystemConfig, AuditLog, ModelVersion
 
@@ -17,9 +17,9 @@ from .system import SystemConfig, AuditLog, ModelVersion
 __all__ = [
     'User', 'Student', 'Faculty',
     'AcademicTerm', 'Course', 'CourseOffering', 'Enrollment',
-    'Attendance', 'LMSSession', 'LMSActivity', 'LMSDailySummary',
+    'Attendance', 'LMSSession', 'LMSActivity', 'LMSDailySummary', 'ActivityAccumulator', 'OfferingEngagementStats',
     'AssessmentType', 'Assessment', 'AssessmentSubmission',
-    'Prediction', 'FeatureCache',
+    'Prediction', 'LatestPrediction', 'FeatureCache',
     'AlertType', 'Alert', 'Intervention',
     'SystemConfig', 'AuditLog', 'ModelVersion','MLFeatureStaging'
 ]
\ No newline at end of file
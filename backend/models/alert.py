@@ -6,7 +6,7 @@ class AlertType(db.Model):
     __tablename__ = 'alert_types'
     
     type_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    type_name = db.Column(db.String(50), nullable=False)
+    type_name = db.Column(db.String(50), unique=True, nullable=False)
     severity = db.Column(db.Enum('info', 'warning', 'critical'), nullable=False)
     description = db.Column(db.Text, nullable=True)
     
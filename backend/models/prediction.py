@@ -1,5 +1,10 @@
 from datetime import datetime
 from backend.extensions import db
+from sqlalchemy import event, select, func, and_
+from sqlalchemy.orm import Session
+from .tracking import Attendance, LMSActivity
+from .academic import Enrollment
+from .assessment import Assessment, AssessmentSubmission
 
 class Prediction(db.Model):
     """Prediction model for grade predictions"""
@@ -16,8 +21,9 @@ class Prediction(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     model_accuracy = db.Column(db.Numeric(5, 2), nullable=True)
     feature_version = db.Column(db.String(20), default='v1.0')
+    feature_hash = db.Column(db.String(40), nullable=True)  # SHA-1 of the feature vector
     
-    def __init__(self, enrollment_id, prediction_date, predicted_grade, confidence_score, risk_level, model_version, feature_snapshot=None):
+    def __init__(self, enrollment_id, prediction_date, predicted_grade, confidence_score, risk_level, model_version, feature_snapshot=None, feature_hash=None):
         self.enrollment_id = enrollment_id
         self.prediction_date = prediction_date
         self.predicted_grade = predicted_grade
@@ -25,6 +31,7 @@ class Prediction(db.Model):
         self.risk_level = risk_level
         self.model_version = model_version
         self.feature_snapshot = feature_snapshot
+        self.feature_hash = feature_hash
 
         self.model_accuracy = None
         self.feature_version = 'v1.0'
@@ -49,6 +56,72 @@ class Prediction(db.Model):
         return f"<Prediction {self.prediction_id} for {self.enrollment_id}: {self.predicted_grade}>"
 
 
+class LatestPrediction(db.Model):
+    """Pointer to the newest prediction for each enrollment, maintained on flush"""
+    __tablename__ = 'latest_predictions'
+    
+    enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.enrollment_id'), primary_key=True, autoincrement=False)
+    prediction_id = db.Column(db.Integer, nullable=False, index=True)
+    prediction_date = db.Column(db.DateTime, nullable=False)
+    
+    @staticmethod
+    def latest_select(enrollment_ids=None):
+        """
+        Select (enrollment_id, prediction_id, prediction_date) of the newest
+        prediction per enrollment; ties on prediction_date go to the highest id
+        """
+        latest_dates = select(
+            Prediction.enrollment_id,
+            func.max(Prediction.prediction_date).label('max_date')
+        ).group_by(Prediction.enrollment_id)
+        
+        if enrollment_ids is not None:
+            latest_dates = latest_dates.where(Prediction.enrollment_id.in_(enrollment_ids))
+        latest_dates = latest_dates.subquery()
+        
+        return select(
+            Prediction.enrollment_id,
+            func.max(Prediction.prediction_id).label('prediction_id'),
+            func.max(Prediction.prediction_date).label('prediction_date')
+        ).select_from(Prediction).join(
+            latest_dates,
+            and_(
+                Prediction.enrollment_id == latest_dates.c.enrollment_id,
+                Prediction.prediction_date == latest_dates.c.max_date
+            )
+        ).group_by(Prediction.enrollment_id)
+    
+    @staticmethod
+    def refresh(connection, enrollment_ids=None):
+        """Recompute pointers for the given enrollments (all when None)"""
+        table = LatestPrediction.__table__
+        
+        delete = table.delete()
+        if enrollment_ids is not None:
+            delete = delete.where(table.c.enrollment_id.in_(enrollment_ids))
+        connection.execute(delete)
+        
+        connection.execute(table.insert().from_select(
+            ['enrollment_id', 'prediction_id', 'prediction_date'],
+            LatestPrediction.latest_select(enrollment_ids)
+        ))
+    
+    def __repr__(self):
+        return f"<LatestPrediction {self.prediction_id} for {self.enrollment_id}>"
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_latest_predictions(session, flush_context):
+    """Keep latest_predictions in step with predictions written through the ORM"""
+    enrollment_ids = {
+        instance.enrollment_id
+        for instance in list(session.new) + list(session.deleted)
+        if isinstance(instance, Prediction)
+    }
+    if enrollment_ids:
+        LatestPrediction.refresh(session.connection(), enrollment_ids)
+
+
 class FeatureCache(db.Model):
     """Feature cache for performance optimization"""
     __tablename__ = 'feature_cache'
@@ -66,6 +139,17 @@ class FeatureCache(db.Model):
     study_consistency_score = db.Column(db.Numeric(5, 2), nullable=True)
     last_login_days_ago = db.Column(db.Integer, nullable=True)
     total_study_minutes = db.Column(db.Integer, nullable=True)
+    feature_vector = db.Column(db.JSON, nullable=True)  # Full model feature vector by name
+    # Row counts and id sums of the source rows the vector was computed from
+    attendance_rows = db.Column(db.Integer, nullable=True)
+    attendance_id_sum = db.Column(db.BigInteger, nullable=True)
+    activity_rows = db.Column(db.Integer, nullable=True)
+    activity_id_sum = db.Column(db.BigInteger, nullable=True)
+    submission_rows = db.Column(db.Integer, nullable=True)
+    submission_id_sum = db.Column(db.BigInteger, nullable=True)
+    # Assessments of the offering already due: count and newest id
+    due_assessments = db.Column(db.Integer, nullable=True)
+    max_due_assessment_id = db.Column(db.Integer, nullable=True)
     calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     __table_args__ = (
@@ -87,6 +171,45 @@ class FeatureCache(db.Model):
         self.study_consistency_score = kwargs.get('study_consistency_score')
         self.last_login_days_ago = kwargs.get('last_login_days_ago')
         self.total_study_minutes = kwargs.get('total_study_minutes')
+        self.feature_vector = kwargs.get('feature_vector')
+        
+        # Data watermark
+        self.attendance_rows = kwargs.get('attendance_rows')
+        self.attendance_id_sum = kwargs.get('attendance_id_sum')
+        self.activity_rows = kwargs.get('activity_rows')
+        self.activity_id_sum = kwargs.get('activity_id_sum')
+        self.submission_rows = kwargs.get('submission_rows')
+        self.submission_id_sum = kwargs.get('submission_id_sum')
+        self.due_assessments = kwargs.get('due_assessments')
+        self.max_due_assessment_id = kwargs.get('max_due_assessment_id')
+    
+    @property
+    def watermark(self):
+        """Source row counts and id sums, then due assessment count and newest id, the vector reflects"""
+        return (
+            self.attendance_rows or 0, self.attendance_id_sum or 0,
+            self.activity_rows or 0, self.activity_id_sum or 0,
+            self.submission_rows or 0, self.submission_id_sum or 0,
+            self.due_assessments or 0, self.max_due_assessment_id or 0
+        )
+    
+    @staticmethod
+    def invalidate(connection, enrollment_ids):
+        """Drop cached feature vectors of enrollments whose source rows were edited in place"""
+        table = FeatureCache.__table__
+        connection.execute(
+            table.update().where(
+                table.c.enrollment_id.in_(enrollment_ids)
+            ).values(feature_vector=None)
+        )
+    
+    @staticmethod
+    def invalidate_offerings(connection, offering_ids):
+        """Drop cached feature vectors of every enrollment in offerings whose assessments changed"""
+        FeatureCache.invalidate(
+            connection,
+            select(Enrollment.enrollment_id).where(Enrollment.offering_id.in_(offering_ids))
+        )
     
     def to_dict(self):
         """Convert feature cache to dictionary for API responses"""
@@ -104,12 +227,50 @@ class FeatureCache(db.Model):
             'study_consistency_score': float(self.study_consistency_score) if self.study_consistency_score else None,
             'last_login_days_ago': self.last_login_days_ago,
             'total_study_minutes': self.total_study_minutes,
+            'feature_vector': self.feature_vector,
             'calculated_at': self.calculated_at.isoformat() if self.calculated_at else None
         }
     
     def __repr__(self):
         return f"<FeatureCache {self.cache_id} for {self.enrollment_id} on {self.feature_date}>"
+
+
+# In-place edits do not move the data watermark, so edits and deletes clear
+# the cached vector (and with it the prediction memo keyed on its hash).
+# Assessment edits, such as a moved due date, clear their whole offering.
+FEATURE_SOURCE_MODELS = (Attendance, LMSActivity, AssessmentSubmission)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_feature_cache(session, flush_context):
+    """Invalidate cached feature vectors of enrollments with edited or deleted source rows or assessments"""
+    enrollment_ids = {
+        instance.enrollment_id
+        for instance in session.deleted
+        if isinstance(instance, FEATURE_SOURCE_MODELS)
+    }
+    enrollment_ids.update(
+        instance.enrollment_id
+        for instance in session.dirty
+        if isinstance(instance, FEATURE_SOURCE_MODELS) and session.is_modified(instance)
+    )
+    if enrollment_ids:
+        FeatureCache.invalidate(session.connection(), enrollment_ids)
     
+    offering_ids = {
+        instance.offering_id
+        for instance in session.deleted
+        if isinstance(instance, Assessment)
+    }
+    offering_ids.update(
+        instance.offering_id
+        for instance in session.dirty
+        if isinstance(instance, Assessment) and session.is_modified(instance)
+    )
+    if offering_ids:
+        FeatureCache.invalidate_offerings(session.connection(), offering_ids)
+
+
 class MLFeatureStaging(db.Model):
     """ML Feature staging table for batch processing"""
     __tablename__ = 'ml_feature_staging'
@@ -193,4 +193,103 @@ class LMSDailySummary(db.Model):
         }
     
     def __repr__(self):
-        return f"<LMSDailySummary {self.enrollment_id} on {self.summary_date}>"
\ No newline at end of file
+        return f"<LMSDailySummary {self.enrollment_id} on {self.summary_date}>"
+
+class ActivityAccumulator(db.Model):
+    """Running activity aggregates for an enrollment, updated as VLE rows land"""
+    __tablename__ = 'activity_accumulators'
+    
+    accumulator_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.enrollment_id'), nullable=False, unique=True)
+    course_start_date = db.Column(db.Date, nullable=False)
+    daily_clicks = db.Column(db.JSON, nullable=False)  # {day offset: clicks}
+    weekly_clicks = db.Column(db.JSON, nullable=False)  # {week offset: clicks}
+    site_counts = db.Column(db.JSON, nullable=False)  # {id_site: contributing records}
+    unnamed_sites = db.Column(db.Integer, default=0)  # Activities without a resource_id, one site each
+    sum_x = db.Column(db.Float, default=0)  # Regression sums over active days
+    sum_y = db.Column(db.Float, default=0)
+    sum_xy = db.Column(db.Float, default=0)
+    sum_xx = db.Column(db.Float, default=0)
+    # Fingerprint of the source rows folded in, checked against the tables on read
+    activity_count = db.Column(db.Integer, default=0)
+    attendance_count = db.Column(db.Integer, default=0)
+    attendance_clicks = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, enrollment_id, course_start_date):
+        self.enrollment_id = enrollment_id
+        self.course_start_date = course_start_date
+        self.daily_clicks = {}
+        self.weekly_clicks = {}
+        self.site_counts = {}
+        self.unnamed_sites = 0
+        self.sum_x = 0
+        self.sum_y = 0
+        self.sum_xy = 0
+        self.sum_xx = 0
+        self.activity_count = 0
+        self.attendance_count = 0
+        self.attendance_clicks = 0
+    
+    def to_dict(self):
+        """Convert accumulator to dictionary for API responses"""
+        return {
+            'accumulator_id': self.accumulator_id,
+            'enrollment_id': self.enrollment_id,
+            'course_start_date': self.course_start_date.isoformat() if self.course_start_date else None,
+            'days_active': len(self.daily_clicks or {}),
+            'unique_materials': len(self.site_counts or {}) + (self.unnamed_sites or 0),
+            'total_clicks': self.sum_y,
+            'activity_count': self.activity_count,
+            'attendance_count': self.attendance_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f"<ActivityAccumulator for {self.enrollment_id}>"
+
+
+class OfferingEngagementStats(db.Model):
+    """Rolling daily-activity distribution for a course offering"""
+    __tablename__ = 'offering_engagement_stats'
+    
+    stats_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    offering_id = db.Column(db.Integer, db.ForeignKey('course_offerings.offering_id'), nullable=False, unique=True)
+    stats_date = db.Column(db.Date, nullable=False)  # Last day of the window
+    window_days = db.Column(db.Integer, nullable=False, default=7)
+    enrollment_count = db.Column(db.Integer, nullable=False, default=0)
+    mean_activity = db.Column(db.Float, nullable=False, default=0)  # Per enrollment, per active day
+    median_activity = db.Column(db.Float, nullable=False, default=0)
+    p25_activity = db.Column(db.Float, nullable=False, default=0)
+    p75_activity = db.Column(db.Float, nullable=False, default=0)
+    p90_activity = db.Column(db.Float, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, offering_id, stats_date, **kwargs):
+        self.offering_id = offering_id
+        self.stats_date = stats_date
+        self.window_days = kwargs.get('window_days', 7)
+        self.enrollment_count = kwargs.get('enrollment_count', 0)
+        self.mean_activity = kwargs.get('mean_activity', 0)
+        self.median_activity = kwargs.get('median_activity', 0)
+        self.p25_activity = kwargs.get('p25_activity', 0)
+        self.p75_activity = kwargs.get('p75_activity', 0)
+        self.p90_activity = kwargs.get('p90_activity', 0)
+    
+    def to_dict(self):
+        """Convert engagement statistics to dictionary for API responses"""
+        return {
+            'offering_id': self.offering_id,
+            'stats_date': self.stats_date.isoformat() if self.stats_date else None,
+            'window_days': self.window_days,
+            'enrollment_count': self.enrollment_count,
+            'mean_activity': self.mean_activity,
+            'median_activity': self.median_activity,
+            'p25_activity': self.p25_activity,
+            'p75_activity': self.p75_activity,
+            'p90_activity': self.p90_activity,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+    
+    def __repr__(self):
+        return f"<OfferingEngagementStats for {self.offering_id} on {self.stats_date}>"
@@ -0,0 +1,489 @@
+import numpy as np
+from collections import namedtuple
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, case, event, func, inspect, select
+from sqlalchemy.orm import Session
+from backend.models import ActivityAccumulator, Attendance, LMSActivity, Enrollment
+from backend.extensions import db
+from backend.services.feature_calculator_service import (
+    ATTENDANCE_CLICK_MAPPING, ACTIVITY_CLICK_MAPPING, EMPTY_ACTIVITY_FEATURES,
+    get_offering_start_date
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One VLE record entering (sign=1) or leaving (sign=-1) an enrollment's
+# accumulator; site is None for LMS activities without a resource_id
+VLEChange = namedtuple(
+    'VLEChange', ['enrollment_id', 'kind', 'record_date', 'site', 'clicks', 'sign']
+)
+
+# (activity rows, counted attendance rows, attendance clicks) of an enrollment
+EMPTY_FINGERPRINT = (0, 0, 0)
+
+
+def activity_change(enrollment_id: int, activity_timestamp: datetime, activity_type: str,
+                    resource_id: Optional[str], sign: int = 1) -> VLEChange:
+    """VLE change for an LMS activity row"""
+    return VLEChange(
+        enrollment_id, 'activity', activity_timestamp.date(), resource_id or None,
+        ACTIVITY_CLICK_MAPPING.get(activity_type, 1), sign
+    )
+
+
+def attendance_change(enrollment_id: int, attendance_id: int, attendance_date, status: str,
+                      sign: int = 1) -> Optional[VLEChange]:
+    """VLE change for an attendance row, or None if its status earns no clicks"""
+    if status not in ATTENDANCE_CLICK_MAPPING:
+        return None
+    return VLEChange(
+        enrollment_id, 'attendance', attendance_date, f'attendance_{attendance_id}',
+        ATTENDANCE_CLICK_MAPPING[status], sign
+    )
+
+
+class _AccumulatorState:
+    """Plain-Python working copy of an accumulator row (model instance or Core row)"""
+    
+    def __init__(self, accumulator=None):
+        """Start from an accumulator's aggregates, or empty when None"""
+        self.daily = dict(getattr(accumulator, 'daily_clicks', None) or {})
+        self.weekly = dict(getattr(accumulator, 'weekly_clicks', None) or {})
+        self.sites = dict(getattr(accumulator, 'site_counts', None) or {})
+        self.sum_x = getattr(accumulator, 'sum_x', None) or 0
+        self.sum_y = getattr(accumulator, 'sum_y', None) or 0
+        self.sum_xy = getattr(accumulator, 'sum_xy', None) or 0
+        self.sum_xx = getattr(accumulator, 'sum_xx', None) or 0
+        self.unnamed_sites = getattr(accumulator, 'unnamed_sites', None) or 0
+        self.activity_count = getattr(accumulator, 'activity_count', None) or 0
+        self.attendance_count = getattr(accumulator, 'attendance_count', None) or 0
+        self.attendance_clicks = getattr(accumulator, 'attendance_clicks', None) or 0
+    
+    def apply(self, day: int, site: Optional[str], clicks: int, sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) one VLE record"""
+        delta = sign * clicks
+        
+        day_key = str(day)
+        old_clicks = self.daily.get(day_key, 0)
+        new_clicks = old_clicks + delta
+        
+        # Regression sums run over active days, with y = clicks on that day
+        if old_clicks <= 0 < new_clicks:
+            self.sum_x += day
+            self.sum_xx += day * day
+        elif new_clicks <= 0 < old_clicks:
+            self.sum_x -= day
+            self.sum_xx -= day * day
+        self.sum_y += delta
+        self.sum_xy += delta * day
+        
+        self._update(self.daily, day_key, delta)
+        self._update(self.weekly, str(day // 7), delta)
+        
+        # Activities without a resource are each a site of their own
+        if site is None:
+            self.unnamed_sites += sign
+        else:
+            self._update(self.sites, site, sign)
+    
+    def apply_change(self, change: VLEChange, start_date):
+        """Apply a VLE change and keep the source row fingerprint in step"""
+        self.apply((change.record_date - start_date).days, change.site, change.clicks, change.sign)
+        
+        if change.kind == 'activity':
+            self.activity_count += change.sign
+        else:
+            self.attendance_count += change.sign
+            self.attendance_clicks += change.sign * change.clicks
+    
+    def values(self) -> Dict:
+        """Column values of the working copy"""
+        return {
+            'daily_clicks': self.daily,
+            'weekly_clicks': self.weekly,
+            'site_counts': self.sites,
+            'sum_x': self.sum_x,
+            'sum_y': self.sum_y,
+            'sum_xy': self.sum_xy,
+            'sum_xx': self.sum_xx,
+            'unnamed_sites': self.unnamed_sites,
+            'activity_count': self.activity_count,
+            'attendance_count': self.attendance_count,
+            'attendance_clicks': self.attendance_clicks
+        }
+    
+    def save(self, accumulator: ActivityAccumulator):
+        """Write the working copy back onto the row"""
+        for key, value in self.values().items():
+            setattr(accumulator, key, value)
+    
+    @staticmethod
+    def _update(counter: Dict, key: str, delta: int):
+        """Adjust a counter, dropping keys that fall to zero"""
+        value = counter.get(key, 0) + delta
+        if value > 0:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+
+class ActivityAccumulatorService:
+    """Maintain per-enrollment running activity aggregates for feature calculation"""
+    
+    @staticmethod
+    def apply_changes(connection, changes: Iterable[Optional[VLEChange]]):
+        """
+        Fold VLE changes into their enrollments' accumulators
+        
+        Runs on the connection of the transaction that wrote the source rows,
+        so the rows and the aggregates commit or roll back together. The
+        accumulator rows are locked, so concurrent writers apply in turn.
+        Enrollments without an accumulator are skipped; reconcile builds it.
+        """
+        changes = [change for change in changes if change is not None]
+        if not changes:
+            return
+        
+        table = ActivityAccumulator.__table__
+        rows = connection.execute(
+            select(table).where(
+                table.c.enrollment_id.in_({change.enrollment_id for change in changes})
+            ).with_for_update()
+        ).all()
+        if not rows:
+            return
+        
+        accumulators = {row.enrollment_id: (row, _AccumulatorState(row)) for row in rows}
+        for change in changes:
+            entry = accumulators.get(change.enrollment_id)
+            if entry:
+                entry[1].apply_change(change, entry[0].course_start_date)
+        
+        connection.execute(
+            table.update().where(table.c.accumulator_id == bindparam('b_accumulator_id')),
+            [
+                dict(state.values(), b_accumulator_id=row.accumulator_id)
+                for row, state in accumulators.values()
+            ]
+        )
+    
+    @staticmethod
+    def record_attendance_bulk(changes: List[Tuple]):
+        """
+        Fold attendance rows written with Core statements into their accumulators
+        
+        Args:
+            changes: (attendance, previous_status) pairs; attendance is a row
+                with attendance_id, enrollment_id, attendance_date and status,
+                previous_status is None for a new row
+        """
+        vle_changes = []
+        for attendance, previous_status in changes:
+            if previous_status is not None:
+                vle_changes.append(attendance_change(
+                    attendance.enrollment_id, attendance.attendance_id,
+                    attendance.attendance_date, previous_status, sign=-1
+                ))
+            vle_changes.append(attendance_change(
+                attendance.enrollment_id, attendance.attendance_id,
+                attendance.attendance_date, attendance.status
+            ))
+        
+        ActivityAccumulatorService.apply_changes(db.session.connection(), vle_changes)
+    
+    @staticmethod
+    def get_activity_features(enrollment: Enrollment, as_of: Optional[datetime] = None) -> Optional[Dict]:
+        """
+        Get activity features for an enrollment from its accumulator
+        
+        Reading is O(days) and never writes. Returns None when the accumulator
+        cannot stand in for the raw VLE calculation: it is missing, built for
+        another course start date, out of step with the source rows (written
+        by something that bypassed the flush hook), or holds days after as_of.
+        The caller then computes from raw rows, and reconcile rebuilds it.
+        """
+        as_of = as_of or datetime.now()
+        start_date = get_offering_start_date(enrollment.offering_id) or enrollment.enrollment_date
+        
+        accumulator = ActivityAccumulator.query.filter_by(
+            enrollment_id=enrollment.enrollment_id
+        ).populate_existing().first()
+        
+        if not accumulator or accumulator.course_start_date != start_date:
+            return None
+        
+        fingerprint = ActivityAccumulatorService._source_fingerprints(
+            Enrollment.enrollment_id == enrollment.enrollment_id
+        ).get(enrollment.enrollment_id, EMPTY_FINGERPRINT)
+        if fingerprint != ActivityAccumulatorService._fingerprint(accumulator):
+            logger.info(f"Activity accumulator for enrollment {enrollment.enrollment_id} is out of date")
+            return None
+        
+        # Future-dated rows are excluded by the raw calculation
+        cutoff = (as_of.date() - start_date).days
+        if any(int(day) > cutoff for day in (accumulator.daily_clicks or {})):
+            return None
+        
+        return ActivityAccumulatorService.calculate_features(accumulator)
+    
+    @staticmethod
+    def reconcile(*criteria) -> Dict:
+        """
+        Rebuild missing or out-of-date accumulators of enrolled students
+        
+        Accumulator fingerprints are compared with grouped counts of the
+        source rows; mismatches come from writes that bypassed the flush hook
+        (seed scripts, raw SQL). Each rebuild runs in its own transaction.
+        
+        Args:
+            criteria: Extra filters on Enrollment (default all enrolled)
+        
+        Returns:
+            Dict with checked, rebuilt and failed counts
+        """
+        criteria = (Enrollment.enrollment_status == 'enrolled',) + criteria
+        
+        enrollments = db.session.query(
+            Enrollment.enrollment_id, Enrollment.offering_id, Enrollment.enrollment_date
+        ).filter(*criteria).all()
+        fingerprints = ActivityAccumulatorService._source_fingerprints(*criteria)
+        accumulators = {
+            accumulator.enrollment_id: accumulator
+            for accumulator in db.session.query(
+                ActivityAccumulator.enrollment_id,
+                ActivityAccumulator.course_start_date,
+                ActivityAccumulator.activity_count,
+                ActivityAccumulator.attendance_count,
+                ActivityAccumulator.attendance_clicks
+            ).join(
+                Enrollment, Enrollment.enrollment_id == ActivityAccumulator.enrollment_id
+            ).filter(*criteria).all()
+        }
+        
+        stale = []
+        for enrollment in enrollments:
+            start_date = get_offering_start_date(enrollment.offering_id) or enrollment.enrollment_date
+            accumulator = accumulators.get(enrollment.enrollment_id)
+            if (
+                accumulator is None
+                or accumulator.course_start_date != start_date
+                or ActivityAccumulatorService._fingerprint(accumulator)
+                != fingerprints.get(enrollment.enrollment_id, EMPTY_FINGERPRINT)
+            ):
+                stale.append((enrollment.enrollment_id, start_date))
+        
+        # End the read snapshot so each rebuild sees rows committed meanwhile
+        db.session.commit()
+        
+        failed = 0
+        for enrollment_id, start_date in stale:
+            try:
+                ActivityAccumulatorService.rebuild(enrollment_id, start_date)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                failed += 1
+                logger.error(f"Error rebuilding activity accumulator for enrollment {enrollment_id}: {str(e)}")
+        
+        stats = {'checked': len(enrollments), 'rebuilt': len(stale) - failed, 'failed': failed}
+        logger.info(f"Reconciled activity accumulators: {stats}")
+        return stats
+    
+    @staticmethod
+    def rebuild(enrollment_id: int, start_date) -> ActivityAccumulator:
+        """
+        Rebuild an enrollment's accumulator from its full attendance and LMS history
+        
+        The accumulator row is locked before the history is read, so writers
+        that commit after the rebuild apply their changes on top of it. The
+        caller commits.
+        """
+        accumulator = ActivityAccumulator.query.filter_by(
+            enrollment_id=enrollment_id
+        ).with_for_update().populate_existing().first()
+        
+        if accumulator:
+            accumulator.course_start_date = start_date
+        else:
+            accumulator = ActivityAccumulator(enrollment_id, start_date)
+            db.session.add(accumulator)
+        
+        state = _AccumulatorState()
+        
+        attendance_rows = db.session.query(
+            Attendance.attendance_id, Attendance.attendance_date, Attendance.status
+        ).filter(
+            Attendance.enrollment_id == enrollment_id,
+            Attendance.status.in_(list(ATTENDANCE_CLICK_MAPPING.keys()))
+        ).all()
+        
+        for attendance_id, attendance_date, status in attendance_rows:
+            state.apply_change(
+                attendance_change(enrollment_id, attendance_id, attendance_date, status), start_date
+            )
+        
+        activity_rows = db.session.query(
+            LMSActivity.activity_timestamp, LMSActivity.activity_type, LMSActivity.resource_id
+        ).filter(
+            LMSActivity.enrollment_id == enrollment_id
+        ).all()
+        
+        for activity_timestamp, activity_type, resource_id in activity_rows:
+            state.apply_change(
+                activity_change(enrollment_id, activity_timestamp, activity_type, resource_id), start_date
+            )
+        
+        state.save(accumulator)
+        
+        logger.info(f"Rebuilt activity accumulator for enrollment {enrollment_id}")
+        return accumulator
+    
+    @staticmethod
+    def calculate_features(accumulator: ActivityAccumulator) -> Dict:
+        """Calculate the activity features from accumulated aggregates"""
+        daily = accumulator.daily_clicks or {}
+        if not daily:
+            return dict(EMPTY_ACTIVITY_FEATURES)
+        
+        features = {}
+        days = np.array(sorted(int(day) for day in daily))
+        n = len(days)
+        
+        features['days_active'] = n
+        features['total_clicks'] = accumulator.sum_y
+        features['unique_materials'] = len(accumulator.site_counts or {}) + (accumulator.unnamed_sites or 0)
+        
+        first_day, last_day = int(days[0]), int(days[-1])
+        features['activity_rate'] = (n / max(last_day - first_day + 1, 1)) * 100
+        features['avg_clicks_per_active_day'] = accumulator.sum_y / n
+        features['first_activity_day'] = first_day
+        features['last_activity_day'] = last_day
+        
+        weekly = list((accumulator.weekly_clicks or {}).values())
+        features['weekly_activity_std'] = np.std(weekly) if len(weekly) > 1 else 0
+        
+        if n > 1:
+            gaps = np.diff(days)
+            features['activity_regularity'] = 1 / (np.mean(gaps) + 1) * 100
+            features['longest_inactivity_gap'] = int(gaps.max())
+            
+            # Least-squares slope from the running sums
+            denominator = n * accumulator.sum_xx - accumulator.sum_x ** 2
+            features['activity_trend'] = (
+                (n * accumulator.sum_xy - accumulator.sum_x * accumulator.sum_y) / denominator
+                if denominator else 0
+            )
+        else:
+            features['activity_regularity'] = 0
+            features['longest_inactivity_gap'] = 0
+            features['activity_trend'] = 0
+        
+        weekend_days = int(np.count_nonzero(np.mod(days, 7) >= 5))
+        features['weekend_activity_ratio'] = weekend_days / n * 100
+        
+        return features
+    
+    @staticmethod
+    def _fingerprint(accumulator) -> Tuple[int, int, int]:
+        """Source row fingerprint an accumulator was built from"""
+        return (
+            accumulator.activity_count or 0,
+            accumulator.attendance_count or 0,
+            accumulator.attendance_clicks or 0
+        )
+    
+    @staticmethod
+    def _source_fingerprints(*criteria) -> Dict[int, Tuple[int, int, int]]:
+        """
+        Current source row fingerprint per enrollment
+        
+        Args:
+            criteria: Filters on Enrollment selecting the enrollments
+        
+        Returns:
+            Dict of enrollment_id -> (activity rows, counted attendance rows,
+            attendance clicks); enrollments without any rows are left out
+        """
+        fingerprints = {}
+        
+        activity_rows = db.session.query(
+            LMSActivity.enrollment_id, func.count(LMSActivity.activity_id)
+        ).join(
+            Enrollment, Enrollment.enrollment_id == LMSActivity.enrollment_id
+        ).filter(*criteria).group_by(LMSActivity.enrollment_id).all()
+        
+        for enrollment_id, count in activity_rows:
+            fingerprints[enrollment_id] = (count, 0, 0)
+        
+        attendance_clicks = case(
+            *[(Attendance.status == status, clicks) for status, clicks in ATTENDANCE_CLICK_MAPPING.items()],
+            else_=0
+        )
+        attendance_rows = db.session.query(
+            Attendance.enrollment_id,
+            func.count(Attendance.attendance_id),
+            func.coalesce(func.sum(attendance_clicks), 0)
+        ).join(
+            Enrollment, Enrollment.enrollment_id == Attendance.enrollment_id
+        ).filter(
+            Attendance.status.in_(list(ATTENDANCE_CLICK_MAPPING.keys())), *criteria
+        ).group_by(Attendance.enrollment_id).all()
+        
+        for enrollment_id, count, clicks in attendance_rows:
+            activities = fingerprints.get(enrollment_id, EMPTY_FINGERPRINT)[0]
+            fingerprints[enrollment_id] = (activities, count, int(clicks))
+        
+        return fingerprints
+
+
+def _previous_value(instance, key: str):
+    """Value an attribute had before the pending flush"""
+    history = inspect(instance).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(instance, key)
+
+
+def _instance_change(instance, previous: bool, sign: int) -> Optional[VLEChange]:
+    """VLE change of a flushed Attendance or LMSActivity, from its current or previous values"""
+    if previous:
+        value = lambda key: _previous_value(instance, key)
+    else:
+        value = lambda key: getattr(instance, key)
+    
+    if isinstance(instance, Attendance):
+        return attendance_change(
+            value('enrollment_id'), instance.attendance_id,
+            value('attendance_date'), value('status'), sign
+        )
+    return activity_change(
+        value('enrollment_id'), value('activity_timestamp'),
+        value('activity_type'), value('resource_id'), sign
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _fold_flushed_vle_rows(session, flush_context):
+    """Apply attendance and LMS activity inserts, edits and deletes to accumulators in the same transaction"""
+    sources = (Attendance, LMSActivity)
+    changes = []
+    
+    for instance in session.new:
+        if isinstance(instance, sources):
+            changes.append(_instance_change(instance, previous=False, sign=1))
+    
+    for instance in session.deleted:
+        if isinstance(instance, sources):
+            changes.append(_instance_change(instance, previous=True, sign=-1))
+    
+    for instance in session.dirty:
+        if isinstance(instance, sources) and session.is_modified(instance):
+            removed = _instance_change(instance, previous=True, sign=-1)
+            added = _instance_change(instance, previous=False, sign=1)
+            if (removed and removed._replace(sign=1)) != added:
+                changes.extend([removed, added])
+    
+    if changes:
+        ActivityAccumulatorService.apply_changes(session.connection(), changes)
@@ -1,13 +1,15 @@
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from sqlalchemy import and_, or_
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import and_, or_, case, exists, func, select, true
 from backend.extensions import db
 from backend.models import (
     Alert, AlertType, Enrollment, Student, Faculty,
-    Attendance, LMSDailySummary, Prediction, Assessment,
-    AssessmentSubmission, CourseOffering
+    Attendance, LMSDailySummary, Prediction, LatestPrediction, CourseOffering
 )
 from backend.services.email_service import EmailService
+from backend.services.alert_type_registry import alert_type_registry, AlertTypeEntry
+from backend.services.missing_work_service import MissingWorkService
+from backend.services.engagement_stats_service import EngagementStatsService, daily_activity
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,6 +26,7 @@ class AlertService:
         self.LOW_ENGAGEMENT_THRESHOLD = 30
         self.FAILING_GRADE_THRESHOLD = 50
         self.MISSING_ASSIGNMENTS_THRESHOLD = 2
+        self.DEFAULT_COURSE_ENGAGEMENT = 10.0  # Activities per day before statistics exist
     
     def _load_thresholds(self):
         """Load thresholds from database config - called when needed"""
@@ -57,10 +60,23 @@ class AlertService:
             logger.warning(f"Could not load thresholds from database, using defaults: {str(e)}")
             self._thresholds_loaded = True  # Prevent repeated attempts
         
+    # (type name, severity, dedupe window in days, candidate finder)
+    ALERT_RULES = (
+        ('Low Attendance', 'warning', 7, '_find_low_attendance'),
+        ('Low Engagement', 'info', 7, '_find_low_engagement'),
+        ('Failing Grade Risk', 'critical', 3, '_find_grade_risk'),
+        ('Missing Assignments', 'warning', 7, '_find_missing_assignments'),
+        ('Improvement Needed', 'warning', 7, '_find_declining_performance'),
+    )
+    
     def check_and_create_alerts(self, enrollment_id: int = None):
         """
         Check all alert conditions and create alerts as needed
         
+        Each rule is one aggregate query across the enrollments in scope,
+        with recently alerted enrollments removed by an anti-join; new alerts
+        for a rule are inserted in one statement.
+        
         Args:
             enrollment_id: Optional - check specific enrollment or all if None
         """
@@ -68,273 +84,241 @@ class AlertService:
         self._load_thresholds()
         
         try:
+            scope = select(Enrollment.enrollment_id)
             if enrollment_id:
-                enrollments = [Enrollment.query.get(enrollment_id)]
+                scope = scope.where(Enrollment.enrollment_id == enrollment_id)
             else:
-                # Get all active enrollments
-                enrollments = Enrollment.query.filter_by(
-                    enrollment_status='enrolled'
-                ).all()
+                # All active enrollments
+                scope = scope.where(Enrollment.enrollment_status == 'enrolled')
             
-            logger.info(f"Checking alerts for {len(enrollments)} enrollments")
+            now = datetime.now()
+            new_alerts = []
             
-            for enrollment in enrollments:
-                if enrollment:
-                    self._check_attendance_alert(enrollment)
-                    self._check_engagement_alert(enrollment)
-                    self._check_grade_risk_alert(enrollment)
-                    self._check_missing_assignments_alert(enrollment)
-                    self._check_improvement_needed_alert(enrollment)
+            for type_name, severity, dedupe_days, finder in self.ALERT_RULES:
+                try:
+                    alert_type = alert_type_registry.get(type_name)
+                    not_recent = self._not_recently_alerted(
+                        alert_type, now - timedelta(days=dedupe_days)
+                    )
+                    candidates = getattr(self, finder)(scope, not_recent, now)
+                    
+                    if candidates:
+                        new_alerts.extend(self._insert_alerts(
+                            alert_type, type_name, severity, candidates, now
+                        ))
+                        
+                except Exception as e:
+                    logger.error(f"Error checking {type_name} alerts: {str(e)}")
             
             db.session.commit()
-            logger.info("Alert checking completed")
+            logger.info(f"Alert checking completed: {len(new_alerts)} alerts created")
             
         except Exception as e:
             logger.error(f"Error checking alerts: {str(e)}")
             db.session.rollback()
             raise
+        
+        # Notify only once the alerts are committed
+        for alert in new_alerts:
+            if alert.severity == 'critical':
+                self._send_alert_email(alert, alert.enrollment_id)
     
-    def _check_attendance_alert(self, enrollment: Enrollment):
-        """Check if student has low attendance"""
-        try:
-            # Calculate attendance rate for last 30 days
-            thirty_days_ago = datetime.now().date() - timedelta(days=30)
-            
-            attendance_records = Attendance.query.filter(
-                and_(
-                    Attendance.enrollment_id == enrollment.enrollment_id,
-                    Attendance.attendance_date >= thirty_days_ago
-                )
-            ).all()
-            
-            if not attendance_records:
-                return
-            
-            present_count = sum(1 for a in attendance_records 
-                              if a.status in ['present', 'late'])
-            total_count = len(attendance_records)
-            attendance_rate = (present_count / total_count * 100) if total_count > 0 else 100
-            
-            if attendance_rate < self.ATTENDANCE_THRESHOLD:
-                # Check if alert already exists in last 7 days
-                recent_alert = self._get_recent_alert(
-                    enrollment.enrollment_id, 'Low Attendance', days=7
-                )
-                
-                if not recent_alert:
-                    self._create_alert(
-                        enrollment_id=enrollment.enrollment_id,
-                        type_name='Low Attendance',
-                        severity='warning',
-                        message=f"Attendance rate is {attendance_rate:.1f}% (below {self.ATTENDANCE_THRESHOLD}% threshold)"
-                    )
-                    
-        except Exception as e:
-            logger.error(f"Error checking attendance alert: {str(e)}")
+    def _not_recently_alerted(self, alert_type: Optional[AlertTypeEntry], cutoff: datetime):
+        """Build an anti-join filter excluding enrollments alerted since cutoff"""
+        def not_recent(enrollment_column):
+            if alert_type is None:
+                return true()
+            return ~exists().where(and_(
+                Alert.enrollment_id == enrollment_column,
+                Alert.type_id == alert_type.type_id,
+                Alert.triggered_date >= cutoff
+            ))
+        return not_recent
     
-    def _check_engagement_alert(self, enrollment: Enrollment):
-        """Check if student has low LMS engagement"""
-        try:
-            # Get engagement data for last 7 days
-            seven_days_ago = datetime.now().date() - timedelta(days=7)
-            
-            daily_summaries = LMSDailySummary.query.filter(
-                and_(
-                    LMSDailySummary.enrollment_id == enrollment.enrollment_id,
-                    LMSDailySummary.summary_date >= seven_days_ago
-                )
-            ).all()
-            
-            if not daily_summaries:
-                return
-            
-            # Calculate average daily engagement
-            total_activities = sum(
-                s.resource_views + s.forum_posts + s.pages_viewed 
-                for s in daily_summaries
+    def _find_low_attendance(self, scope, not_recent, now) -> List[Tuple[int, str]]:
+        """Enrollments whose attendance over the last 30 days is below threshold"""
+        thirty_days_ago = now.date() - timedelta(days=30)
+        total = func.count(Attendance.attendance_id)
+        attended = func.sum(case((Attendance.status.in_(['present', 'late']), 1), else_=0))
+        
+        rows = db.session.query(
+            Attendance.enrollment_id, total.label('total'), attended.label('attended')
+        ).filter(
+            Attendance.enrollment_id.in_(scope),
+            Attendance.attendance_date >= thirty_days_ago,
+            not_recent(Attendance.enrollment_id)
+        ).group_by(
+            Attendance.enrollment_id
+        ).having(
+            attended * 100 < self.ATTENDANCE_THRESHOLD * total
+        ).all()
+        
+        return [
+            (
+                row.enrollment_id,
+                f"Attendance rate is {row.attended / row.total * 100:.1f}% (below {self.ATTENDANCE_THRESHOLD}% threshold)"
             )
-            avg_activities = total_activities / len(daily_summaries)
-            
-            # Get course average for comparison
-            course_avg = self._get_course_average_engagement(enrollment.offering_id)
+            for row in rows
+        ]
+    
+    def _find_low_engagement(self, scope, not_recent, now) -> List[Tuple[int, str]]:
+        """Enrollments whose LMS activity over the last 7 days is low for their course"""
+        # Same window as the offering baseline it is compared with
+        today = now.date()
+        window_start = today - timedelta(days=EngagementStatsService.WINDOW_DAYS)
+        
+        rows = db.session.query(
+            LMSDailySummary.enrollment_id,
+            Enrollment.offering_id,
+            func.avg(daily_activity()).label('avg_activities')
+        ).join(
+            Enrollment, Enrollment.enrollment_id == LMSDailySummary.enrollment_id
+        ).filter(
+            LMSDailySummary.enrollment_id.in_(scope),
+            LMSDailySummary.summary_date > window_start,
+            LMSDailySummary.summary_date <= today,
+            not_recent(LMSDailySummary.enrollment_id)
+        ).group_by(
+            LMSDailySummary.enrollment_id, Enrollment.offering_id
+        ).all()
+        
+        candidates = []
+        for row in rows:
+            course_avg = self._get_course_average_engagement(row.offering_id, today)
+            avg_activities = float(row.avg_activities)
             
             if avg_activities < (course_avg * self.LOW_ENGAGEMENT_THRESHOLD / 100):
-                recent_alert = self._get_recent_alert(
-                    enrollment.enrollment_id, 'Low Engagement', days=7
-                )
-                
-                if not recent_alert:
-                    self._create_alert(
-                        enrollment_id=enrollment.enrollment_id,
-                        type_name='Low Engagement',
-                        severity='info',
-                        message=f"LMS activity is {avg_activities:.1f} per day (course average: {course_avg:.1f})"
-                    )
-                    
-        except Exception as e:
-            logger.error(f"Error checking engagement alert: {str(e)}")
+                candidates.append((
+                    row.enrollment_id,
+                    f"LMS activity is {avg_activities:.1f} per day (course average: {course_avg:.1f})"
+                ))
+        
+        return candidates
     
-    def _check_grade_risk_alert(self, enrollment: Enrollment):
-        """Check if student is at risk of failing based on predictions"""
-        try:
-            # Get latest prediction
-            latest_prediction = Prediction.query.filter_by(
-                enrollment_id=enrollment.enrollment_id
-            ).order_by(Prediction.prediction_date.desc()).first()
-            
-            if not latest_prediction:
-                return
-            
-            # Check if predicted to fail or high risk
-            if (latest_prediction.predicted_grade == 'F' or 
-                latest_prediction.risk_level == 'high'):
-                
-                recent_alert = self._get_recent_alert(
-                    enrollment.enrollment_id, 'Failing Grade Risk', days=3
-                )
-                
-                if not recent_alert:
-                    self._create_alert(
-                        enrollment_id=enrollment.enrollment_id,
-                        type_name='Failing Grade Risk',
-                        severity='critical',
-                        message=f"Predicted grade: {latest_prediction.predicted_grade} with {latest_prediction.confidence_score:.0%} confidence"
-                    )
-                    
-        except Exception as e:
-            logger.error(f"Error checking grade risk alert: {str(e)}")
+    def _find_grade_risk(self, scope, not_recent, now) -> List[Tuple[int, str]]:
+        """Enrollments whose latest prediction is a failing grade or high risk"""
+        latest = LatestPrediction.latest_select(scope).subquery()
+        
+        rows = db.session.query(
+            Prediction.enrollment_id,
+            Prediction.predicted_grade,
+            Prediction.confidence_score
+        ).join(
+            latest, latest.c.prediction_id == Prediction.prediction_id
+        ).filter(
+            or_(Prediction.predicted_grade == 'F', Prediction.risk_level == 'high'),
+            not_recent(Prediction.enrollment_id)
+        ).all()
+        
+        return [
+            (
+                row.enrollment_id,
+                f"Predicted grade: {row.predicted_grade} with {row.confidence_score:.0%} confidence"
+            )
+            for row in rows
+        ]
     
-    def _check_missing_assignments_alert(self, enrollment: Enrollment):
-        """Check if student has missing assignments"""
-        try:
-            # Get all published assessments for the course that are past due
-            assessments = Assessment.query.filter_by(
-                offering_id=enrollment.offering_id,
-                is_published=True
-            ).filter(
-                Assessment.due_date <= datetime.now()
-            ).all()
-            
-            if not assessments:
-                return
-            
-            # Count missing submissions
-            missing_count = 0
-            for assessment in assessments:
-                submission = AssessmentSubmission.query.filter_by(
-                    assessment_id=assessment.assessment_id,
-                    enrollment_id=enrollment.enrollment_id
-                ).first()
-                
-                # Check if no submission exists (missing)
-                if not submission:
-                    missing_count += 1
-                # Or if submission exists but has no score (submitted but not graded is OK)
-                # We only count it as missing if there's no submission at all
-            
-            if missing_count >= self.MISSING_ASSIGNMENTS_THRESHOLD:
-                recent_alert = self._get_recent_alert(
-                    enrollment.enrollment_id, 'Missing Assignments', days=7
-                )
-                
-                if not recent_alert:
-                    self._create_alert(
-                        enrollment_id=enrollment.enrollment_id,
-                        type_name='Missing Assignments',
-                        severity='warning',
-                        message=f"{missing_count} assignments are missing or not submitted"
-                    )
-                    
-        except Exception as e:
-            logger.error(f"Error checking missing assignments alert: {str(e)}")
+    def _find_missing_assignments(self, scope, not_recent, now) -> List[Tuple[int, str]]:
+        """Enrollments with too many past-due published assessments never submitted"""
+        enrollments = db.session.query(
+            Enrollment.enrollment_id, Enrollment.offering_id
+        ).filter(
+            Enrollment.enrollment_id.in_(scope),
+            not_recent(Enrollment.enrollment_id)
+        ).all()
+        
+        missing_counts = MissingWorkService.count_missing(enrollments, as_of=now)
+        
+        return [
+            (enrollment_id, f"{missing_count} assignments are missing or not submitted")
+            for enrollment_id, missing_count in missing_counts.items()
+            if missing_count >= self.MISSING_ASSIGNMENTS_THRESHOLD
+        ]
     
-    def _check_improvement_needed_alert(self, enrollment: Enrollment):
-        """Check if student's performance is declining"""
-        try:
-            # Get last 5 predictions to check trend
-            predictions = Prediction.query.filter_by(
-                enrollment_id=enrollment.enrollment_id
-            ).order_by(Prediction.prediction_date.desc()).limit(5).all()
-            
-            if len(predictions) < 3:
-                return
-            
-            # Simple trend analysis - check if risk level is increasing
-            risk_levels = {'low': 0, 'medium': 1, 'high': 2}
-            risk_values = [risk_levels.get(p.risk_level, 0) for p in predictions]
-            
-            # Check if risk is increasing (newer predictions have higher risk)
-            if risk_values[0] > risk_values[-1] and risk_values[0] >= 1:
-                recent_alert = self._get_recent_alert(
-                    enrollment.enrollment_id, 'Improvement Needed', days=7
-                )
-                
-                if not recent_alert:
-                    self._create_alert(
-                        enrollment_id=enrollment.enrollment_id,
-                        type_name='Improvement Needed',
-                        severity='warning',
-                        message=f"Performance trend shows declining grades - current risk level: {predictions[0].risk_level}"
-                    )
-                    
-        except Exception as e:
-            logger.error(f"Error checking improvement alert: {str(e)}")
+    def _find_declining_performance(self, scope, not_recent, now) -> List[Tuple[int, str]]:
+        """Enrollments whose risk rose across their last five predictions"""
+        ranked = select(
+            Prediction.enrollment_id,
+            Prediction.risk_level,
+            func.row_number().over(
+                partition_by=Prediction.enrollment_id,
+                order_by=(Prediction.prediction_date.desc(), Prediction.prediction_id.desc())
+            ).label('position')
+        ).where(
+            Prediction.enrollment_id.in_(scope),
+            not_recent(Prediction.enrollment_id)
+        ).subquery()
+        
+        rows = db.session.query(
+            ranked.c.enrollment_id, ranked.c.risk_level
+        ).filter(
+            ranked.c.position <= 5
+        ).order_by(
+            ranked.c.enrollment_id, ranked.c.position
+        ).all()
+        
+        # Newest first per enrollment
+        history = {}
+        for row in rows:
+            history.setdefault(row.enrollment_id, []).append(row.risk_level)
+        
+        risk_levels = {'low': 0, 'medium': 1, 'high': 2}
+        candidates = []
+        for enrollment_id, levels in history.items():
+            if len(levels) < 3:
+                continue
+            
+            newest = risk_levels.get(levels[0], 0)
+            oldest = risk_levels.get(levels[-1], 0)
+            if newest > oldest and newest >= 1:
+                candidates.append((
+                    enrollment_id,
+                    f"Performance trend shows declining grades - current risk level: {levels[0]}"
+                ))
+        
+        return candidates
     
-    def _create_alert(self, enrollment_id: int, type_name: str, 
-                     severity: str, message: str):
-        """Create a new alert"""
-        try:
-            # Get or create alert type
-            alert_type = AlertType.query.filter_by(type_name=type_name).first()
-            if not alert_type:
-                alert_type = AlertType(
-                    type_name=type_name,
-                    severity=severity,
-                    description=message
-                )
-                db.session.add(alert_type)
-                db.session.flush()
-            
-            # Create alert
-            alert = Alert(
+    def _insert_alerts(self, alert_type: Optional[AlertTypeEntry], type_name: str, severity: str,
+                       candidates: List[Tuple[int, str]], triggered_date: datetime) -> List[Alert]:
+        """Insert one rule's alerts in a single statement"""
+        if not alert_type:
+            alert_type = alert_type_registry.get_or_create(
+                type_name, severity, description=candidates[0][1]
+            )
+        
+        alerts = [
+            Alert(
                 enrollment_id=enrollment_id,
                 type_id=alert_type.type_id,
-                triggered_date=datetime.now(),
+                triggered_date=triggered_date,
                 alert_message=message,
                 severity=severity
             )
-            db.session.add(alert)
-            
-            logger.info(f"Created {severity} alert for enrollment {enrollment_id}: {type_name}")
-            
-            # Send email notification for critical alerts
-            if severity == 'critical':
-                self._send_alert_email(alert, enrollment_id)
-                
-        except Exception as e:
-            logger.error(f"Error creating alert: {str(e)}")
-    
-    def _get_recent_alert(self, enrollment_id: int, type_name: str, 
-                         days: int) -> Optional[Alert]:
-        """Check if similar alert exists in recent days"""
-        cutoff_date = datetime.now() - timedelta(days=days)
+            for enrollment_id, message in candidates
+        ]
         
-        alert_type = AlertType.query.filter_by(type_name=type_name).first()
-        if not alert_type:
-            return None
+        db.session.execute(Alert.__table__.insert(), [
+            {
+                'enrollment_id': alert.enrollment_id,
+                'type_id': alert.type_id,
+                'triggered_date': alert.triggered_date,
+                'alert_message': alert.alert_message,
+                'severity': alert.severity,
+                'is_read': False,
+                'is_resolved': False
+            }
+            for alert in alerts
+        ])
         
-        return Alert.query.filter(
-            and_(
-                Alert.enrollment_id == enrollment_id,
-                Alert.type_id == alert_type.type_id,
-                Alert.triggered_date >= cutoff_date
-            )
-        ).first()
+        logger.info(f"Created {len(alerts)} {severity} alerts: {type_name}")
+        return alerts
     
-    def _get_course_average_engagement(self, offering_id: int) -> float:
-        """Calculate average engagement for a course"""
-        # This is simplified - in production, calculate from all students
-        return 10.0  # Default average activities per day
+    def _get_course_average_engagement(self, offering_id: int, as_of=None) -> float:
+        """Average daily engagement for a course, from recent nightly offering statistics"""
+        stats = EngagementStatsService.get_offering_stats(offering_id, as_of)
+        if not stats or not stats['enrollment_count']:
+            return self.DEFAULT_COURSE_ENGAGEMENT
+        return stats['mean_activity']
     
     def _send_alert_email(self, alert: Alert, enrollment_id: int):
         """Send email notification for critical alerts"""
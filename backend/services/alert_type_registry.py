@@ -0,0 +1,172 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+from typing import Dict, Optional
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from backend.models import AlertType, SystemConfig
+from backend.extensions import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Immutable view of an alert_types row
+AlertTypeEntry = namedtuple('AlertTypeEntry', ['type_id', 'type_name', 'severity', 'description'])
+
+VERSION_CONFIG_KEY = 'alert_types_version'
+
+
+class AlertTypeRegistry:
+    """
+    Process-wide alert types keyed by type_name
+    
+    All types are loaded in one query on first use and served from memory.
+    Any change to alert_types bumps a version stamp in system_config; each
+    process compares it at most every VERSION_CHECK_INTERVAL seconds and
+    reloads when it moved.
+    """
+    
+    VERSION_CHECK_INTERVAL = 60  # seconds
+    
+    def __init__(self):
+        self._types: Optional[Dict[str, AlertTypeEntry]] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+    
+    def get(self, type_name: str) -> Optional[AlertTypeEntry]:
+        """Get an alert type by name, or None if it does not exist"""
+        return self._current().get(type_name)
+    
+    def get_or_create(self, type_name: str, severity: str,
+                      description: Optional[str] = None) -> AlertTypeEntry:
+        """
+        Get an alert type by name, creating it if needed
+        
+        The row is created in its own committed transaction so the cached id
+        never refers to a row the caller might roll back. Concurrent creators
+        are resolved by the unique type_name key.
+        """
+        entry = self.get(type_name)
+        if entry:
+            return entry
+        
+        with self._lock:
+            entry = self.load().get(type_name)
+            if entry:
+                return entry
+            
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(AlertType.__table__.insert().values(
+                        type_name=type_name,
+                        severity=severity,
+                        description=description
+                    ))
+                    self._bump_version(connection)
+                logger.info(f"Created alert type {type_name}")
+            except IntegrityError:
+                logger.debug(f"Alert type {type_name} was created concurrently")
+            
+            return self.load()[type_name]
+    
+    def all(self) -> Dict[str, AlertTypeEntry]:
+        """Get all alert types by name"""
+        return dict(self._current())
+    
+    def load(self) -> Dict[str, AlertTypeEntry]:
+        """Reload every alert type and the version stamp in one round trip each"""
+        table = AlertType.__table__
+        
+        with db.engine.connect() as connection:
+            version = self._read_version(connection)
+            rows = connection.execute(select(
+                table.c.type_id, table.c.type_name, table.c.severity, table.c.description
+            ).order_by(table.c.type_id)).all()
+        
+        types = {}
+        for row in rows:
+            # Oldest row wins if a legacy table holds duplicate names
+            types.setdefault(row.type_name, AlertTypeEntry(*row))
+        
+        with self._lock:
+            self._types = types
+            self._version = version
+            self._checked_at = time.monotonic()
+        
+        logger.debug(f"Loaded {len(types)} alert types (version {version})")
+        return types
+    
+    def invalidate(self):
+        """Force a reload on next access"""
+        with self._lock:
+            self._types = None
+    
+    def _current(self) -> Dict[str, AlertTypeEntry]:
+        """Return the loaded types, reloading when missing or out of date"""
+        with self._lock:
+            types = self._types
+            due = time.monotonic() - self._checked_at >= self.VERSION_CHECK_INTERVAL
+        
+        if types is None:
+            return self.load()
+        
+        if due:
+            with db.engine.connect() as connection:
+                version = self._read_version(connection)
+            
+            if version != self._version:
+                return self.load()
+            
+            with self._lock:
+                self._checked_at = time.monotonic()
+        
+        return types
+    
+    @staticmethod
+    def _read_version(connection) -> Optional[str]:
+        """Read the current alert types version stamp"""
+        table = SystemConfig.__table__
+        return connection.execute(
+            select(table.c.config_value).where(table.c.config_key == VERSION_CONFIG_KEY)
+        ).scalar()
+    
+    @staticmethod
+    def _bump_version(connection):
+        """Stamp a new alert types version so every process reloads"""
+        table = SystemConfig.__table__
+        version = uuid.uuid4().hex
+        
+        result = connection.execute(
+            table.update().where(table.c.config_key == VERSION_CONFIG_KEY).values(config_value=version)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                config_key=VERSION_CONFIG_KEY,
+                config_value=version,
+                description='Changes whenever alert types change'
+            ))
+
+
+alert_type_registry = AlertTypeRegistry()
+
+
+def _alert_types_changed(mapper, connection, target):
+    """Bump the version when alert types change through the ORM"""
+    AlertTypeRegistry._bump_version(connection)
+    session = object_session(target)
+    if session is not None:
+        session.info['alert_types_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _reload_alert_types(session):
+    """Drop this process's copy once the change is visible to other connections"""
+    if session.info.pop('alert_types_changed', False):
+        alert_type_registry.invalidate()
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(AlertType, _event_name, _alert_types_changed)
@@ -1,11 +1,11 @@
 # backend/services/assessment_service.py - FIXED VERSION
 from backend.models import (
     Assessment, AssessmentType, AssessmentSubmission, Enrollment, 
-    Student, CourseOffering, Course,User 
+    Student, CourseOffering, Course,User, FeatureCache
 )
 from backend.extensions import db
 from datetime import datetime, date
-from sqlalchemy import func, and_, desc
+from sqlalchemy import func, and_, desc, bindparam
 import logging
 import os
 from flask import send_file, current_app
@@ -325,39 +325,172 @@ class AssessmentService:
     
     @staticmethod
     def bulk_enter_grades(grades_data, graded_by=None):
-        """Enter grades for multiple students"""
+        """
+        Enter grades for multiple students in a single transaction
+        
+        Assessments, target enrollments and existing submissions are each
+        loaded in one query, every row is validated in one pass, and the
+        submissions are written with one bulk update and one bulk insert.
+        Returns one result per input row, in input order.
+        """
+        results = [None] * len(grades_data)
+        grades = {}   # (enrollment_id, assessment_id) -> values, later rows win
+        indexes = {}  # (enrollment_id, assessment_id) -> input positions
+        
+        def failure(grade_data, error):
+            return {
+                'enrollment_id': grade_data.get('enrollment_id'),
+                'success': False,
+                'error': error
+            }
+        
         try:
-            results = []
-            
-            for grade_data in grades_data:
-                submission, error = AssessmentService.enter_grade(
-                    enrollment_id=grade_data['enrollment_id'],
-                    assessment_id=grade_data['assessment_id'],
-                    score=grade_data['score'],
-                    feedback=grade_data.get('feedback'),
-                    graded_by=graded_by
-                )
+            rows = []
+            for index, grade_data in enumerate(grades_data):
+                try:
+                    rows.append((
+                        index,
+                        int(grade_data['enrollment_id']),
+                        int(grade_data['assessment_id']),
+                        float(grade_data['score'])
+                    ))
+                except KeyError:
+                    results[index] = failure(grade_data, 'Missing required fields')
+                except (TypeError, ValueError):
+                    results[index] = failure(grade_data, 'Invalid enrollment, assessment or score')
+            
+            assessment_ids = {assessment_id for _, _, assessment_id, _ in rows}
+            enrollment_ids = {enrollment_id for _, enrollment_id, _, _ in rows}
+            
+            assessments = {
+                assessment_id: (offering_id, float(max_score))
+                for assessment_id, offering_id, max_score in db.session.query(
+                    Assessment.assessment_id, Assessment.offering_id, Assessment.max_score
+                ).filter(Assessment.assessment_id.in_(assessment_ids)).all()
+            } if assessment_ids else {}
+            
+            enrollment_offerings = dict(
+                db.session.query(Enrollment.enrollment_id, Enrollment.offering_id).filter(
+                    Enrollment.enrollment_id.in_(enrollment_ids)
+                ).all()
+            ) if enrollment_ids else {}
+            
+            # Validate every row against its assessment in one pass
+            for index, enrollment_id, assessment_id, score in rows:
+                grade_data = grades_data[index]
                 
-                if submission:
-                    results.append({
-                        'enrollment_id': grade_data['enrollment_id'],
-                        'success': True,
-                        'submission_id': submission.submission_id
-                    })
-                else:
-                    results.append({
-                        'enrollment_id': grade_data['enrollment_id'],
-                        'success': False,
-                        'error': error
-                    })
+                if assessment_id not in assessments:
+                    results[index] = failure(grade_data, 'Assessment not found')
+                    continue
+                
+                offering_id, max_score = assessments[assessment_id]
+                if enrollment_offerings.get(enrollment_id) != offering_id:
+                    results[index] = failure(grade_data, 'Enrollment not found for this assessment')
+                    continue
+                
+                if score < 0 or score > max_score:
+                    results[index] = failure(grade_data, f"Score must be between 0 and {max_score:g}")
+                    continue
+                
+                key = (enrollment_id, assessment_id)
+                grades[key] = {
+                    'score': score,
+                    'percentage': (score / max_score) * 100 if max_score else 0,
+                    'feedback': grade_data.get('feedback')
+                }
+                indexes.setdefault(key, []).append(index)
             
-            return results
+            if grades:
+                saved = AssessmentService._write_grades(grades, graded_by)
+                
+                for key, positions in indexes.items():
+                    for index in positions:
+                        results[index] = {
+                            'enrollment_id': grades_data[index]['enrollment_id'],
+                            'success': True,
+                            'submission_id': saved[key]
+                        }
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error in bulk grade entry: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return []
+            # Nothing was saved; every row without a result failed with the batch
+            for index, result in enumerate(results):
+                if result is None:
+                    results[index] = failure(grades_data[index], 'Failed to save grade')
+        
+        successful = sum(1 for result in results if result['success'])
+        logger.info(f"Bulk grade entry completed: {successful}/{len(grades_data)} successful")
+        return results
+    
+    @staticmethod
+    def _write_grades(grades, graded_by=None):
+        """
+        Write validated grades as one bulk update plus one bulk insert, then commit
+        
+        Args:
+            grades: Dict of (enrollment_id, assessment_id) -> score, percentage, feedback
+            graded_by: Grader stored on every submission
+        
+        Returns:
+            Dict of (enrollment_id, assessment_id) -> submission_id
+        """
+        table = AssessmentSubmission.__table__
+        now = datetime.utcnow()
+        enrollment_ids = {enrollment_id for enrollment_id, _ in grades}
+        assessment_ids = {assessment_id for _, assessment_id in grades}
+        
+        def load_submission_ids():
+            """First submission per (enrollment, assessment), matching enter_grade"""
+            submission_ids = {}
+            for submission_id, enrollment_id, assessment_id in db.session.query(
+                AssessmentSubmission.submission_id,
+                AssessmentSubmission.enrollment_id,
+                AssessmentSubmission.assessment_id
+            ).filter(
+                AssessmentSubmission.enrollment_id.in_(enrollment_ids),
+                AssessmentSubmission.assessment_id.in_(assessment_ids)
+            ).order_by(AssessmentSubmission.submission_id).all():
+                key = (enrollment_id, assessment_id)
+                if key in grades:
+                    submission_ids.setdefault(key, submission_id)
+            return submission_ids
+        
+        existing = load_submission_ids()
+        
+        updates = [
+            dict(values, b_submission_id=existing[key], graded_date=now, graded_by=graded_by)
+            for key, values in grades.items() if key in existing
+        ]
+        inserts = [
+            dict(
+                values,
+                enrollment_id=key[0],
+                assessment_id=key[1],
+                submission_date=now,  # Auto-submit when graded
+                graded_date=now,
+                graded_by=graded_by
+            )
+            for key, values in grades.items() if key not in existing
+        ]
+        
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.submission_id == bindparam('b_submission_id')),
+                updates
+            )
+            # Core updates bypass the flush hook that invalidates cached features
+            FeatureCache.invalidate(
+                db.session.connection(), {key[0] for key in grades if key in existing}
+            )
+        
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+            existing = load_submission_ids()
+        
+        db.session.commit()
+        logger.info(f"Wrote grades: {len(inserts)} created, {len(updates)} updated")
+        return existing
     
     @staticmethod
     def get_student_assessments(student_id, offering_id=None):
@@ -2,13 +2,23 @@
 from backend.models.tracking import Attendance
 from backend.models.academic import Enrollment, CourseOffering, Course
 from backend.models.user import Student, User
+from backend.models.prediction import FeatureCache
 from backend.extensions import db
-from sqlalchemy import func, desc, and_, case
+from backend.services.activity_accumulator_service import ActivityAccumulatorService
+from sqlalchemy import func, desc, and_, case, bindparam
+from collections import namedtuple
 from datetime import datetime, date, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+VALID_ATTENDANCE_STATUSES = ['present', 'absent', 'late', 'excused']
+
+# Attendance values as written by a bulk upsert
+AttendanceChange = namedtuple(
+    'AttendanceChange', ['attendance_id', 'enrollment_id', 'attendance_date', 'status']
+)
+
 class AttendanceService:
     
     @staticmethod
@@ -22,8 +32,7 @@ class AttendanceService:
                 return None
             
             # Validate status
-            valid_statuses = ['present', 'absent', 'late', 'excused']
-            if status not in valid_statuses:
+            if status not in VALID_ATTENDANCE_STATUSES:
                 logger.error(f"Invalid status: {status}")
                 return None
             
@@ -55,6 +64,7 @@ class AttendanceService:
                 db.session.add(attendance_record)
                 logger.info(f"Created new attendance record for enrollment {enrollment_id}")
             
+            # The flush hook keeps the enrollment's running activity aggregates current
             db.session.commit()
             return attendance_record
             
@@ -67,61 +77,182 @@ class AttendanceService:
     
     @staticmethod
     def bulk_mark_attendance(attendance_data, recorded_by=None):
-        """Mark attendance for multiple students"""
-        results = []
-        successful_count = 0
+        """
+        Mark attendance for multiple students in a single transaction
+        
+        The whole payload is validated first, existing rows for the
+        (enrollment_id, attendance_date) pairs are prefetched in one query, and
+        inserts and updates are each written as one executemany statement.
+        Returns one result per input record, in input order.
+        """
+        results = [None] * len(attendance_data)
+        records = {}  # (enrollment_id, attendance_date) -> values, later records win
+        indexes = {}  # (enrollment_id, attendance_date) -> input positions
+        
+        def failure(data, error):
+            return {
+                'enrollment_id': data.get('enrollment_id', 'unknown'),
+                'success': False,
+                'error': error
+            }
         
         try:
+            # Validate the whole payload before touching anything
+            enrollment_ids = set()
             for data in attendance_data:
                 try:
-                    # Validate required fields
-                    if not all(key in data for key in ['enrollment_id', 'attendance_date', 'status']):
-                        results.append({
-                            'enrollment_id': data.get('enrollment_id', 'unknown'),
-                            'success': False,
-                            'error': 'Missing required fields'
-                        })
-                        continue
-                    
-                    # Mark individual attendance
-                    result = AttendanceService.mark_attendance(
-                        enrollment_id=data['enrollment_id'],
-                        attendance_date=data['attendance_date'],
-                        status=data['status'],
-                        check_in_time=data.get('check_in_time'),
-                        notes=data.get('notes'),
-                        recorded_by=recorded_by
-                    )
-                    
-                    if result:
-                        results.append({
-                            'enrollment_id': data['enrollment_id'],
+                    enrollment_ids.add(int(data['enrollment_id']))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            
+            known_enrollments = {
+                enrollment_id for (enrollment_id,) in db.session.query(
+                    Enrollment.enrollment_id
+                ).filter(Enrollment.enrollment_id.in_(enrollment_ids)).all()
+            } if enrollment_ids else set()
+            
+            for index, data in enumerate(attendance_data):
+                if not all(key in data for key in ['enrollment_id', 'attendance_date', 'status']):
+                    results[index] = failure(data, 'Missing required fields')
+                    continue
+                
+                if data['status'] not in VALID_ATTENDANCE_STATUSES:
+                    results[index] = failure(data, f"Invalid status: {data['status']}")
+                    continue
+                
+                try:
+                    enrollment_id = int(data['enrollment_id'])
+                except (TypeError, ValueError):
+                    enrollment_id = None
+                if enrollment_id not in known_enrollments:
+                    results[index] = failure(data, 'Enrollment not found')
+                    continue
+                
+                key = (enrollment_id, data['attendance_date'])
+                records[key] = {
+                    'status': data['status'],
+                    'check_in_time': data.get('check_in_time'),
+                    'notes': data.get('notes')
+                }
+                indexes.setdefault(key, []).append(index)
+            
+            if records:
+                saved, existing = AttendanceService._upsert_attendance(records, recorded_by)
+                
+                for key, positions in indexes.items():
+                    for position, index in enumerate(positions):
+                        results[index] = {
+                            'enrollment_id': attendance_data[index]['enrollment_id'],
                             'success': True,
-                            'attendance_id': result.attendance_id,
-                            'action': 'created'
-                        })
-                        successful_count += 1
-                    else:
-                        results.append({
-                            'enrollment_id': data['enrollment_id'],
-                            'success': False,
-                            'error': 'Failed to save attendance record'
-                        })
-                        
-                except Exception as e:
-                    logger.error(f"Error processing attendance for enrollment {data.get('enrollment_id')}: {str(e)}")
-                    results.append({
-                        'enrollment_id': data.get('enrollment_id', 'unknown'),
-                        'success': False,
-                        'error': str(e)
-                    })
-            
-            logger.info(f"Bulk attendance completed: {successful_count}/{len(attendance_data)} successful")
-            return results
+                            'attendance_id': saved[key],
+                            'action': 'updated' if key in existing or position > 0 else 'created'
+                        }
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Error in bulk attendance marking: {str(e)}")
-            return []
+            # Nothing was saved; every record without a result failed with the batch
+            for index, result in enumerate(results):
+                if result is None:
+                    results[index] = failure(attendance_data[index], 'Failed to save attendance record')
+        
+        successful_count = sum(1 for result in results if result['success'])
+        logger.info(f"Bulk attendance completed: {successful_count}/{len(attendance_data)} successful")
+        return results
+    
+    @staticmethod
+    def _upsert_attendance(records, recorded_by=None):
+        """
+        Insert or update attendance rows keyed by (enrollment_id, attendance_date)
+        
+        Args:
+            records: Dict of (enrollment_id, attendance_date) -> status, check_in_time, notes
+            recorded_by: Recorder stored on every row
+        
+        Returns:
+            (attendance_id by key, existing rows by key); commits on success
+        """
+        table = Attendance.__table__
+        now = datetime.utcnow()
+        enrollment_ids = {enrollment_id for enrollment_id, _ in records}
+        attendance_dates = {attendance_date for _, attendance_date in records}
+        
+        # One indexed lookup (idx_enrollment_date) for every existing row
+        existing = {}
+        for row in db.session.query(
+            Attendance.attendance_id,
+            Attendance.enrollment_id,
+            Attendance.attendance_date,
+            Attendance.status
+        ).filter(
+            Attendance.enrollment_id.in_(enrollment_ids),
+            Attendance.attendance_date.in_(attendance_dates)
+        ).order_by(Attendance.attendance_id).all():
+            key = (row.enrollment_id, row.attendance_date)
+            if key in records:
+                existing.setdefault(key, row)
+        
+        inserts = []
+        updates = []
+        for key, values in records.items():
+            if key in existing:
+                updates.append(dict(
+                    values,
+                    b_attendance_id=existing[key].attendance_id,
+                    recorded_by=recorded_by,
+                    created_at=now
+                ))
+            else:
+                inserts.append(dict(
+                    values,
+                    enrollment_id=key[0],
+                    attendance_date=key[1],
+                    recorded_by=recorded_by,
+                    created_at=now
+                ))
+        
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.attendance_id == bindparam('b_attendance_id')),
+                updates
+            )
+            # Core updates bypass the flush hook that invalidates cached features
+            FeatureCache.invalidate(db.session.connection(), {key[0] for key in existing})
+        
+        saved = {key: row.attendance_id for key, row in existing.items()}
+        changes = [
+            (AttendanceChange(row.attendance_id, key[0], key[1], records[key]['status']), row.status)
+            for key, row in existing.items()
+        ]
+        
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+            
+            # Read back the generated ids; the newest row per key is ours
+            for row in db.session.query(
+                Attendance.attendance_id,
+                Attendance.enrollment_id,
+                Attendance.attendance_date,
+                Attendance.status
+            ).filter(
+                Attendance.enrollment_id.in_({values['enrollment_id'] for values in inserts}),
+                Attendance.attendance_date.in_({values['attendance_date'] for values in inserts})
+            ).order_by(Attendance.attendance_id).all():
+                key = (row.enrollment_id, row.attendance_date)
+                if key in records and key not in existing:
+                    saved[key] = row.attendance_id
+            
+            changes.extend(
+                (AttendanceChange(saved[key], key[0], key[1], records[key]['status']), None)
+                for key in records if key not in existing
+            )
+        
+        # Keep the enrollments' running activity aggregates current
+        ActivityAccumulatorService.record_attendance_bulk(changes)
+        
+        db.session.commit()
+        logger.info(f"Upserted attendance: {len(inserts)} created, {len(updates)} updated")
+        return saved, existing
     
     @staticmethod
     def get_course_roster(offering_id, attendance_date=None):
@@ -1,9 +1,10 @@
 import jwt
 from datetime import datetime, timedelta
-from flask import current_app
+from flask import current_app, g, has_request_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from backend.models import User, Student, Faculty
 from backend.extensions import db
+from backend.utils.pagination import invalidate_count
 import logging
 import uuid
 
@@ -68,6 +69,7 @@ def register_user(username, email, password, user_type, **kwargs):
             db.session.add(faculty)
             db.session.commit()
         
+        invalidate_count('admin_users')
         logger.info(f"User {username} registered successfully as {user_type}")
         return user, None
     
@@ -214,9 +216,15 @@ def get_user_from_token(token):
 
 
 def get_user_by_id(user_id):
-    """Get user by ID"""
+    """Get user by ID, reusing the request's already-resolved user when it matches"""
     try:
         from backend.models import User
+        from backend.middleware.jwt_middleware import get_current_user
+        
+        identity = g.get('current_identity') if has_request_context() else None
+        if identity is not None and identity.user_id == int(user_id):
+            return get_current_user()
+        
         user = User.query.get(int(user_id))
         return user
     except Exception as e:
@@ -0,0 +1,393 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from backend.extensions import db
+from backend.models import (
+    Enrollment, CourseOffering, AcademicTerm, Student, Attendance,
+    LMSSession, LMSActivity, Assessment, AssessmentSubmission, AssessmentType
+)
+from backend.services.feature_calculator_service import (
+    FeatureCalculator, ATTENDANCE_CLICK_MAPPING, ACTIVITY_CLICK_MAPPING,
+    ASSESSMENT_TYPE_MAPPING, AGE_BAND_MAPPING, EDUCATION_MAPPING,
+    EMPTY_ACTIVITY_FEATURES
+)
+from backend.utils.helpers import safe_float, safe_int
+import logging
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+
+class BulkFeatureCalculator:
+    """
+    Set-based feature extraction for whole course offerings or terms.
+
+    Produces the same feature values as FeatureCalculator, but loads the
+    source rows for every enrollment in a handful of bulk queries and
+    computes the feature matrix with grouped NumPy operations.
+    """
+
+    def __init__(self, feature_calculator: Optional[FeatureCalculator] = None):
+        self.feature_calculator = feature_calculator or FeatureCalculator()
+        self.feature_list = self.feature_calculator.get_feature_names()
+
+    def calculate_features_for_offering(self, offering_id: int,
+                                        as_of_date: Optional[datetime] = None,
+                                        enrollment_status: Optional[str] = 'enrolled'
+                                        ) -> Tuple[List[int], np.ndarray]:
+        """
+        Calculate features for every enrollment in a course offering
+
+        Returns:
+            Tuple of (enrollment_ids, feature matrix) with one row per
+            enrollment, columns in feature_list.json order
+        """
+        criteria = [Enrollment.offering_id == offering_id]
+        return self._calculate(criteria, as_of_date, enrollment_status)
+
+    def calculate_features_for_term(self, term_id: int,
+                                    as_of_date: Optional[datetime] = None,
+                                    enrollment_status: Optional[str] = 'enrolled'
+                                    ) -> Tuple[List[int], np.ndarray]:
+        """
+        Calculate features for every enrollment in an academic term
+
+        Returns:
+            Tuple of (enrollment_ids, feature matrix) with one row per
+            enrollment, columns in feature_list.json order
+        """
+        offering_ids = select(CourseOffering.offering_id).where(
+            CourseOffering.term_id == term_id
+        )
+        criteria = [Enrollment.offering_id.in_(offering_ids)]
+        return self._calculate(criteria, as_of_date, enrollment_status)
+
+    def _calculate(self, criteria: List, as_of_date: Optional[datetime],
+                   enrollment_status: Optional[str]) -> Tuple[List[int], np.ndarray]:
+        """Run the bulk queries for the enrollment scope and build the matrix"""
+        if as_of_date is None:
+            as_of_date = datetime.now()
+
+        if enrollment_status:
+            criteria = criteria + [Enrollment.enrollment_status == enrollment_status]
+
+        enrollments = self._load_enrollments(criteria)
+        if not enrollments:
+            return [], np.empty((0, len(self.feature_list)))
+
+        enrollment_ids = np.array([row.enrollment_id for row in enrollments], dtype=np.int64)
+        scope = select(Enrollment.enrollment_id).where(*criteria)
+
+        features = {}
+        features.update(self._calculate_activity_features(
+            enrollments, enrollment_ids, scope, as_of_date
+        ))
+        features.update(self._calculate_assessment_features(
+            enrollments, enrollment_ids, scope, as_of_date
+        ))
+        features.update(self._calculate_demographic_features(enrollments))
+
+        matrix = np.zeros((len(enrollment_ids), len(self.feature_list)))
+        missing_features = []
+        for column, name in enumerate(self.feature_list):
+            if name in features:
+                matrix[:, column] = features[name]
+            else:
+                missing_features.append(name)
+
+        if missing_features:
+            logger.warning(f"Missing features: {set(missing_features)}")
+
+        logger.info(f"Bulk features calculated for {len(enrollment_ids)} enrollments")
+        return enrollment_ids.tolist(), matrix
+
+    def _load_enrollments(self, criteria: List) -> List:
+        """Load enrollments with their course start date and demographics"""
+        return db.session.query(
+            Enrollment.enrollment_id,
+            Enrollment.offering_id,
+            Enrollment.enrollment_date,
+            AcademicTerm.start_date,
+            Student.age_band,
+            Student.highest_education,
+            Student.num_of_prev_attempts,
+            Student.studied_credits,
+            Student.has_disability
+        ).outerjoin(
+            CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+        ).outerjoin(
+            AcademicTerm, CourseOffering.term_id == AcademicTerm.term_id
+        ).outerjoin(
+            Student, Enrollment.student_id == Student.student_id
+        ).filter(
+            *criteria
+        ).order_by(
+            Enrollment.enrollment_id
+        ).all()
+
+    def _calculate_activity_features(self, enrollments: List, enrollment_ids: np.ndarray,
+                                     scope, as_of_date: datetime) -> Dict[str, np.ndarray]:
+        """Calculate activity features for all enrollments from VLE records"""
+        n = len(enrollment_ids)
+
+        # Course start date per enrollment, falling back to the enrollment date
+        start_dates = {
+            row.enrollment_id: row.start_date or row.enrollment_date
+            for row in enrollments
+        }
+
+        row_index = []
+        days = []
+        sites = []
+        clicks = []
+
+        attendance_rows = db.session.query(
+            Attendance.enrollment_id,
+            Attendance.attendance_id,
+            Attendance.attendance_date,
+            Attendance.status
+        ).filter(
+            Attendance.enrollment_id.in_(scope),
+            Attendance.attendance_date <= as_of_date,
+            Attendance.status.in_(list(ATTENDANCE_CLICK_MAPPING.keys()))
+        ).all()
+
+        for enrollment_id, attendance_id, attendance_date, status in attendance_rows:
+            row_index.append(enrollment_id)
+            days.append((attendance_date - start_dates[enrollment_id]).days)
+            sites.append(f'attendance_{attendance_id}')
+            clicks.append(ATTENDANCE_CLICK_MAPPING[status])
+
+        activity_rows = db.session.query(
+            LMSSession.enrollment_id,
+            LMSActivity.activity_id,
+            LMSActivity.activity_timestamp,
+            LMSActivity.activity_type,
+            LMSActivity.resource_id
+        ).join(
+            LMSSession, LMSActivity.session_id == LMSSession.session_id
+        ).filter(
+            LMSSession.enrollment_id.in_(scope),
+            LMSActivity.activity_timestamp <= as_of_date
+        ).all()
+
+        for enrollment_id, activity_id, timestamp, activity_type, resource_id in activity_rows:
+            row_index.append(enrollment_id)
+            days.append((timestamp.date() - start_dates[enrollment_id]).days)
+            sites.append(resource_id or f'activity_{activity_id}')
+            clicks.append(ACTIVITY_CLICK_MAPPING.get(activity_type, 1))
+
+        features = {
+            name: np.full(n, float(value))
+            for name, value in EMPTY_ACTIVITY_FEATURES.items()
+        }
+        if not row_index:
+            return features
+
+        rows = np.searchsorted(enrollment_ids, np.array(row_index, dtype=np.int64))
+        days = np.array(days, dtype=np.int64)
+        clicks = np.array(clicks, dtype=np.float64)
+        _, site_codes = np.unique(np.array(sites, dtype=object), return_inverse=True)
+
+        # Per (enrollment, day) totals, sorted by enrollment then day
+        day_pairs, day_inverse = np.unique(
+            np.column_stack([rows, days]), axis=0, return_inverse=True
+        )
+        day_inverse = day_inverse.ravel()
+        pair_rows = day_pairs[:, 0]
+        pair_days = day_pairs[:, 1]
+        daily_clicks = np.bincount(day_inverse, weights=clicks, minlength=len(day_pairs))
+
+        days_active = np.bincount(pair_rows, minlength=n).astype(float)
+        active = days_active > 0
+        multi_day = days_active > 1
+
+        total_clicks = np.bincount(rows, weights=clicks, minlength=n)
+
+        site_pairs = np.unique(np.column_stack([rows, site_codes]), axis=0)
+        unique_materials = np.bincount(site_pairs[:, 0], minlength=n).astype(float)
+
+        first_day = np.full(n, np.inf)
+        last_day = np.full(n, -np.inf)
+        np.minimum.at(first_day, pair_rows, pair_days)
+        np.maximum.at(last_day, pair_rows, pair_days)
+        first_day[~active] = -1
+        last_day[~active] = -1
+
+        course_days = np.maximum(last_day - first_day + 1, 1)
+        safe_days_active = np.maximum(days_active, 1)
+
+        features['days_active'] = days_active
+        features['total_clicks'] = total_clicks
+        features['unique_materials'] = unique_materials
+        features['activity_rate'] = np.where(active, days_active / course_days * 100, 0)
+        features['avg_clicks_per_active_day'] = np.where(active, total_clicks / safe_days_active, 0)
+        features['first_activity_day'] = first_day
+        features['last_activity_day'] = last_day
+
+        # Weekly activity standard deviation (population std over active weeks)
+        week_pairs, week_inverse = np.unique(
+            np.column_stack([rows, np.floor_divide(days, 7)]), axis=0, return_inverse=True
+        )
+        week_inverse = week_inverse.ravel()
+        week_rows = week_pairs[:, 0]
+        weekly_clicks = np.bincount(week_inverse, weights=clicks, minlength=len(week_pairs))
+        week_count = np.bincount(week_rows, minlength=n).astype(float)
+        safe_week_count = np.maximum(week_count, 1)
+        week_mean = np.bincount(week_rows, weights=weekly_clicks, minlength=n) / safe_week_count
+        week_var = np.bincount(
+            week_rows, weights=(weekly_clicks - week_mean[week_rows]) ** 2, minlength=n
+        ) / safe_week_count
+        features['weekly_activity_std'] = np.where(week_count > 1, np.sqrt(week_var), 0)
+
+        # Gaps between consecutive active days of the same enrollment
+        same_row = pair_rows[1:] == pair_rows[:-1]
+        gaps = (pair_days[1:] - pair_days[:-1])[same_row]
+        longest_gap = np.zeros(n)
+        np.maximum.at(longest_gap, pair_rows[1:][same_row], gaps)
+        mean_gap = (last_day - first_day) / np.maximum(days_active - 1, 1)
+        features['activity_regularity'] = np.where(multi_day, 1 / (mean_gap + 1) * 100, 0)
+        features['longest_inactivity_gap'] = np.where(multi_day, longest_gap, 0)
+
+        # Weekend activity ratio
+        weekend_days = np.bincount(
+            pair_rows, weights=(np.mod(pair_days, 7) >= 5).astype(float), minlength=n
+        )
+        features['weekend_activity_ratio'] = np.where(active, weekend_days / safe_days_active * 100, 0)
+
+        # Activity trend (least-squares slope of daily clicks over active days)
+        mean_x = np.bincount(pair_rows, weights=pair_days, minlength=n) / safe_days_active
+        mean_y = np.bincount(pair_rows, weights=daily_clicks, minlength=n) / safe_days_active
+        dx = pair_days - mean_x[pair_rows]
+        dy = daily_clicks - mean_y[pair_rows]
+        sxy = np.bincount(pair_rows, weights=dx * dy, minlength=n)
+        sxx = np.bincount(pair_rows, weights=dx * dx, minlength=n)
+        features['activity_trend'] = np.where(multi_day, sxy / np.where(sxx > 0, sxx, 1), 0)
+
+        return features
+
+    def _calculate_assessment_features(self, enrollments: List, enrollment_ids: np.ndarray,
+                                       scope, as_of_date: datetime) -> Dict[str, np.ndarray]:
+        """Calculate assessment features for all enrollments"""
+        n = len(enrollment_ids)
+
+        # Number of assessments due per offering
+        offering_ids = sorted({row.offering_id for row in enrollments})
+        due_counts = dict(db.session.query(
+            Assessment.offering_id,
+            db.func.count(Assessment.assessment_id)
+        ).filter(
+            Assessment.offering_id.in_(offering_ids),
+            Assessment.due_date <= as_of_date
+        ).group_by(
+            Assessment.offering_id
+        ).all())
+        assessments_due = np.array(
+            [due_counts.get(row.offering_id, 0) for row in enrollments], dtype=float
+        )
+
+        submission_rows = db.session.query(
+            AssessmentSubmission.enrollment_id,
+            AssessmentSubmission.submission_date,
+            AssessmentSubmission.score,
+            AssessmentSubmission.is_late,
+            Assessment.assessment_id,
+            Assessment.due_date,
+            AssessmentType.type_name
+        ).outerjoin(
+            Assessment, AssessmentSubmission.assessment_id == Assessment.assessment_id
+        ).outerjoin(
+            AssessmentType, Assessment.type_id == AssessmentType.type_id
+        ).filter(
+            AssessmentSubmission.enrollment_id.in_(scope),
+            AssessmentSubmission.submission_date <= as_of_date
+        ).all()
+
+        submitted = np.zeros(n)
+        if submission_rows:
+            rows = np.searchsorted(
+                enrollment_ids,
+                np.array([r.enrollment_id for r in submission_rows], dtype=np.int64)
+            )
+            has_score = np.array([r.score is not None for r in submission_rows])
+            scores = np.array([safe_float(r.score) for r in submission_rows])
+            is_late = np.array([bool(r.is_late) for r in submission_rows])
+            model_types = np.array([
+                ASSESSMENT_TYPE_MAPPING.get(r.type_name)
+                if r.assessment_id is not None else None
+                for r in submission_rows
+            ], dtype=object)
+
+            submitted = np.bincount(rows, minlength=n).astype(float)
+
+        features = {
+            'submitted_assessments': submitted,
+            'submission_rate': np.where(
+                assessments_due > 0, submitted / np.maximum(assessments_due, 1) * 100, 100
+            )
+        }
+
+        if not submission_rows:
+            for name in ('avg_score', 'avg_score_cma', 'avg_score_tma', 'avg_score_exam',
+                         'on_time_submissions', 'late_submission_count', 'avg_days_early'):
+                features[name] = np.zeros(n)
+            return features
+
+        def grouped_mean(mask: np.ndarray) -> np.ndarray:
+            count = np.bincount(rows[mask], minlength=n)
+            total = np.bincount(rows[mask], weights=scores[mask], minlength=n)
+            return np.where(count > 0, total / np.maximum(count, 1), 0)
+
+        features['avg_score'] = grouped_mean(has_score)
+        features['avg_score_cma'] = grouped_mean(has_score & (model_types == 'CMA'))
+        features['avg_score_tma'] = grouped_mean(has_score & (model_types == 'TMA'))
+        features['avg_score_exam'] = grouped_mean(has_score & (model_types == 'Exam'))
+
+        late = np.bincount(rows, weights=is_late.astype(float), minlength=n)
+        features['late_submission_count'] = late
+        features['on_time_submissions'] = submitted - late
+
+        # Days early (negative if late), floored like timedelta.days
+        has_due = np.array([r.due_date is not None for r in submission_rows])
+        if has_due.any():
+            due = np.array(
+                [r.due_date for r in submission_rows if r.due_date is not None],
+                dtype='datetime64[s]'
+            )
+            submitted_at = np.array(
+                [r.submission_date for r, flag in zip(submission_rows, has_due) if flag],
+                dtype='datetime64[s]'
+            )
+            days_early = np.floor_divide(
+                (due - submitted_at).astype(np.int64), SECONDS_PER_DAY
+            ).astype(float)
+            due_rows = rows[has_due]
+            count = np.bincount(due_rows, minlength=n)
+            total = np.bincount(due_rows, weights=days_early, minlength=n)
+            features['avg_days_early'] = np.where(count > 0, total / np.maximum(count, 1), 0)
+        else:
+            features['avg_days_early'] = np.zeros(n)
+
+        return features
+
+    def _calculate_demographic_features(self, enrollments: List) -> Dict[str, np.ndarray]:
+        """Calculate demographic features for all enrollments"""
+        return {
+            'age_band_encoded': np.array(
+                [AGE_BAND_MAPPING.get(row.age_band, 0) for row in enrollments], dtype=float
+            ),
+            'highest_education_encoded': np.array(
+                [EDUCATION_MAPPING.get(row.highest_education, 2) for row in enrollments], dtype=float
+            ),
+            'num_of_prev_attempts': np.array(
+                [safe_int(row.num_of_prev_attempts) for row in enrollments], dtype=float
+            ),
+            'studied_credits': np.array(
+                [safe_int(row.studied_credits) for row in enrollments], dtype=float
+            ),
+            'has_disability': np.array(
+                [1 if row.has_disability else 0 for row in enrollments], dtype=float
+            )
+        }
@@ -5,6 +5,7 @@ from backend.models import (
     AcademicTerm
 )
 from backend.extensions import db
+from backend.middleware.activity_tracker import invalidate_student_activity_cache
 from sqlalchemy import and_, or_
 from datetime import datetime
 import logging
@@ -105,6 +106,7 @@ class CourseService:
                     existing.enrollment_date = datetime.utcnow().date()
                     offering.enrolled_count += 1
                     db.session.commit()
+                    invalidate_student_activity_cache(student_id)
                     
                     # Return successful enrollment data
                     return {
@@ -125,6 +127,7 @@ class CourseService:
             
             db.session.add(enrollment)
             db.session.commit()
+            invalidate_student_activity_cache(student_id)
             
             # Return successful enrollment data
             return {
@@ -160,6 +163,7 @@ class CourseService:
                 offering.enrolled_count = max(0, offering.enrolled_count - 1)
             
             db.session.commit()
+            invalidate_student_activity_cache(student_id)
             return True, "Course dropped successfully"
             
         except Exception as e:
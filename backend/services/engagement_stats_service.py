@@ -0,0 +1,141 @@
+import numpy as np
+from datetime import date, timedelta
+from typing import Dict, Optional
+from sqlalchemy import func
+from backend.models import Enrollment, LMSDailySummary, OfferingEngagementStats
+from backend.extensions import db
+from backend.utils.cache import TTLCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# offering_id -> OfferingEngagementStats.to_dict(), loaded as one table read
+_stats_cache = TTLCache(maxsize=1, ttl=3600)
+
+
+def daily_activity():
+    """Per-day activity measure of an LMS daily summary row"""
+    return (
+        func.coalesce(LMSDailySummary.resource_views, 0) +
+        func.coalesce(LMSDailySummary.forum_posts, 0) +
+        func.coalesce(LMSDailySummary.pages_viewed, 0)
+    )
+
+
+class EngagementStatsService:
+    """Per-offering rolling engagement baselines for alerting and dashboards"""
+    
+    WINDOW_DAYS = 7
+    MAX_STATS_AGE_DAYS = 2  # Statistics older than this are ignored by readers
+    
+    @staticmethod
+    def refresh(as_of: Optional[date] = None) -> int:
+        """
+        Recompute engagement statistics for every offering with recent activity
+        
+        One grouped query yields each enrolled student's average daily
+        activity over the window; mean, median and percentiles per offering
+        are then taken with NumPy and upserted. Rows of offerings without
+        activity in the window are deleted.
+        
+        Args:
+            as_of: Last day of the window (default today)
+        
+        Returns:
+            Number of offerings refreshed
+        """
+        as_of = as_of or date.today()
+        # The window is the WINDOW_DAYS days ending on as_of, both inclusive
+        window_start = as_of - timedelta(days=EngagementStatsService.WINDOW_DAYS)
+        
+        rows = db.session.query(
+            Enrollment.offering_id,
+            func.avg(daily_activity()).label('avg_activity')
+        ).join(
+            LMSDailySummary, LMSDailySummary.enrollment_id == Enrollment.enrollment_id
+        ).filter(
+            Enrollment.enrollment_status == 'enrolled',
+            LMSDailySummary.summary_date > window_start,
+            LMSDailySummary.summary_date <= as_of
+        ).group_by(
+            Enrollment.enrollment_id, Enrollment.offering_id
+        ).all()
+        
+        if not rows:
+            OfferingEngagementStats.query.delete(synchronize_session=False)
+            db.session.commit()
+            _stats_cache.clear()
+            logger.info(f"No LMS activity in the {EngagementStatsService.WINDOW_DAYS} days to {as_of}")
+            return 0
+        
+        offering_ids = np.array([row.offering_id for row in rows], dtype=np.int64)
+        averages = np.array([float(row.avg_activity or 0) for row in rows])
+        
+        order = np.argsort(offering_ids, kind='stable')
+        offering_ids, averages = offering_ids[order], averages[order]
+        offerings, starts = np.unique(offering_ids, return_index=True)
+        
+        existing = {
+            stats.offering_id: stats
+            for stats in OfferingEngagementStats.query.filter(
+                OfferingEngagementStats.offering_id.in_(offerings.tolist())
+            ).all()
+        }
+        
+        for offering_id, values in zip(offerings.tolist(), np.split(averages, starts[1:])):
+            p25, median, p75, p90 = np.percentile(values, [25, 50, 75, 90])
+            
+            stats = existing.get(offering_id)
+            if stats is None:
+                stats = OfferingEngagementStats(offering_id, as_of)
+                db.session.add(stats)
+            
+            stats.stats_date = as_of
+            stats.window_days = EngagementStatsService.WINDOW_DAYS
+            stats.enrollment_count = len(values)
+            stats.mean_activity = float(values.mean())
+            stats.median_activity = float(median)
+            stats.p25_activity = float(p25)
+            stats.p75_activity = float(p75)
+            stats.p90_activity = float(p90)
+        
+        # Offerings with no activity in the window would otherwise keep an old baseline
+        OfferingEngagementStats.query.filter(
+            OfferingEngagementStats.offering_id.notin_(offerings.tolist())
+        ).delete(synchronize_session=False)
+        
+        db.session.commit()
+        _stats_cache.clear()
+        
+        logger.info(f"Refreshed engagement statistics for {len(offerings)} offerings")
+        return len(offerings)
+    
+    @staticmethod
+    def get_offering_stats(offering_id: int, as_of: Optional[date] = None) -> Optional[Dict]:
+        """
+        Get an offering's engagement statistics from the in-memory cache
+        
+        Returns None when there are none, or when their window ended more
+        than MAX_STATS_AGE_DAYS before as_of (default today).
+        """
+        stats = EngagementStatsService.get_all_stats().get(offering_id)
+        if not stats or not stats['stats_date']:
+            return None
+        
+        as_of = as_of or date.today()
+        oldest = as_of - timedelta(days=EngagementStatsService.MAX_STATS_AGE_DAYS)
+        if date.fromisoformat(stats['stats_date']) < oldest:
+            return None
+        return stats
+    
+    @staticmethod
+    def get_all_stats() -> Dict[int, Dict]:
+        """Get engagement statistics for all offerings, loading the table at most once per TTL"""
+        stats = _stats_cache.get('offerings')
+        if stats is None:
+            stats = {
+                row.offering_id: row.to_dict()
+                for row in OfferingEngagementStats.query.all()
+            }
+            _stats_cache.set('offerings', stats)
+        return stats
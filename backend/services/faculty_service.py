@@ -6,6 +6,8 @@ from backend.models import (
 from backend.extensions import db
 from sqlalchemy import func, and_, or_, desc
 from datetime import datetime, timedelta
+from backend.services.latest_prediction_service import LatestPredictionService
+from backend.services.missing_work_service import MissingWorkService
 import logging
 from sqlalchemy import distinct  
 
@@ -104,6 +106,13 @@ class FacultyService:
                 Enrollment.enrollment_status == 'enrolled'
             ).all()
             
+            latest_predictions = LatestPredictionService.get_latest_predictions(
+                student.enrollment_id for student in students
+            )
+            missing_counts = MissingWorkService.count_missing_for_offering(
+                offering_id, (student.enrollment_id for student in students)
+            )
+            
             result = []
             for student in students:
                 # Get attendance rate
@@ -111,10 +120,7 @@ class FacultyService:
                     student.enrollment_id
                 )
                 
-                # Get latest prediction
-                latest_prediction = Prediction.query.filter_by(
-                    enrollment_id=student.enrollment_id
-                ).order_by(desc(Prediction.prediction_date)).first()
+                latest_prediction = latest_predictions.get(student.enrollment_id)
                 
                 result.append({
                     'student_id': student.student_id,
@@ -126,7 +132,8 @@ class FacultyService:
                     'attendance_rate': attendance_rate,
                     'current_grade': student.final_grade,
                     'predicted_grade': latest_prediction.predicted_grade if latest_prediction else None,
-                    'risk_level': latest_prediction.risk_level if latest_prediction else 'unknown'
+                    'risk_level': latest_prediction.risk_level if latest_prediction else 'unknown',
+                    'missing_assignments': missing_counts.get(student.enrollment_id, 0)
                 })
             
             return result
@@ -411,6 +418,13 @@ class FacultyService:
                 Course.course_code
             ).all()
             
+            latest_predictions = LatestPredictionService.get_latest_predictions(
+                student.enrollment_id for student in students
+            )
+            missing_counts = MissingWorkService.count_missing(
+                (student.enrollment_id, student.offering_id) for student in students
+            )
+            
             result = []
             for student in students:
                 # Get attendance rate for this enrollment
@@ -418,10 +432,7 @@ class FacultyService:
                     student.enrollment_id
                 )
                 
-                # Get latest prediction for this enrollment
-                latest_prediction = Prediction.query.filter_by(
-                    enrollment_id=student.enrollment_id
-                ).order_by(desc(Prediction.prediction_date)).first()
+                latest_prediction = latest_predictions.get(student.enrollment_id)
                 
                 # Calculate risk level if no prediction exists
                 risk_level = 'low'  # default
@@ -450,7 +461,8 @@ class FacultyService:
                     'current_grade': student.final_grade,
                     'predicted_grade': latest_prediction.predicted_grade if latest_prediction else None,
                     'risk_level': risk_level,
-                    'confidence_score': float(latest_prediction.confidence_score) if latest_prediction else None
+                    'confidence_score': float(latest_prediction.confidence_score) if latest_prediction else None,
+                    'missing_assignments': missing_counts.get(student.enrollment_id, 0)
                 })
             
             return result
@@ -1,18 +1,126 @@
 import json
 import numpy as np
+from collections import namedtuple
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import func
+from flask import g, has_app_context
+from sqlalchemy import func, event
 from backend.extensions import db
 from backend.models import (
     Enrollment, Attendance, LMSSession, LMSActivity, 
-    AssessmentSubmission, Assessment, LMSDailySummary, Student
+    AssessmentSubmission, Assessment, LMSDailySummary, Student,
+    AcademicTerm, CourseOffering
 )
 from backend.utils.helpers import safe_float, safe_int
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Clicks credited to a VLE record for each attendance status
+ATTENDANCE_CLICK_MAPPING = {
+    'present': 30,
+    'late': 15
+}
+
+# Clicks credited to a VLE record for each LMS activity type
+ACTIVITY_CLICK_MAPPING = {
+    'resource_view': 1,
+    'forum_post': 5,
+    'forum_reply': 3,
+    'assignment_view': 2,
+    'quiz_attempt': 10,
+    'video_watch': 1,
+    'file_download': 2,
+    'page_view': 1
+}
+
+# Assessment type names mapped to the types the model was trained on
+ASSESSMENT_TYPE_MAPPING = {
+    # Map to CMA (Continuous Assessment)
+    'Quiz': 'CMA',
+    'Assignment': 'CMA',
+    'Participation': 'CMA',
+    
+    # Map to TMA (Tutor Marked Assessment)
+    'Midterm Exam': 'TMA',
+    'CMA': 'TMA',  # Your CMA maps to model's TMA
+    'TMA': 'TMA',
+    
+    # Map to Exam
+    'Final Exam': 'Exam',
+    'Exam': 'Exam'
+}
+
+# Age band encoding (matching OULAD)
+AGE_BAND_MAPPING = {
+    '0-35': 0,
+    '35-55': 1,
+    '55+': 2
+}
+
+# Education level encoding (matching OULAD)
+EDUCATION_MAPPING = {
+    'No Formal quals': 0,
+    'Lower Than A Level': 1,
+    'A Level or Equivalent': 2,
+    'HE Qualification': 3,
+    'Post Graduate Qualification': 4
+}
+
+# Activity features returned when an enrollment has no VLE records
+EMPTY_ACTIVITY_FEATURES = {
+    'days_active': 0,
+    'total_clicks': 0,
+    'unique_materials': 0,
+    'activity_rate': 0,
+    'avg_clicks_per_active_day': 0,
+    'first_activity_day': -1,
+    'last_activity_day': -1,
+    'weekly_activity_std': 0,
+    'activity_regularity': 0,
+    'longest_inactivity_gap': 0,
+    'weekend_activity_ratio': 0,
+    'activity_trend': 0
+}
+
+# Columnar VLE stream of one enrollment: int32 relative day, int32 site code
+# and int16 clicks per record
+VLEArrays = namedtuple('VLEArrays', ['day', 'site', 'clicks'])
+
+
+def get_offering_start_date(offering_id: int):
+    """
+    Get the term start date for a course offering
+    
+    Results are memoized on flask.g, so they live for one request in the
+    API and for the whole app context in batch jobs and CLI commands.
+    """
+    cache = g.setdefault('course_start_dates', {}) if has_app_context() else {}
+    
+    if offering_id not in cache:
+        cache[offering_id] = db.session.query(
+            AcademicTerm.start_date
+        ).join(
+            CourseOffering, CourseOffering.term_id == AcademicTerm.term_id
+        ).filter(
+            CourseOffering.offering_id == offering_id
+        ).scalar()
+    
+    return cache[offering_id]
+
+
+def invalidate_course_start_dates(*args):
+    """Drop memoized course start dates for the current app context"""
+    if has_app_context():
+        g.pop('course_start_dates', None)
+
+
+# Term dates or an offering's term can change under a long-running batch
+for _model in (AcademicTerm, CourseOffering):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, invalidate_course_start_dates)
+
+
 class FeatureCalculator:
     """Calculate features matching OULAD format for ML model prediction"""
     
@@ -36,14 +144,22 @@ class FeatureCalculator:
         if not enrollment:
             raise ValueError(f"Enrollment {enrollment_id} not found")
         
-        # Convert production data to OULAD-style VLE data
-        vle_data = self._convert_to_vle_format(enrollment_id, as_of_date)
-        
         # Initialize features dictionary
         features = {}
         
         # Calculate activity features
-        features.update(self._calculate_activity_features(vle_data))
+        # Import here to avoid circular imports
+        from backend.services.activity_accumulator_service import ActivityAccumulatorService
+        activity_features = ActivityAccumulatorService.get_activity_features(enrollment, as_of_date)
+        
+        # Fall back to raw rows when the running accumulator cannot answer
+        if activity_features is not None:
+            features.update(activity_features)
+        else:
+            # Convert production data to OULAD-style VLE data
+            start_date = self._get_enrollment_start_date(enrollment)
+            vle_data = self._convert_to_vle_format(enrollment_id, as_of_date, start_date)
+            features.update(self._calculate_activity_features(vle_data))
         
         # Calculate assessment features
         features.update(self._calculate_assessment_features(enrollment_id, as_of_date))
@@ -54,139 +170,134 @@ class FeatureCalculator:
         # Ensure all required features are present
         return self._validate_and_order_features(features)
     
-    def _convert_to_vle_format(self, enrollment_id: int, as_of_date: datetime) -> List[Dict]:
-        """Convert production data to OULAD VLE format"""
-        vle_records = []
+    def _convert_to_vle_format(self, enrollment_id: int, as_of_date: datetime,
+                               start_date=None) -> VLEArrays:
+        """
+        Convert production data to OULAD VLE format as columnar arrays
+        
+        Attendance rows become one site each; LMS activities share a site per
+        resource_id, or get their own when they have none.
+        """
+        # Resolve the course start date once, not per record
+        if start_date is None:
+            start_date = self._get_course_start_date(enrollment_id)
+        start = np.datetime64(start_date, 'D')
         
         # Convert attendance to VLE format
-        attendance_records = Attendance.query.filter(
+        attendance_rows = db.session.query(
+            Attendance.attendance_date,
+            Attendance.status
+        ).filter(
             Attendance.enrollment_id == enrollment_id,
-            Attendance.attendance_date <= as_of_date
+            Attendance.attendance_date <= as_of_date,
+            Attendance.status.in_(list(ATTENDANCE_CLICK_MAPPING.keys()))
         ).all()
         
-        for attendance in attendance_records:
-            if attendance.status == 'present':
-                vle_records.append({
-                    'date': (attendance.attendance_date - self._get_course_start_date(enrollment_id)).days,
-                    'id_site': f'attendance_{attendance.attendance_id}',
-                    'sum_click': 30
-                })
-            elif attendance.status == 'late':
-                vle_records.append({
-                    'date': (attendance.attendance_date - self._get_course_start_date(enrollment_id)).days,
-                    'id_site': f'attendance_{attendance.attendance_id}',
-                    'sum_click': 15
-                })
-        
         # Convert LMS activities to VLE format
-        click_mapping = {
-            'resource_view': 1,
-            'forum_post': 5,
-            'forum_reply': 3,
-            'assignment_view': 2,
-            'quiz_attempt': 10,
-            'video_watch': 1,
-            'file_download': 2,
-            'page_view': 1
-        }
-        
-        activities = LMSActivity.query.join(LMSSession).filter(
+        activity_rows = db.session.query(
+            LMSActivity.activity_timestamp,
+            LMSActivity.activity_type,
+            LMSActivity.resource_id
+        ).join(
+            LMSSession, LMSActivity.session_id == LMSSession.session_id
+        ).filter(
             LMSSession.enrollment_id == enrollment_id,
             LMSActivity.activity_timestamp <= as_of_date
         ).all()
         
-        for activity in activities:
-            vle_records.append({
-                'date': (activity.activity_timestamp.date() - self._get_course_start_date(enrollment_id)).days,
-                'id_site': activity.resource_id or f'activity_{activity.activity_id}',
-                'sum_click': click_mapping.get(activity.activity_type, 1)
-            })
+        n_attendance = len(attendance_rows)
+        n_activities = len(activity_rows)
+        
+        attendance_days = np.array(
+            [row.attendance_date for row in attendance_rows], dtype='datetime64[D]'
+        ).reshape(n_attendance)
+        activity_days = np.array(
+            [row.activity_timestamp for row in activity_rows], dtype='datetime64[D]'
+        ).reshape(n_activities)
+        days = (np.concatenate([attendance_days, activity_days]) - start).astype(np.int32)
+        
+        clicks = np.array(
+            [ATTENDANCE_CLICK_MAPPING[row.status] for row in attendance_rows] +
+            [ACTIVITY_CLICK_MAPPING.get(row.activity_type, 1) for row in activity_rows],
+            dtype=np.int16
+        )
+        
+        # Site codes: attendance rows first, then resources, then activities without one
+        sites = np.arange(n_attendance + n_activities, dtype=np.int32)
+        sites[n_attendance:] += n_activities
+        resources = np.array([row.resource_id or '' for row in activity_rows], dtype=object)
+        has_resource = resources != ''
+        if has_resource.any():
+            _, resource_codes = np.unique(resources[has_resource], return_inverse=True)
+            sites[n_attendance:][has_resource] = n_attendance + resource_codes.ravel()
         
-        return vle_records
+        return VLEArrays(days, sites, clicks)
     
     def _get_course_start_date(self, enrollment_id: int):
         """Get course start date for relative date calculations"""
         enrollment = Enrollment.query.get(enrollment_id)
-        if enrollment and enrollment.offering and enrollment.offering.term:
-            return enrollment.offering.term.start_date
+        if not enrollment:
+            return datetime.now().date()
+        return self._get_enrollment_start_date(enrollment)
+    
+    def _get_enrollment_start_date(self, enrollment: Enrollment):
+        """Get the term start date for an enrollment's offering"""
+        start_date = get_offering_start_date(enrollment.offering_id)
         # Default to enrollment date if no term start date
-        return enrollment.enrollment_date if enrollment else datetime.now().date()
+        return start_date or enrollment.enrollment_date
     
-    def _calculate_activity_features(self, vle_data: List[Dict]) -> Dict:
-        """Calculate activity-based features from VLE data"""
+    def _calculate_activity_features(self, vle: VLEArrays) -> Dict:
+        """Calculate activity-based features from VLE arrays"""
         features = {}
         
-        if not vle_data:
+        if len(vle.day) == 0:
             # Return zero values for all activity features
-            return {
-                'days_active': 0,
-                'total_clicks': 0,
-                'unique_materials': 0,
-                'activity_rate': 0,
-                'avg_clicks_per_active_day': 0,
-                'first_activity_day': -1,
-                'last_activity_day': -1,
-                'weekly_activity_std': 0,
-                'activity_regularity': 0,
-                'longest_inactivity_gap': 0,
-                'weekend_activity_ratio': 0,
-                'activity_trend': 0
-            }
+            return dict(EMPTY_ACTIVITY_FEATURES)
+        
+        clicks = vle.clicks.astype(np.int64)
+        
+        # Active days (sorted) and their click totals
+        days, day_index = np.unique(vle.day, return_inverse=True)
+        daily_clicks = np.bincount(day_index.ravel(), weights=clicks)
+        days_active = len(days)
         
         # Basic activity metrics
-        unique_days = set(record['date'] for record in vle_data)
-        features['days_active'] = len(unique_days)
-        features['total_clicks'] = sum(record['sum_click'] for record in vle_data)
-        features['unique_materials'] = len(set(record['id_site'] for record in vle_data))
+        features['days_active'] = days_active
+        features['total_clicks'] = int(clicks.sum())
+        features['unique_materials'] = len(np.unique(vle.site))
         
         # Activity rate (percentage of course days active)
-        course_days = max(unique_days) - min(unique_days) + 1 if unique_days else 1
-        features['activity_rate'] = (features['days_active'] / max(course_days, 1)) * 100
+        first_day, last_day = int(days[0]), int(days[-1])
+        features['activity_rate'] = (days_active / max(last_day - first_day + 1, 1)) * 100
         
         # Average clicks per active day
-        features['avg_clicks_per_active_day'] = (
-            features['total_clicks'] / features['days_active'] 
-            if features['days_active'] > 0 else 0
-        )
+        features['avg_clicks_per_active_day'] = features['total_clicks'] / days_active
         
         # First and last activity days
-        features['first_activity_day'] = min(unique_days) if unique_days else -1
-        features['last_activity_day'] = max(unique_days) if unique_days else -1
+        features['first_activity_day'] = first_day
+        features['last_activity_day'] = last_day
         
         # Weekly activity standard deviation
-        weekly_clicks = {}
-        for record in vle_data:
-            week = record['date'] // 7
-            weekly_clicks[week] = weekly_clicks.get(week, 0) + record['sum_click']
-        
-        if len(weekly_clicks) > 1:
-            features['weekly_activity_std'] = np.std(list(weekly_clicks.values()))
-        else:
-            features['weekly_activity_std'] = 0
+        _, week_index = np.unique(np.floor_divide(days, 7), return_inverse=True)
+        weekly_clicks = np.bincount(week_index.ravel(), weights=daily_clicks)
+        features['weekly_activity_std'] = np.std(weekly_clicks) if len(weekly_clicks) > 1 else 0
         
         # Activity regularity (inverse of gaps between active days)
-        sorted_days = sorted(unique_days)
-        if len(sorted_days) > 1:
-            gaps = [sorted_days[i+1] - sorted_days[i] for i in range(len(sorted_days)-1)]
+        if days_active > 1:
+            gaps = np.diff(days)
             features['activity_regularity'] = 1 / (np.mean(gaps) + 1) * 100
-            features['longest_inactivity_gap'] = max(gaps)
+            features['longest_inactivity_gap'] = int(gaps.max())
         else:
             features['activity_regularity'] = 0
             features['longest_inactivity_gap'] = 0
         
         # Weekend activity ratio
-        weekend_days = sum(1 for day in unique_days if (day % 7) in [5, 6])
-        features['weekend_activity_ratio'] = (
-            (weekend_days / features['days_active'] * 100) 
-            if features['days_active'] > 0 else 0
-        )
+        weekend_days = int(np.count_nonzero(np.mod(days, 7) >= 5))
+        features['weekend_activity_ratio'] = weekend_days / days_active * 100
         
-        # Activity trend (slope of activity over time)
-        if len(unique_days) > 1:
-            x = np.array(sorted(unique_days))
-            y = np.array([sum(r['sum_click'] for r in vle_data if r['date'] == d) for d in x])
-            coefficients = np.polyfit(x, y, 1)
-            features['activity_trend'] = coefficients[0]
+        # Activity trend (slope of daily clicks over active days)
+        if days_active > 1:
+            features['activity_trend'] = np.polyfit(days, daily_clicks, 1)[0]
         else:
             features['activity_trend'] = 0
         
@@ -224,23 +335,6 @@ class FeatureCalculator:
         tma_scores = []  # Tutor marked assessments (Midterm Exam, CMA, TMA)
         exam_scores = [] # Final exams (Final Exam, Exam)
         
-        # Type mapping based on your assessment_types table
-        TYPE_MAPPING = {
-           # Map to CMA (Continuous Assessment)
-        'Quiz': 'CMA',
-        'Assignment': 'CMA',
-        'Participation': 'CMA',
-        
-        # Map to TMA (Tutor Marked Assessment)
-        'Midterm Exam': 'TMA',
-        'CMA': 'TMA',  # Your CMA maps to model's TMA
-        'TMA': 'TMA',
-        
-        # Map to Exam
-        'Final Exam': 'Exam',
-        'Exam': 'Exam'
-        }
-        
         for submission in submissions:
             if submission.assessment and submission.score is not None:
                 score = safe_float(submission.score)
@@ -251,7 +345,7 @@ class FeatureCalculator:
                     type_name = assessment.assessment_type.type_name
                     
                     # Map to model expected types
-                    model_type = TYPE_MAPPING.get(type_name, None)
+                    model_type = ASSESSMENT_TYPE_MAPPING.get(type_name, None)
                     
                     if model_type == 'CMA':
                         cma_scores.append(score)
@@ -301,23 +395,9 @@ class FeatureCalculator:
         # Get student information
         student = enrollment.student
         
-        # Age band encoding (matching OULAD)
-        age_mapping = {
-            '0-35': 0,
-            '35-55': 1,
-            '55+': 2
-        }
-        features['age_band_encoded'] = age_mapping.get(student.age_band, 0)
-        
-        # Education level encoding
-        education_mapping = {
-            'No Formal quals': 0,
-            'Lower Than A Level': 1,
-            'A Level or Equivalent': 2,
-            'HE Qualification': 3,
-            'Post Graduate Qualification': 4
-        }
-        features['highest_education_encoded'] = education_mapping.get(
+        # Age band and education level encoding (matching OULAD)
+        features['age_band_encoded'] = AGE_BAND_MAPPING.get(student.age_band, 0)
+        features['highest_education_encoded'] = EDUCATION_MAPPING.get(
             student.highest_education, 2
         )
         
@@ -400,10 +480,13 @@ class FeatureCalculator:
             
             # Convert to VLE format
             vle_data = self._convert_to_vle_format(enrollment_id, as_of_date)
-            logger.info(f"VLE records created: {len(vle_data)}")
+            logger.info(f"VLE records created: {len(vle_data.day)}")
             
-            if vle_data:
-                logger.info(f"Sample VLE record: {vle_data[0]}")
+            if len(vle_data.day):
+                logger.info(
+                    f"Sample VLE record: day={vle_data.day[0]}, "
+                    f"site={vle_data.site[0]}, clicks={vle_data.clicks[0]}"
+                )
             
             # Calculate activity features
             activity_features = self._calculate_activity_features(vle_data)
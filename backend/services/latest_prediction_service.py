@@ -0,0 +1,77 @@
+from typing import Dict, Iterable, Optional
+from backend.models import Prediction, LatestPrediction
+from backend.extensions import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LatestPredictionService:
+    """Resolve the newest prediction for many enrollments at once"""
+    
+    @staticmethod
+    def get_latest_predictions(enrollment_ids: Iterable[int]) -> Dict[int, Prediction]:
+        """
+        Get the newest prediction per enrollment
+        
+        Reads through the latest_predictions pointer table in one query.
+        Enrollments without a pointer (predicted before the table existed)
+        are resolved with one grouped query over predictions.
+        
+        Args:
+            enrollment_ids: Enrollment IDs to resolve
+        
+        Returns:
+            Dict of enrollment_id -> Prediction; enrollments without
+            predictions are absent
+        """
+        enrollment_ids = {int(enrollment_id) for enrollment_id in enrollment_ids}
+        if not enrollment_ids:
+            return {}
+        
+        predictions = {
+            prediction.enrollment_id: prediction
+            for prediction in Prediction.query.join(
+                LatestPrediction, LatestPrediction.prediction_id == Prediction.prediction_id
+            ).filter(LatestPrediction.enrollment_id.in_(enrollment_ids)).all()
+        }
+        
+        missing = enrollment_ids - predictions.keys()
+        if missing:
+            latest = LatestPrediction.latest_select(missing).subquery()
+            for prediction in Prediction.query.join(
+                latest, latest.c.prediction_id == Prediction.prediction_id
+            ).all():
+                predictions[prediction.enrollment_id] = prediction
+        
+        return predictions
+    
+    @staticmethod
+    def get_latest_prediction(enrollment_id: int) -> Optional[Prediction]:
+        """Get the newest prediction for a single enrollment"""
+        return LatestPredictionService.get_latest_predictions([enrollment_id]).get(int(enrollment_id))
+    
+    @staticmethod
+    def rebuild(enrollment_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Recompute latest-prediction pointers from the predictions table
+        
+        Args:
+            enrollment_ids: Enrollments to rebuild; all when None
+        
+        Returns:
+            Number of pointers after the rebuild
+        """
+        if enrollment_ids is not None:
+            enrollment_ids = {int(enrollment_id) for enrollment_id in enrollment_ids}
+        
+        LatestPrediction.refresh(db.session.connection(), enrollment_ids)
+        db.session.commit()
+        
+        query = LatestPrediction.query
+        if enrollment_ids is not None:
+            query = query.filter(LatestPrediction.enrollment_id.in_(enrollment_ids))
+        count = query.count()
+        
+        logger.info(f"Rebuilt {count} latest-prediction pointers")
+        return count
@@ -1,6 +1,7 @@
 from datetime import datetime
 from backend.models import LMSSession, LMSActivity, Enrollment
 from backend.extensions import db
+from backend.middleware.activity_tracker import invalidate_enrollment_session
 import logging
 
 logger = logging.getLogger(__name__)
@@ -121,6 +122,7 @@ class LMSActivityService:
                 session.logout_time = datetime.utcnow()
                 session.duration_minutes = int((session.logout_time - session.login_time).seconds / 60)
                 db.session.commit()
+                invalidate_enrollment_session(enrollment_id)
                 return True
                 
             return False
@@ -1,19 +1,44 @@
-from datetime import datetime, timedelta
-from sqlalchemy import func
-from backend.models import LMSSession, LMSActivity, LMSDailySummary, Enrollment
+import json
+import time as timer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import case, func, literal_column, select
+from sqlalchemy.dialects.mysql import insert
+from backend.models import LMSSession, LMSActivity, LMSDailySummary, SystemConfig
 from backend.extensions import db
 import logging
 
 logger = logging.getLogger(__name__)
 
+# lms_activities.activity_type -> lms_daily_summary column; other types count as pages viewed
+ACTIVITY_COLUMNS = {
+    'resource_view': 'resource_views',
+    'forum_post': 'forum_posts',
+    'forum_reply': 'forum_replies',
+    'file_download': 'files_downloaded',
+    'video_watch': 'videos_watched',
+}
+
+COUNTER_COLUMNS = list(ACTIVITY_COLUMNS.values()) + ['pages_viewed']
+
+BACKFILL_CHECKPOINT_KEY = 'lms_summary_backfill'
+
 class LMSSummaryService:
     """Service to aggregate daily LMS activity summaries"""
     
+    UPSERT_BATCH_SIZE = 1000
+    BACKFILL_CHUNK_DAYS = 7
+    BACKFILL_WORKERS = 4
+    
     @staticmethod
     def generate_daily_summary(date=None):
         """
         Generate daily summary for all students
         Run this as a scheduled job (e.g., every night at midnight)
+        
+        Returns:
+            Number of summary rows written
         """
         if not date:
             date = datetime.now().date() - timedelta(days=1)  # Yesterday
@@ -21,94 +46,224 @@ class LMSSummaryService:
         logger.info(f"Generating LMS daily summary for {date}")
         
         try:
-            # Get all enrollments with activity on this date
-            enrollments_with_activity = db.session.query(
-                LMSSession.enrollment_id
-            ).filter(
-                func.date(LMSSession.login_time) == date
-            ).distinct().all()
-            
-            for (enrollment_id,) in enrollments_with_activity:
-                LMSSummaryService._generate_summary_for_enrollment(enrollment_id, date)
-            
-            db.session.commit()
-            logger.info(f"Generated daily summaries for {len(enrollments_with_activity)} enrollments")
-            
+            count = LMSSummaryService.summarize_range(date, date)
+            logger.info(f"Generated daily summaries for {count} enrollments")
+            return count
+        
         except Exception as e:
             logger.error(f"Error generating daily summary: {str(e)}")
             db.session.rollback()
     
     @staticmethod
-    def _generate_summary_for_enrollment(enrollment_id, date):
-        """Generate summary for a specific enrollment and date"""
-        
-        # Get all sessions for this date
-        sessions = LMSSession.query.filter(
-            LMSSession.enrollment_id == enrollment_id,
-            func.date(LMSSession.login_time) == date
-        ).all()
-        
-        if not sessions:
-            return
-        
-        # Calculate metrics
-        total_minutes = 0
-        login_count = len(sessions)
-        
-        # Activity counts
-        activity_counts = {
-            'resource_views': 0,
-            'forum_posts': 0,
-            'forum_replies': 0,
-            'assessment_views': 0,
-            'page_views': 0
-        }
+    def summarize_range(start_date, end_date):
+        """
+        Aggregate and upsert summaries for sessions started in [start_date, end_date]
         
-        for session in sessions:
-            # Calculate session duration
-            if session.logout_time:
-                duration = (session.logout_time - session.login_time).seconds / 60
-                total_minutes += duration
-            
-            # Count activities
-            activities = LMSActivity.query.filter_by(session_id=session.session_id).all()
+        Every (enrollment, day) counter comes out of one grouped statement and
+        is written with multi-row INSERT ... ON DUPLICATE KEY UPDATE. Errors
+        propagate to the caller.
+        
+        Returns:
+            Number of summary rows written
+        """
+        rows = LMSSummaryService._aggregate(start_date, end_date)
+        LMSSummaryService._upsert(rows)
+        db.session.commit()
+        return len(rows)
+    
+    @staticmethod
+    def backfill(start_date, end_date, chunk_days=None, workers=None, restart=False, progress=None):
+        """
+        Re-summarize every day in [start_date, end_date]
+        
+        The range is split into chunks of chunk_days days which a thread pool
+        summarizes independently, each worker in its own app context and
+        session. Finished chunks are checkpointed in system_config, so rerunning
+        the same range after an interruption skips them; the checkpoint is
+        dropped once the whole range succeeds.
+        
+        Args:
+            start_date: First day to summarize
+            end_date: Last day to summarize
+            chunk_days: Days per chunk (default BACKFILL_CHUNK_DAYS)
+            workers: Worker threads (default BACKFILL_WORKERS)
+            restart: Ignore an existing checkpoint for this range
+            progress: Optional callback(chunk_start, chunk_end, rows, seconds)
+        
+        Returns:
+            Dict with chunk, row and throughput totals
+        """
+        if end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        
+        chunk_days = chunk_days or LMSSummaryService.BACKFILL_CHUNK_DAYS
+        workers = workers or LMSSummaryService.BACKFILL_WORKERS
+        
+        chunks = []
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + timedelta(days=1)
+        
+        checkpoint = {'start': start_date.isoformat(), 'end': end_date.isoformat(), 'done': []}
+        if not restart:
+            saved = LMSSummaryService._load_checkpoint()
+            if saved and saved.get('start') == checkpoint['start'] and saved.get('end') == checkpoint['end']:
+                checkpoint = saved
+        
+        done = set(checkpoint['done'])
+        pending = [chunk for chunk in chunks if chunk[0].isoformat() not in done]
+        
+        logger.info(
+            f"Backfilling LMS summaries {start_date} to {end_date}: "
+            f"{len(pending)} of {len(chunks)} chunks pending, {workers} workers"
+        )
+        
+        app = current_app._get_current_object()
+        total_rows = 0
+        failed = []
+        started = timer.monotonic()
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(LMSSummaryService._summarize_chunk, app, chunk_start, chunk_end): (chunk_start, chunk_end)
+                for chunk_start, chunk_end in pending
+            }
             
-            for activity in activities:
-                if activity.activity_type == 'resource_view':
-                    activity_counts['resource_views'] += 1
-                elif activity.activity_type == 'forum_post':
-                    activity_counts['forum_posts'] += 1
-                elif activity.activity_type == 'forum_reply':
-                    activity_counts['forum_replies'] += 1
-                elif activity.activity_type in ['assessment_view', 'assessment_submit']:
-                    activity_counts['assessment_views'] += 1
-                else:
-                    activity_counts['page_views'] += 1
-        
-        # Check if summary exists
-        summary = LMSDailySummary.query.filter_by(
-            enrollment_id=enrollment_id,
-            summary_date=date
-        ).first()
-        
-        if summary:
-            # Update existing
-            summary.total_minutes = int(total_minutes)
-            summary.login_count = login_count
-            summary.resource_views = activity_counts['resource_views']
-            summary.forum_posts = activity_counts['forum_posts']
-            summary.forum_replies = activity_counts['forum_replies']
-            summary.pages_viewed = activity_counts['page_views']
-        else:
-            # Create new
-            summary = LMSDailySummary(
-                enrollment_id=enrollment_id,
-                summary_date=date,
-                total_minutes=int(total_minutes),
-                login_count=login_count,
-                resource_views=activity_counts['resource_views'],
-                forum_posts=activity_counts['forum_posts'],
-                forum_replies=activity_counts['forum_replies'],
-                pages_viewed=activity_counts['page_views']
-            )
-            db.session.add(summary)
\ No newline at end of file
+            for future in as_completed(futures):
+                chunk_start, chunk_end = futures[future]
+                try:
+                    rows, seconds = future.result()
+                except Exception as e:
+                    logger.error(f"Error summarizing {chunk_start} to {chunk_end}: {str(e)}")
+                    failed.append(chunk_start.isoformat())
+                    continue
+                
+                total_rows += rows
+                checkpoint['done'].append(chunk_start.isoformat())
+                LMSSummaryService._save_checkpoint(checkpoint)
+                
+                if progress:
+                    progress(chunk_start, chunk_end, rows, seconds)
+        
+        elapsed = timer.monotonic() - started
+        if not failed:
+            LMSSummaryService._save_checkpoint(None)
+        
+        stats = {
+            'chunks': len(chunks),
+            'skipped': len(chunks) - len(pending),
+            'failed': sorted(failed),
+            'rows': total_rows,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(total_rows / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        logger.info(f"LMS summary backfill finished: {stats}")
+        return stats
+    
+    @staticmethod
+    def _summarize_chunk(app, start_date, end_date):
+        """Summarize one chunk in a worker thread; returns (rows, seconds)"""
+        with app.app_context():
+            started = timer.monotonic()
+            try:
+                rows = LMSSummaryService.summarize_range(start_date, end_date)
+            except Exception:
+                db.session.rollback()
+                raise
+            return rows, timer.monotonic() - started
+    
+    @staticmethod
+    def _load_checkpoint():
+        """Read the backfill checkpoint, or None if there is none"""
+        config = SystemConfig.query.filter_by(config_key=BACKFILL_CHECKPOINT_KEY).first()
+        if not config or not config.config_value:
+            return None
+        try:
+            return json.loads(config.config_value)
+        except ValueError:
+            logger.warning("Ignoring unreadable LMS summary backfill checkpoint")
+            return None
+    
+    @staticmethod
+    def _save_checkpoint(checkpoint):
+        """Persist the backfill checkpoint; None clears it"""
+        config = SystemConfig.query.filter_by(config_key=BACKFILL_CHECKPOINT_KEY).first()
+        value = json.dumps(checkpoint) if checkpoint else None
+        
+        if config:
+            config.config_value = value
+        elif value:
+            db.session.add(SystemConfig(
+                BACKFILL_CHECKPOINT_KEY, value, 'Chunks finished by an interrupted LMS summary backfill'
+            ))
+        db.session.commit()
+    
+    @staticmethod
+    def _aggregate(start_date, end_date):
+        """Compute summary rows for every enrollment and day in the range"""
+        day_start = datetime.combine(start_date, time.min)
+        day_end = datetime.combine(end_date + timedelta(days=1), time.min)
+        in_range = (LMSSession.login_time >= day_start) & (LMSSession.login_time < day_end)
+        
+        # Activities are counted per session first so joining them does not
+        # multiply session counts and minutes
+        counters = [
+            func.sum(case((LMSActivity.activity_type == activity_type, 1), else_=0)).label(column)
+            for activity_type, column in ACTIVITY_COLUMNS.items()
+        ]
+        counters.append(func.sum(case(
+            (LMSActivity.activity_type.in_(list(ACTIVITY_COLUMNS)), 0), else_=1
+        )).label('pages_viewed'))
+        
+        activity_counts = select(
+            LMSActivity.session_id, *counters
+        ).join(
+            LMSSession, LMSSession.session_id == LMSActivity.session_id
+        ).where(in_range).group_by(LMSActivity.session_id).subquery()
+        
+        summary_date = func.date(LMSSession.login_time)
+        session_seconds = func.timestampdiff(
+            literal_column('SECOND'), LMSSession.login_time, LMSSession.logout_time
+        )
+        
+        result = db.session.execute(select(
+            LMSSession.enrollment_id,
+            summary_date.label('summary_date'),
+            func.count(LMSSession.session_id).label('login_count'),
+            func.coalesce(func.sum(session_seconds), 0).label('total_seconds'),
+            *[func.coalesce(func.sum(activity_counts.c[column]), 0).label(column)
+              for column in COUNTER_COLUMNS]
+        ).outerjoin(
+            activity_counts, activity_counts.c.session_id == LMSSession.session_id
+        ).where(in_range).group_by(
+            LMSSession.enrollment_id, summary_date
+        ))
+        
+        rows = []
+        for row in result:
+            summary = {
+                'enrollment_id': row.enrollment_id,
+                'summary_date': row.summary_date,
+                'total_minutes': int(row.total_seconds) // 60,
+                'login_count': row.login_count,
+            }
+            for column in COUNTER_COLUMNS:
+                summary[column] = int(getattr(row, column))
+            rows.append(summary)
+        
+        return rows
+    
+    @staticmethod
+    def _upsert(rows):
+        """Write summary rows, replacing the counters of existing (enrollment, day) rows"""
+        batch_size = LMSSummaryService.UPSERT_BATCH_SIZE
+        
+        for start in range(0, len(rows), batch_size):
+            statement = insert(LMSDailySummary.__table__).values(rows[start:start + batch_size])
+            statement = statement.on_duplicate_key_update({
+                column: statement.inserted[column]
+                for column in ['total_minutes', 'login_count'] + COUNTER_COLUMNS
+            })
+            db.session.execute(statement)
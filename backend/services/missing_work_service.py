@@ -0,0 +1,97 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from backend.models import Assessment, AssessmentSubmission
+from backend.extensions import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MissingWorkService:
+    """Count past-due published assessments each enrollment never submitted"""
+    
+    @staticmethod
+    def count_missing(enrollments: Iterable[Tuple[int, int]],
+                      as_of: Optional[datetime] = None) -> Dict[int, int]:
+        """
+        Count missing submissions for many enrollments
+        
+        Reads the past-due published assessments and their submissions in one
+        query each, then builds an enrollment x assessment submitted matrix per
+        offering and counts the empty cells. A submission that is not graded
+        yet does not count as missing.
+        
+        Args:
+            enrollments: (enrollment_id, offering_id) pairs
+            as_of: Due-date cutoff (default now)
+        
+        Returns:
+            Dict of enrollment_id -> missing assessment count
+        """
+        enrollments = list(enrollments)
+        if not enrollments:
+            return {}
+        
+        as_of = as_of or datetime.now()
+        enrollment_ids = np.array([enrollment_id for enrollment_id, _ in enrollments], dtype=np.int64)
+        enrollment_offerings = np.array([offering_id for _, offering_id in enrollments], dtype=np.int64)
+        
+        assessments = db.session.query(
+            Assessment.assessment_id, Assessment.offering_id
+        ).filter(
+            Assessment.offering_id.in_(set(enrollment_offerings.tolist())),
+            Assessment.is_published == True,
+            Assessment.due_date <= as_of
+        ).all()
+        
+        if not assessments:
+            return dict.fromkeys(enrollment_ids.tolist(), 0)
+        
+        assessment_ids = np.array([row.assessment_id for row in assessments], dtype=np.int64)
+        assessment_offerings = np.array([row.offering_id for row in assessments], dtype=np.int64)
+        order = np.argsort(assessment_ids)
+        assessment_ids, assessment_offerings = assessment_ids[order], assessment_offerings[order]
+        
+        submissions = db.session.query(
+            AssessmentSubmission.enrollment_id, AssessmentSubmission.assessment_id
+        ).filter(
+            AssessmentSubmission.assessment_id.in_(assessment_ids.tolist())
+        ).distinct().all()
+        
+        submission_enrollments = np.array([row[0] for row in submissions], dtype=np.int64)
+        submission_assessments = np.array([row[1] for row in submissions], dtype=np.int64)
+        submission_offerings = assessment_offerings[np.searchsorted(assessment_ids, submission_assessments)]
+        
+        missing = {}
+        for offering_id in np.unique(enrollment_offerings):
+            offering_enrollments = np.unique(enrollment_ids[enrollment_offerings == offering_id])
+            offering_assessments = assessment_ids[assessment_offerings == offering_id]
+            
+            if len(offering_assessments) == 0:
+                missing.update(dict.fromkeys(offering_enrollments.tolist(), 0))
+                continue
+            
+            in_offering = submission_offerings == offering_id
+            rows = np.searchsorted(offering_enrollments, submission_enrollments[in_offering])
+            cols = np.searchsorted(offering_assessments, submission_assessments[in_offering])
+            
+            # Submissions from enrollments outside the requested set are ignored
+            rows_clipped = np.minimum(rows, len(offering_enrollments) - 1)
+            known = offering_enrollments[rows_clipped] == submission_enrollments[in_offering]
+            
+            submitted = np.zeros((len(offering_enrollments), len(offering_assessments)), dtype=bool)
+            submitted[rows[known], cols[known]] = True
+            
+            counts = len(offering_assessments) - submitted.sum(axis=1)
+            missing.update(zip(offering_enrollments.tolist(), counts.tolist()))
+        
+        return missing
+    
+    @staticmethod
+    def count_missing_for_offering(offering_id: int, enrollment_ids: Iterable[int],
+                                   as_of: Optional[datetime] = None) -> Dict[int, int]:
+        """Count missing submissions for enrollments of a single offering"""
+        return MissingWorkService.count_missing(
+            ((enrollment_id, offering_id) for enrollment_id in enrollment_ids), as_of
+        )
@@ -92,6 +92,20 @@ class ModelService:
         Returns:
             List of (predicted_grade, confidence, risk_level) tuples
         """
+        if not feature_list:
+            return []
+        
+        try:
+            # Stack all rows into one matrix and score them in a single call
+            features = np.vstack([np.asarray(f, dtype=float).reshape(1, -1) for f in feature_list])
+            grades, confidences, risk_levels = self.predict_matrix(features)
+            return [
+                (str(grade), float(confidence), str(risk_level))
+                for grade, confidence, risk_level in zip(grades, confidences, risk_levels)
+            ]
+        except Exception as e:
+            logger.error(f"Vectorized batch prediction failed, falling back to per-row: {str(e)}")
+        
         results = []
         for features in feature_list:
             try:
@@ -103,6 +117,39 @@ class ModelService:
         
         return results
     
+    def predict_matrix(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score a whole feature matrix with one scaler call and one model call
+        
+        Args:
+            features: Feature matrix (n_samples, n_features)
+            
+        Returns:
+            Tuple of (grades, confidences, risk_levels) arrays of length n_samples
+        """
+        features = np.asarray(features, dtype=float)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        
+        if features.shape[0] == 0:
+            return (np.array([], dtype=object), np.array([], dtype=float),
+                    np.array([], dtype=object))
+        
+        # Scale features
+        features_scaled = self._scaler.transform(features)
+        
+        # One probability pass gives both the class and the confidence
+        probabilities = self._model.predict_proba(features_scaled)
+        class_index = np.argmax(probabilities, axis=1)
+        classes = getattr(self._model, 'classes_', None)
+        predictions = np.asarray(classes)[class_index] if classes is not None else class_index
+        confidences = probabilities.max(axis=1).astype(float)
+        
+        grades = self._convert_to_grades(predictions)
+        risk_levels = self._calculate_risk_levels(predictions, confidences)
+        
+        return grades, confidences, risk_levels
+    
     def _convert_to_grade(self, prediction: int) -> str:
         """Convert numeric prediction to letter grade"""
         # Assuming binary classification (pass/fail)
@@ -129,6 +176,25 @@ class ModelService:
             else:
                 return 'medium'  # Less confident fail = still concerning
     
+    def _convert_to_grades(self, predictions: np.ndarray) -> np.ndarray:
+        """Vectorized version of _convert_to_grade"""
+        return np.where(np.asarray(predictions) == 1, 'Pass', 'Fail').astype(object)
+    
+    def _calculate_risk_levels(self, predictions: np.ndarray,
+                               confidences: np.ndarray) -> np.ndarray:
+        """Vectorized version of _calculate_risk_level"""
+        is_pass = np.asarray(predictions) == 1
+        confidences = np.asarray(confidences, dtype=float)
+        
+        conditions = [
+            is_pass & (confidences > 0.8),
+            is_pass & (confidences > 0.6),
+            is_pass,
+            confidences > 0.8
+        ]
+        choices = ['low', 'medium', 'high', 'high']
+        return np.select(conditions, choices, default='medium').astype(object)
+    
     def get_model_info(self) -> Dict:
         """Get information about the loaded model"""
         return {
@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from sqlalchemy import and_, or_, func, desc
 from backend.extensions import db
+from backend.utils.pagination import InvalidCursor, cached_count, keyset_paginate
 from backend.models import (
     Prediction, ModelVersion, Enrollment, Student, Faculty,
     CourseOffering, Course, User, Assessment, AssessmentSubmission,
@@ -93,60 +94,38 @@ class PredictionAnalyticsService:
             }
     
     def get_predictions_list(self, page: int = 1, per_page: int = 10, 
-                            filters: Dict = None) -> Dict:
-        """Get paginated predictions list with filters"""
+                            filters: Dict = None, cursor: Optional[str] = None,
+                            include_total: bool = True) -> Dict:
+        """
+        Get a page of predictions with filters, newest first
+        
+        Pages are keyset-paginated on (prediction_date, prediction_id): pass
+        the returned next_cursor to get the following page. page is still
+        honoured (as an offset) when no cursor is given. The total is an
+        approximate cached count and is omitted when include_total is False.
+        """
         try:
-            # Build query with joins
-            query = db.session.query(
+            query = self._apply_prediction_filters(self._prediction_list_query(
                 Prediction, Enrollment, Student, User, CourseOffering, Course
-            ).join(
-                Enrollment, Prediction.enrollment_id == Enrollment.enrollment_id
-            ).join(
-                Student, Enrollment.student_id == Student.student_id
-            ).join(
-                User, Student.user_id == User.user_id
-            ).join(
-                CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
-            ).join(
-                Course, CourseOffering.course_id == Course.course_id
+            ), filters)
+            
+            # Newest first, with prediction_id as the unique tie-breaker
+            rows, next_cursor = keyset_paginate(
+                query,
+                [Prediction.prediction_date, Prediction.prediction_id],
+                lambda row: (row[0].prediction_date, row[0].prediction_id),
+                per_page,
+                cursor=cursor,
+                offset=(max(page, 1) - 1) * per_page
             )
             
-            # Apply filters
-            if filters:
-                if filters.get('risk_level'):
-                    query = query.filter(Prediction.risk_level == filters['risk_level'])
-                
-                if filters.get('course_id'):
-                    query = query.filter(Course.course_id == filters['course_id'])
-                
-                if filters.get('grade'):
-                    query = query.filter(Prediction.predicted_grade == filters['grade'])
-                
-                if filters.get('date_from'):
-                    query = query.filter(Prediction.prediction_date >= filters['date_from'])
-                
-                if filters.get('date_to'):
-                    query = query.filter(Prediction.prediction_date <= filters['date_to'])
-                
-                if filters.get('search'):
-                    search_term = f"%{filters['search']}%"
-                    query = query.filter(or_(
-                        Student.student_id.ilike(search_term),
-                        Student.first_name.ilike(search_term),
-                        Student.last_name.ilike(search_term)
-                    ))
-            
-            # Order by date (newest first)
-            query = query.order_by(desc(Prediction.prediction_date))
-            
-            # Paginate
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            total = cached_count('admin_predictions', filters, query) if include_total else None
+            current_grades = self._get_current_grades({enrollment.enrollment_id for _, enrollment, *_ in rows})
             
             # Format results
             predictions = []
-            for pred, enrollment, student, user, offering, course in pagination.items:
-                # Get current grade from feature cache if available
-                current_grade = self._get_current_grade(enrollment.enrollment_id)
+            for pred, enrollment, student, user, offering, course in rows:
+                current_grade = current_grades.get(enrollment.enrollment_id, '-')
                 
                 predictions.append({
                     'prediction_id': pred.prediction_id,
@@ -172,12 +151,15 @@ class PredictionAnalyticsService:
             
             return {
                 'predictions': predictions,
-                'total': pagination.total,
-                'pages': pagination.pages,
+                'total': total,
+                'pages': (total + per_page - 1) // per_page if total is not None and per_page > 0 else None,
                 'current_page': page,
-                'per_page': per_page
+                'per_page': per_page,
+                'next_cursor': next_cursor
             }
             
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"Error getting predictions list: {str(e)}")
             return {
@@ -185,9 +167,101 @@ class PredictionAnalyticsService:
                 'total': 0,
                 'pages': 0,
                 'current_page': page,
-                'per_page': per_page
+                'per_page': per_page,
+                'next_cursor': None
             }
     
+    def iter_prediction_export_rows(self, filters: Dict = None, page_size: int = 1000):
+        """
+        Yield pages of prediction export rows, newest first
+        
+        Pages are read with keyset pagination on (prediction_date,
+        prediction_id), so every page costs the same and memory stays
+        constant however many predictions match. Current grades come from
+        one grouped query per page.
+        """
+        query = self._apply_prediction_filters(self._prediction_list_query(
+            Prediction.prediction_id, Prediction.enrollment_id, Prediction.prediction_date,
+            Prediction.predicted_grade, Prediction.risk_level, Prediction.confidence_score,
+            Student.student_id, Student.first_name, Student.last_name,
+            Course.course_code, Course.course_name
+        ), filters)
+        
+        cursor = None
+        while True:
+            rows, cursor = keyset_paginate(
+                query,
+                [Prediction.prediction_date, Prediction.prediction_id],
+                lambda row: (row.prediction_date, row.prediction_id),
+                page_size,
+                cursor=cursor
+            )
+            if not rows:
+                return
+            
+            current_grades = self._get_current_grades({row.enrollment_id for row in rows})
+            yield [
+                {
+                    'student_id': row.student_id,
+                    'student_name': f"{row.first_name} {row.last_name}",
+                    'course_code': row.course_code,
+                    'course_name': row.course_name,
+                    'predicted_grade': row.predicted_grade,
+                    'current_grade': current_grades.get(row.enrollment_id, '-'),
+                    'risk_level': row.risk_level,
+                    'confidence_score': float(row.confidence_score),
+                    'prediction_date': row.prediction_date.isoformat()
+                }
+                for row in rows
+            ]
+            
+            if cursor is None:
+                return
+    
+    def _prediction_list_query(self, *entities):
+        """Query predictions joined to their student, user and course"""
+        return db.session.query(*entities).join(
+            Enrollment, Prediction.enrollment_id == Enrollment.enrollment_id
+        ).join(
+            Student, Enrollment.student_id == Student.student_id
+        ).join(
+            User, Student.user_id == User.user_id
+        ).join(
+            CourseOffering, Enrollment.offering_id == CourseOffering.offering_id
+        ).join(
+            Course, CourseOffering.course_id == Course.course_id
+        )
+    
+    def _apply_prediction_filters(self, query, filters: Dict = None):
+        """Apply the admin prediction list filters to a _prediction_list_query"""
+        if not filters:
+            return query
+        
+        if filters.get('risk_level'):
+            query = query.filter(Prediction.risk_level == filters['risk_level'])
+        
+        if filters.get('course_id'):
+            query = query.filter(Course.course_id == filters['course_id'])
+        
+        if filters.get('grade'):
+            query = query.filter(Prediction.predicted_grade == filters['grade'])
+        
+        if filters.get('date_from'):
+            query = query.filter(Prediction.prediction_date >= filters['date_from'])
+        
+        if filters.get('date_to'):
+            query = query.filter(Prediction.prediction_date <= filters['date_to'])
+        
+        if filters.get('search'):
+            search_term = f"%{filters['search']}%"
+            query = query.filter(or_(
+                Student.student_id.ilike(search_term),
+                Student.first_name.ilike(search_term),
+                Student.last_name.ilike(search_term)
+            ))
+        
+        return query
+    
     def get_prediction_details(self, prediction_id: int) -> Optional[Dict]:
         """Get detailed prediction information"""
         try:
@@ -435,35 +509,47 @@ class PredictionAnalyticsService:
     
     def _get_current_grade(self, enrollment_id: int) -> str:
         """Get current grade calculation"""
+        return self._get_current_grades([enrollment_id]).get(enrollment_id, '-')
+    
+    def _get_current_grades(self, enrollment_ids) -> Dict[int, str]:
+        """Get current letter grades for many enrollments in one grouped query"""
+        enrollment_ids = list(enrollment_ids)
+        if not enrollment_ids:
+            return {}
+        
         try:
             # Get average of graded assessments
-            avg_score = db.session.query(
+            rows = db.session.query(
+                AssessmentSubmission.enrollment_id,
                 func.avg(AssessmentSubmission.score)
             ).join(
                 Assessment
             ).filter(
-                AssessmentSubmission.enrollment_id == enrollment_id,
+                AssessmentSubmission.enrollment_id.in_(enrollment_ids),
                 AssessmentSubmission.is_graded == True
-            ).scalar()
-            
-            if avg_score:
-                # Convert to letter grade
-                score = float(avg_score)
-                if score >= 90:
-                    return 'A'
-                elif score >= 80:
-                    return 'B'
-                elif score >= 70:
-                    return 'C'
-                elif score >= 60:
-                    return 'D'
-                else:
-                    return 'F'
-            
-            return '-'
+            ).group_by(AssessmentSubmission.enrollment_id).all()
             
-        except:
-            return '-'
+            return {
+                enrollment_id: self._letter_grade(float(avg_score)) if avg_score else '-'
+                for enrollment_id, avg_score in rows
+            }
+            
+        except Exception:
+            return {}
+    
+    @staticmethod
+    def _letter_grade(score: float) -> str:
+        """Convert an average percentage score to a letter grade"""
+        if score >= 90:
+            return 'A'
+        elif score >= 80:
+            return 'B'
+        elif score >= 70:
+            return 'C'
+        elif score >= 60:
+            return 'D'
+        else:
+            return 'F'
     
     def _get_historical_predictions(self, enrollment_id: int, limit: int = 10) -> List[Dict]:
         """Get historical predictions for an enrollment"""
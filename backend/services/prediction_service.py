@@ -1,23 +1,41 @@
+import hashlib
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from backend.extensions import db
 from backend.models import (
-    Prediction, FeatureCache, Enrollment, Student, 
-    CourseOffering, Alert, AlertType, ModelVersion
+    Prediction, LatestPrediction, FeatureCache, Enrollment, Student, 
+    CourseOffering, Alert, ModelVersion,
+    Attendance, LMSActivity, Assessment, AssessmentSubmission
 )
 from backend.services.feature_calculator_service import FeatureCalculator
+from backend.services.bulk_feature_service import BulkFeatureCalculator
 from backend.services.model_service import ModelService
+from backend.services.alert_type_registry import alert_type_registry, AlertTypeEntry
 import logging
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Source tables whose row count and id sum per enrollment make up a feature
+# data watermark. Unlike the newest id, these change when a row with a lower
+# id commits late, so out-of-order commits cannot hide behind the watermark.
+# The count and newest id of the offering's assessments already due follow,
+# as submission rates change when an assessment falls due or is added.
+WATERMARK_SOURCES = (
+    (Attendance, Attendance.attendance_id),
+    (LMSActivity, LMSActivity.activity_id),
+    (AssessmentSubmission, AssessmentSubmission.submission_id)
+)
+
+EMPTY_WATERMARK = (0, 0, 0, 0, 0, 0, 0, 0)
+
 class PredictionService:
     """Service for managing grade predictions"""
     
     def __init__(self):
         self.feature_calculator = FeatureCalculator()
+        self.bulk_feature_calculator = BulkFeatureCalculator(self.feature_calculator)
         self.model_service = ModelService()
     
     def generate_prediction(self, enrollment_id: int, 
@@ -25,6 +43,10 @@ class PredictionService:
         """
         Generate a prediction for a single student enrollment
         
+        When saving, an enrollment whose latest prediction came from the same
+        model and feature vector gets that stored prediction back instead of
+        a new row.
+        
         Args:
             enrollment_id: The enrollment to predict for
             save: Whether to save the prediction to database
@@ -35,16 +57,35 @@ class PredictionService:
         try:
             logger.info(f"Generating prediction for enrollment {enrollment_id}")
             
-            # Calculate features
-            features = self.feature_calculator.calculate_features_for_enrollment(
-                enrollment_id
-            )
+            # Reuse today's cached features unless source rows were added or removed
+            watermark = self._data_watermarks(
+                Enrollment.enrollment_id == enrollment_id
+            ).get(enrollment_id, EMPTY_WATERMARK)
+            features = self._get_cached_features(enrollment_id, watermark)
+            cache_hit = features is not None
             
-            # Make prediction
-            predicted_grade, confidence, risk_level = self.model_service.predict(features)
+            if not cache_hit:
+                features = self.feature_calculator.calculate_features_for_enrollment(
+                    enrollment_id
+                )
             
             # Get model info
             model_info = self.model_service.get_model_info()
+            feature_hash = self._feature_hash(features)
+            
+            # Same features under the same model: return the stored prediction
+            if save:
+                memo = self._get_memoized_prediction(enrollment_id, model_info['version'], feature_hash)
+                if memo:
+                    if not cache_hit:
+                        self._cache_features(enrollment_id, features, watermark)
+                        db.session.commit()
+                    
+                    logger.info(f"Reusing prediction {memo.prediction_id} for unchanged enrollment {enrollment_id}")
+                    return self._memoized_prediction_data(memo, features)
+            
+            # Make prediction
+            predicted_grade, confidence, risk_level = self.model_service.predict(features)
             
             # Create prediction record
             prediction_data = {
@@ -59,7 +100,7 @@ class PredictionService:
             
             if save:
                 # Save to database
-                prediction = Prediction(**prediction_data)
+                prediction = Prediction(**prediction_data, feature_hash=feature_hash)
                 
                 # Add model accuracy if available
                 model_version = ModelVersion.query.filter_by(is_active=True).first()
@@ -73,7 +114,8 @@ class PredictionService:
                     self._create_alert(enrollment_id, risk_level, predicted_grade)
                 
                 # Cache features for performance
-                self._cache_features(enrollment_id, features)
+                if not cache_hit:
+                    self._cache_features(enrollment_id, features, watermark)
                 
                 db.session.commit()
                 prediction_data['prediction_id'] = prediction.prediction_id
@@ -96,6 +138,9 @@ class PredictionService:
         """
         Generate predictions for all students in a course offering
         
+        Features for the whole offering are extracted in bulk and scored
+        with a single model call.
+        
         Args:
             offering_id: The course offering ID
             
@@ -104,40 +149,93 @@ class PredictionService:
         """
         try:
             # Get all active enrollments for the offering
-            enrollments = Enrollment.query.filter(
+            enrollments = db.session.query(
+                Enrollment.enrollment_id, Enrollment.student_id
+            ).filter(
                 and_(
                     Enrollment.offering_id == offering_id,
                     Enrollment.enrollment_status == 'enrolled'
                 )
             ).all()
+            student_ids = dict(enrollments)
+            
+            # Read before extraction so rows arriving meanwhile mismatch the watermark
+            watermarks = self._data_watermarks(Enrollment.offering_id == offering_id)
+            enrollment_ids, feature_matrix = self.bulk_feature_calculator.calculate_features_for_offering(
+                offering_id
+            )
+            if not enrollment_ids:
+                logger.info(f"No active enrollments to predict for offering {offering_id}")
+                return []
+            
+            grades, confidences, risk_levels = self.model_service.predict_matrix(feature_matrix)
+            model_info = self.model_service.get_model_info()
+            
+            model_version = ModelVersion.query.filter_by(is_active=True).first()
+            model_accuracy = model_version.accuracy if model_version and model_version.accuracy else None
+            
+            prediction_date = datetime.now()
+            predictions = []
+            alert_type = None
+            
+            for row, enrollment_id in enumerate(enrollment_ids):
+                features = feature_matrix[row:row + 1]
+                prediction = Prediction(
+                    enrollment_id=enrollment_id,
+                    prediction_date=prediction_date,
+                    predicted_grade=grades[row],
+                    confidence_score=float(confidences[row]),
+                    risk_level=risk_levels[row],
+                    model_version=model_info['version'],
+                    feature_snapshot=self._create_feature_snapshot(features),
+                    feature_hash=self._feature_hash(features)
+                )
+                if model_accuracy:
+                    prediction.model_accuracy = model_accuracy
+                predictions.append(prediction)
+                
+                # Check if alert needed
+                if risk_levels[row] in ['medium', 'high']:
+                    if alert_type is None:
+                        alert_type = self._get_or_create_alert_type(risk_levels[row])
+                    self._create_alert(enrollment_id, risk_levels[row], grades[row],
+                                       alert_type=alert_type)
+            
+            db.session.add_all(predictions)
+            self._cache_features_bulk(enrollment_ids, feature_matrix, watermarks)
+            db.session.flush()
             
             results = []
-            success_count = 0
+            for row, (enrollment_id, prediction) in enumerate(zip(enrollment_ids, predictions)):
+                features = feature_matrix[row:row + 1]
+                prediction_data = {
+                    'enrollment_id': enrollment_id,
+                    'prediction_date': prediction_date,
+                    'predicted_grade': prediction.predicted_grade,
+                    'confidence_score': float(confidences[row]),
+                    'risk_level': prediction.risk_level,
+                    'model_version': prediction.model_version,
+                    'feature_snapshot': prediction.feature_snapshot,
+                    'prediction_id': prediction.prediction_id,
+                    'explanation': self.model_service.explain_prediction(
+                        features, prediction.predicted_grade, float(confidences[row])
+                    )
+                }
+                results.append({
+                    'enrollment_id': enrollment_id,
+                    'student_id': student_ids.get(enrollment_id),
+                    'status': 'success',
+                    'prediction': prediction_data
+                })
             
-            for enrollment in enrollments:
-                try:
-                    result = self.generate_prediction(enrollment.enrollment_id)
-                    results.append({
-                        'enrollment_id': enrollment.enrollment_id,
-                        'student_id': enrollment.student_id,
-                        'status': 'success',
-                        'prediction': result
-                    })
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to predict for enrollment {enrollment.enrollment_id}: {str(e)}")
-                    results.append({
-                        'enrollment_id': enrollment.enrollment_id,
-                        'student_id': enrollment.student_id,
-                        'status': 'error',
-                        'error': str(e)
-                    })
+            db.session.commit()
             
-            logger.info(f"Batch prediction complete: {success_count}/{len(enrollments)} successful")
+            logger.info(f"Batch prediction complete: {len(results)}/{len(enrollments)} successful")
             return results
             
         except Exception as e:
             logger.error(f"Error in batch prediction: {str(e)}")
+            db.session.rollback()
             raise
     
     def get_prediction_history(self, enrollment_id: int, 
@@ -273,21 +371,11 @@ class PredictionService:
         }
     
     def _create_alert(self, enrollment_id: int, risk_level: str, 
-                     predicted_grade: str):
+                     predicted_grade: str, alert_type: Optional[AlertTypeEntry] = None):
         """Create an alert for at-risk students"""
         # Get or create alert type
-        alert_type = AlertType.query.filter_by(
-            type_name='at_risk_prediction'
-        ).first()
-        
-        if not alert_type:
-            alert_type = AlertType(
-                type_name='at_risk_prediction',
-                severity='warning' if risk_level == 'medium' else 'critical',
-                description='Student identified as at-risk by prediction model'
-            )
-            db.session.add(alert_type)
-            db.session.flush()
+        if alert_type is None:
+            alert_type = self._get_or_create_alert_type(risk_level)
         
         # Create alert
         alert = Alert(
@@ -299,35 +387,77 @@ class PredictionService:
         )
         db.session.add(alert)
     
-    def _cache_features(self, enrollment_id: int, features: np.ndarray):
-        """Cache calculated features for performance"""
-        feature_names = self.feature_calculator.get_feature_names()
-        feature_values = features.flatten()
+    def _get_or_create_alert_type(self, risk_level: str) -> AlertTypeEntry:
+        """Get the at-risk prediction alert type, creating it if needed"""
+        return alert_type_registry.get_or_create(
+            'at_risk_prediction',
+            severity='warning' if risk_level == 'medium' else 'critical',
+            description='Student identified as at-risk by prediction model'
+        )
+    
+    def _get_memoized_prediction(self, enrollment_id: int, model_version: str,
+                                 feature_hash: str) -> Optional[Prediction]:
+        """Latest prediction of an enrollment, if it was made by this model from these features"""
+        prediction = Prediction.query.join(
+            LatestPrediction, LatestPrediction.prediction_id == Prediction.prediction_id
+        ).filter(
+            LatestPrediction.enrollment_id == enrollment_id
+        ).first()
         
-        # Create feature cache entry
-        cache_data = {
-            'enrollment_id': enrollment_id,
-            'feature_date': datetime.now().date()
-        }
+        if prediction and prediction.model_version == model_version and prediction.feature_hash == feature_hash:
+            return prediction
+        return None
+    
+    def _memoized_prediction_data(self, prediction: Prediction, features: np.ndarray) -> Dict:
+        """Build generate_prediction's result from a stored prediction"""
+        confidence = float(prediction.confidence_score)
         
-        # Map specific features to cache columns
-        feature_mapping = {
-            'attendance_rate': 'attendance_rate',
-            'avg_session_duration': 'avg_session_duration',
-            'login_frequency': 'login_frequency',
-            'resource_access_rate': 'resource_access_rate',
-            'assessment_submission_rate': 'assignment_submission_rate',
-            'avg_assessment_score': 'avg_assignment_score',
-            'forum_engagement_score': 'forum_engagement_score',
-            'study_consistency': 'study_consistency_score',
-            'days_since_last_login': 'last_login_days_ago',
-            'total_online_minutes': 'total_study_minutes'
+        return {
+            'enrollment_id': prediction.enrollment_id,
+            'prediction_date': prediction.prediction_date,
+            'predicted_grade': prediction.predicted_grade,
+            'confidence_score': confidence,
+            'risk_level': prediction.risk_level,
+            'model_version': prediction.model_version,
+            'feature_snapshot': prediction.feature_snapshot,
+            'prediction_id': prediction.prediction_id,
+            'explanation': self.model_service.explain_prediction(
+                features, prediction.predicted_grade, confidence
+            )
         }
+    
+    @staticmethod
+    def _feature_hash(features: np.ndarray) -> str:
+        """SHA-1 of a feature vector's float64 bytes"""
+        return hashlib.sha1(np.ascontiguousarray(features, dtype=np.float64).tobytes()).hexdigest()
+    
+    def _get_cached_features(self, enrollment_id: int, watermark: Tuple) -> Optional[np.ndarray]:
+        """
+        Get today's cached feature vector if it was computed from the same data
+        
+        Returns:
+            Feature matrix of shape (1, n_features), or None on a cache miss
+        """
+        cache = FeatureCache.query.filter_by(
+            enrollment_id=enrollment_id,
+            feature_date=datetime.now().date()
+        ).first()
         
-        for feature_name, cache_column in feature_mapping.items():
-            if feature_name in feature_names:
-                idx = feature_names.index(feature_name)
-                cache_data[cache_column] = feature_values[idx]
+        if not cache or not cache.feature_vector or cache.watermark != tuple(watermark):
+            return None
+        
+        try:
+            values = [cache.feature_vector[name] for name in self.feature_calculator.get_feature_names()]
+        except KeyError:
+            # Cached before the model's feature list changed
+            return None
+        
+        logger.info(f"Using cached features for enrollment {enrollment_id}")
+        return np.array(values, dtype=float).reshape(1, -1)
+    
+    def _cache_features(self, enrollment_id: int, features: np.ndarray, watermark: Tuple):
+        """Cache calculated features for performance"""
+        cache_data = self._build_cache_data(enrollment_id, features, watermark)
         
         # Check if cache exists for today
         existing_cache = FeatureCache.query.filter_by(
@@ -344,6 +474,97 @@ class PredictionService:
             cache = FeatureCache(**cache_data)
             db.session.add(cache)
     
+    def _cache_features_bulk(self, enrollment_ids: List[int], feature_matrix: np.ndarray,
+                             watermarks: Dict[int, Tuple]):
+        """Cache features for many enrollments, loading today's cache rows in one query"""
+        today = datetime.now().date()
+        existing = {
+            cache.enrollment_id: cache
+            for cache in FeatureCache.query.filter(
+                FeatureCache.enrollment_id.in_(enrollment_ids),
+                FeatureCache.feature_date == today
+            ).all()
+        }
+        
+        for row, enrollment_id in enumerate(enrollment_ids):
+            cache_data = self._build_cache_data(
+                enrollment_id, feature_matrix[row:row + 1],
+                watermarks.get(enrollment_id, EMPTY_WATERMARK)
+            )
+            existing_cache = existing.get(enrollment_id)
+            
+            if existing_cache:
+                for key, value in cache_data.items():
+                    setattr(existing_cache, key, value)
+            else:
+                db.session.add(FeatureCache(**cache_data))
+    
+    def _build_cache_data(self, enrollment_id: int, features: np.ndarray, watermark: Tuple) -> Dict:
+        """Build a feature cache row holding the full feature vector and its data watermark"""
+        (attendance_rows, attendance_id_sum, activity_rows, activity_id_sum,
+         submission_rows, submission_id_sum, due_assessments, max_due_assessment_id) = watermark
+        
+        return {
+            'enrollment_id': enrollment_id,
+            'feature_date': datetime.now().date(),
+            'feature_vector': self._create_feature_snapshot(features),
+            'attendance_rows': attendance_rows,
+            'attendance_id_sum': attendance_id_sum,
+            'activity_rows': activity_rows,
+            'activity_id_sum': activity_id_sum,
+            'submission_rows': submission_rows,
+            'submission_id_sum': submission_id_sum,
+            'due_assessments': due_assessments,
+            'max_due_assessment_id': max_due_assessment_id,
+            'calculated_at': datetime.utcnow()
+        }
+    
+    @staticmethod
+    def _data_watermarks(*criteria) -> Dict[int, Tuple]:
+        """
+        Attendance, LMS activity and submission row counts and id sums per
+        enrollment, plus the count and newest id of assessments due so far in
+        the enrollment's offering
+        
+        Args:
+            criteria: Filters on Enrollment selecting the enrollments
+        
+        Returns:
+            Dict of enrollment_id -> (attendance_rows, attendance_id_sum,
+            activity_rows, activity_id_sum, submission_rows,
+            submission_id_sum, due_assessments, max_due_assessment_id);
+            enrollments without any rows are left out
+        """
+        watermarks = {}
+        
+        for position, (model, id_column) in enumerate(WATERMARK_SOURCES):
+            rows = db.session.query(
+                model.enrollment_id, func.count(id_column), func.sum(id_column)
+            ).join(
+                Enrollment, Enrollment.enrollment_id == model.enrollment_id
+            ).filter(*criteria).group_by(model.enrollment_id).all()
+            
+            for enrollment_id, row_count, id_sum in rows:
+                watermark = watermarks.setdefault(enrollment_id, list(EMPTY_WATERMARK))
+                watermark[2 * position] = row_count
+                watermark[2 * position + 1] = int(id_sum or 0)
+        
+        due_rows = db.session.query(
+            Enrollment.enrollment_id,
+            func.count(Assessment.assessment_id),
+            func.max(Assessment.assessment_id)
+        ).join(
+            Assessment, Assessment.offering_id == Enrollment.offering_id
+        ).filter(
+            Assessment.due_date <= datetime.now(), *criteria
+        ).group_by(Enrollment.enrollment_id).all()
+        
+        for enrollment_id, due_count, max_id in due_rows:
+            watermark = watermarks.setdefault(enrollment_id, list(EMPTY_WATERMARK))
+            watermark[-2:] = [due_count, max_id or 0]
+        
+        return {enrollment_id: tuple(watermark) for enrollment_id, watermark in watermarks.items()}
+    
     def _get_course_info(self, offering_id: int) -> Dict:
         """Get course information for an offering"""
         offering = CourseOffering.query.get(offering_id)
@@ -370,38 +591,27 @@ class PredictionService:
             return 'unchanged'
         
     @staticmethod
-    def update_feature_cache_for_all_students():
+    def update_feature_cache_for_all_students(workers: Optional[int] = None) -> Optional[Dict]:
         """
         Update feature cache for all active students
         Run this as a scheduled job (e.g., every night)
+        
+        Offerings are processed as partitions on a process pool, each with
+        bulk feature extraction and one cache write.
+        
+        Args:
+            workers: Worker processes (default one per core)
+        
+        Returns:
+            Job runner report, or None if the run could not start
         """
+        from backend.tasks.job_runner import PartitionedJobRunner, cache_offering_features
+        
         try:
-            # Get all active enrollments
-            active_enrollments = db.session.query(Enrollment).filter(
-                Enrollment.enrollment_status == 'enrolled'
-            ).all()
-            
-            logger.info(f"Updating feature cache for {len(active_enrollments)} enrollments")
-            
-            feature_calculator = FeatureCalculator()
-            
-            for enrollment in active_enrollments:
-                try:
-                    # Calculate features
-                    features = feature_calculator.calculate_features_for_enrollment(
-                        enrollment.enrollment_id
-                    )
-                    
-                    # Save to cache
-                    prediction_service = PredictionService()
-                    prediction_service._cache_features(enrollment.enrollment_id, features)
-                    
-                except Exception as e:
-                    logger.error(f"Error caching features for enrollment {enrollment.enrollment_id}: {str(e)}")
-            
-            db.session.commit()
-            logger.info("Feature cache update completed")
+            report = PartitionedJobRunner(cache_offering_features, workers=workers).run()
+            logger.info(f"Feature cache update completed for {report['rows']} enrollments")
+            return report
             
         except Exception as e:
             logger.error(f"Error updating feature cache: {str(e)}")
-            db.session.rollback()
\ No newline at end of file
+            db.session.rollback()
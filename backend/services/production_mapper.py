@@ -9,6 +9,28 @@ from ..utils.config import Config
 
 logger = setup_logger(__name__)
 
+VLE_COLUMNS = ['id_student', 'id_site', 'date', 'sum_click', 'code_module', 'code_presentation']
+
+VLE_CATEGORICAL_COLUMNS = ['id_site', 'code_module', 'code_presentation']
+
+# VLE clicks credited per attendance status; other statuses are not activity
+ATTENDANCE_CLICK_MAP = {
+    'present': 30,  # Full engagement
+    'late': 15  # Partial engagement
+}
+
+# VLE clicks credited per LMS activity type; unknown types count as 1
+ACTIVITY_CLICK_MAP = {
+    'resource_view': 1,
+    'forum_post': 5,
+    'forum_reply': 3,
+    'assignment_view': 2,
+    'quiz_attempt': 10,
+    'video_watch': 1,
+    'file_download': 2,
+    'page_view': 1
+}
+
 class ProductionToOULADMapper:
     """
     Maps production database format to OULAD format.
@@ -53,31 +75,23 @@ class ProductionToOULADMapper:
            attendance_records = attendance_records.copy()
            attendance_records['attendance_id'] = range(len(attendance_records))
        
-       vle_records = []
+       # Apply mapping rules based on attendance status; absent/excused rows are dropped
+       clicks = attendance_records['status'].map(ATTENDANCE_CLICK_MAP)
+       records = attendance_records[clicks.notna()]
        
-       for _, record in attendance_records.iterrows():
-           # Calculate days from course start
-           attendance_date = pd.to_datetime(record['attendance_date'])
-           days_from_start = (attendance_date - course_start_date).days
-           
-           # Apply mapping rules based on attendance status
-           if record['status'] == 'present':
-               clicks = 30  # Full engagement
-           elif record['status'] == 'late':
-               clicks = 15  # Partial engagement
-           else:
-               continue  # Skip absent/excused
-           
-           vle_records.append({
-               'id_student': record['student_id'],
-               'id_site': f"attendance_{record['attendance_id']}",
-               'date': days_from_start,
-               'sum_click': clicks,
-               'code_module': record.get('code_module', 'NA'),
-               'code_presentation': record.get('code_presentation', 'NA')
-           })
+       # Calculate days from course start
+       days_from_start = (pd.to_datetime(records['attendance_date']) - course_start_date).dt.days
+       
+       vle_df = pd.DataFrame({
+           'id_student': records['student_id'],
+           'id_site': 'attendance_' + records['attendance_id'].astype(str),
+           'date': days_from_start,
+           'sum_click': clicks[clicks.notna()].astype(int),
+           'code_module': records['code_module'] if 'code_module' in records.columns else 'NA',
+           'code_presentation': records['code_presentation'] if 'code_presentation' in records.columns else 'NA'
+       }, columns=VLE_COLUMNS).reset_index(drop=True)
+       vle_df = self._categorize_vle(vle_df)
        
-       vle_df = pd.DataFrame(vle_records)
        logger.info(f"Mapped {len(attendance_records)} attendance records to {len(vle_df)} VLE records")
        
        return vle_df
@@ -104,52 +118,43 @@ class ProductionToOULADMapper:
            logger.info("No LMS activities to map")
            return pd.DataFrame(columns=['id_student', 'id_site', 'date', 'sum_click', 'code_module', 'code_presentation'])
        
-       # Get click mapping for different activity types
-       activity_click_map = {
-           'resource_view': 1,
-           'forum_post': 5,
-           'forum_reply': 3,
-           'assignment_view': 2,
-           'quiz_attempt': 10,
-           'video_watch': 1,
-           'file_download': 2,
-           'page_view': 1
-       }
-       
-       vle_records = []
-       
-       # Group by student, resource, and date
-       grouped = lms_activities.groupby([
-           'student_id',
-           'resource_id',
-           pd.to_datetime(lms_activities['activity_timestamp']).dt.date
-       ])
-       
-       for (student_id, resource_id, activity_date), group in grouped:
-           # Calculate days from start
-           days_from_start = (activity_date - course_start_date.date()).days
-           
-           # Sum clicks for all activities on this resource on this day
-           total_clicks = 0
-           for _, activity in group.iterrows():
-               activity_type = activity.get('activity_type', 'page_view')
-               clicks = activity_click_map.get(activity_type, 1)
-               total_clicks += clicks
-           
-           vle_records.append({
-               'id_student': student_id,
-               'id_site': resource_id,
-               'date': days_from_start,
-               'sum_click': total_clicks,
-               'code_module': group.iloc[0].get('code_module', 'NA'),
-               'code_presentation': group.iloc[0].get('code_presentation', 'NA')
-           })
+       activity_types = (
+           lms_activities['activity_type'] if 'activity_type' in lms_activities.columns
+           else pd.Series('page_view', index=lms_activities.index)
+       )
+       clicks = activity_types.map(ACTIVITY_CLICK_MAP).fillna(1).astype(int)
+       
+       # Calendar days from course start
+       activity_dates = pd.to_datetime(lms_activities['activity_timestamp']).dt.normalize()
+       days_from_start = (activity_dates - pd.Timestamp(course_start_date).normalize()).dt.days
+       
+       # Sum clicks for all activities on a resource on a day
+       activities = pd.DataFrame({
+           'id_student': lms_activities['student_id'],
+           'id_site': lms_activities['resource_id'],
+           'date': days_from_start,
+           'sum_click': clicks,
+           'code_module': lms_activities['code_module'] if 'code_module' in lms_activities.columns else 'NA',
+           'code_presentation': lms_activities['code_presentation'] if 'code_presentation' in lms_activities.columns else 'NA'
+       })
+       vle_df = activities.groupby(['id_student', 'id_site', 'date']).agg(
+           sum_click=('sum_click', 'sum'),
+           code_module=('code_module', 'first'),
+           code_presentation=('code_presentation', 'first')
+       ).reset_index()[VLE_COLUMNS]
+       vle_df = self._categorize_vle(vle_df)
        
-       vle_df = pd.DataFrame(vle_records)
        logger.info(f"Mapped {len(lms_activities)} LMS activities to {len(vle_df)} VLE records")
        
        return vle_df
    
+    @staticmethod
+    def _categorize_vle(vle_df: pd.DataFrame) -> pd.DataFrame:
+       """Store the low-cardinality VLE key columns as categoricals"""
+       for column in VLE_CATEGORICAL_COLUMNS:
+           vle_df[column] = vle_df[column].astype('category')
+       return vle_df
+   
     def map_assessments_to_oulad(
        self,
        assessment_submissions: pd.DataFrame,
@@ -300,8 +305,12 @@ class ProductionToOULADMapper:
            logger.warning("Both VLE sources are empty")
            return pd.DataFrame(columns=['id_student', 'id_site', 'date', 'sum_click', 'code_module', 'code_presentation'])
        
-       # Concatenate dataframes
-       combined = pd.concat([attendance_vle, lms_vle], ignore_index=True)
+       # Concatenate dataframes; categoricals are re-derived over both sources
+       combined = pd.concat([
+           vle.astype({column: object for column in VLE_CATEGORICAL_COLUMNS if column in vle.columns})
+           for vle in (attendance_vle, lms_vle) if not vle.empty
+       ], ignore_index=True)
+       combined = self._categorize_vle(combined)
        
        # Group by student, site, and date to combine clicks
        grouped = combined.groupby([
@@ -310,7 +319,7 @@ class ProductionToOULADMapper:
            'date',
            'code_module',
            'code_presentation'
-       ])['sum_click'].sum().reset_index()
+       ], observed=True)['sum_click'].sum().reset_index()
        
        logger.info(f"Combined VLE data: {len(combined)} -> {len(grouped)} records")
        
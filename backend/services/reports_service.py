@@ -7,6 +7,7 @@ from backend.models import (
     Prediction, Alert, Attendance, Assessment, AssessmentSubmission,
     User, LMSDailySummary
 )
+from backend.services.latest_prediction_service import LatestPredictionService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -128,14 +129,15 @@ class ReportsService:
             
             results = query.all()
             
+            latest_predictions = LatestPredictionService.get_latest_predictions(
+                enrollment.enrollment_id for _, enrollment, _, _, _ in results
+            )
+            
             students = []
             for student, enrollment, avg_score, total_classes, classes_attended in results:
                 attendance_rate = (classes_attended / total_classes * 100) if total_classes > 0 else 0
                 
-                # Get latest prediction
-                latest_prediction = Prediction.query.filter_by(
-                    enrollment_id=enrollment.enrollment_id
-                ).order_by(Prediction.prediction_date.desc()).first()
+                latest_prediction = latest_predictions.get(enrollment.enrollment_id)
                 
                 students.append({
                     'student_id': student.student_id,
@@ -5,6 +5,7 @@ from backend.models import (
 from backend.extensions import db
 from sqlalchemy import func, and_, desc 
 from datetime import datetime, timedelta
+from backend.services.latest_prediction_service import LatestPredictionService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -95,6 +96,10 @@ class StudentService:
             
             courses = query.all()
             
+            latest_predictions = LatestPredictionService.get_latest_predictions(
+                course.enrollment_id for course in courses
+            )
+            
             result = []
             for course in courses:
                 # Calculate attendance rate for this course
@@ -102,10 +107,7 @@ class StudentService:
                     course.enrollment_id
                 )
                 
-                # Get latest prediction for this enrollment
-                latest_prediction = Prediction.query.filter_by(
-                    enrollment_id=course.enrollment_id
-                ).order_by(desc(Prediction.prediction_date)).first()
+                latest_prediction = latest_predictions.get(course.enrollment_id)
                 
                 # Get next upcoming assessment
                 next_assessment = StudentService._get_next_assessment(course.offering_id)
@@ -379,11 +381,12 @@ class StudentService:
             ).count()
             
             # Count at-risk courses
+            latest_predictions = LatestPredictionService.get_latest_predictions(
+                enrollment.enrollment_id for enrollment in enrollments
+            )
             at_risk_courses = 0
             for enrollment in enrollments:
-                latest_prediction = Prediction.query.filter_by(
-                    enrollment_id=enrollment.enrollment_id
-                ).order_by(desc(Prediction.prediction_date)).first()
+                latest_prediction = latest_predictions.get(enrollment.enrollment_id)
                 
                 if latest_prediction and latest_prediction.risk_level in ['high', 'very_high']:
                     at_risk_courses += 1
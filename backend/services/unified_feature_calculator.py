@@ -3,7 +3,6 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple, Union
 import logging
-from scipy import stats
 from sklearn.preprocessing import LabelEncoder
 from ..utils.logger import setup_logger
 from ..utils.config import Config
@@ -11,6 +10,40 @@ from ..utils.constants import RANDOM_STATE
 
 logger = setup_logger(__name__)
 
+# Students are keyed on these columns, as in OULAD studentInfo
+STUDENT_KEYS = ['id_student', 'code_module', 'code_presentation']
+
+# Feature values for students with no rows of the corresponding kind
+ACTIVITY_DEFAULTS = {
+    'days_active': 0,
+    'total_clicks': 0,
+    'unique_materials': 0,
+    'activity_rate': 0.0,
+    'avg_clicks_per_active_day': 0.0,
+    'first_activity_day': 0,
+    'last_activity_day': 0
+}
+
+ASSESSMENT_DEFAULTS = {
+    'submitted_assessments': 0,
+    'submission_rate': 0,
+    'avg_score': 0.0,
+    'avg_score_cma': 0.0,
+    'avg_score_tma': 0.0,
+    'avg_score_exam': 0.0,
+    'on_time_submissions': 0,
+    'avg_days_early': 0.0,
+    'late_submission_count': 0
+}
+
+TEMPORAL_DEFAULTS = {
+    'weekly_activity_std': 0.0,
+    'activity_regularity': 0.0,
+    'longest_inactivity_gap': 0,
+    'weekend_activity_ratio': 0.0,
+    'activity_trend': 0.0
+}
+
 class UnifiedFeatureCalculator:
     """
     Unified feature calculator that works with both OULAD and production data.
@@ -68,72 +101,33 @@ class UnifiedFeatureCalculator:
             logger.warning("No student data found")
             return pd.DataFrame()
         
-        all_features = []
-        
-        for _, student in students.iterrows():
-            student_id = student['id_student']
-            module = student.get('code_module', 'NA')
-            presentation = student.get('code_presentation', 'NA')
-            
-            # Filter data for this student - handle empty DataFrames
-            if not student_vle.empty and all(col in student_vle.columns for col in ['id_student', 'code_module', 'code_presentation']):
-                student_vle_data = student_vle[
-                    (student_vle['id_student'] == student_id) &
-                    (student_vle['code_module'] == module) &
-                    (student_vle['code_presentation'] == presentation)
-                ]
-            else:
-                student_vle_data = pd.DataFrame(columns=['id_site', 'date', 'sum_click'])
-            
-            if not student_assessment.empty and 'id_student' in student_assessment.columns:
-                student_assess_data = student_assessment[
-                    student_assessment['id_student'] == student_id
-                ]
-            else:
-                student_assess_data = pd.DataFrame(columns=['id_assessment', 'score'])
-            
-            # Calculate features
-            features = {'id_student': student_id}
-            
-            # Activity features
-            activity_features = self._calculate_activity_features(
-                student_vle_data,
-                course_length,
-                calculation_point
-            )
-            features.update(activity_features)
-            
-            # Assessment features
-            assessment_features = self._calculate_assessment_features(
-                student_assess_data,
-                assessments,
-                calculation_point
-            )
-            features.update(assessment_features)
-            
-            # Temporal features
-            temporal_features = self._calculate_temporal_features(
-                student_vle_data,
-                calculation_point
+        students = students.reset_index(drop=True)
+        student_keys = pd.MultiIndex.from_frame(students[STUDENT_KEYS])
+        student_ids = pd.Index(students['id_student'])
+        
+        vle = self._prepare_vle(student_vle, calculation_point)
+        
+        # One grouped aggregation per feature family, aligned back onto the
+        # student list; students without rows get the family's defaults
+        features_df = pd.concat([
+            students[['id_student']],
+            self._align(
+                self._calculate_activity_features(vle, course_length, calculation_point),
+                student_keys, ACTIVITY_DEFAULTS
+            ),
+            self._align(
+                self._calculate_assessment_features(student_assessment, assessments, calculation_point),
+                student_ids, ASSESSMENT_DEFAULTS
+            ),
+            self._align(
+                self._calculate_temporal_features(vle),
+                student_keys, TEMPORAL_DEFAULTS
+            ),
+            self._align(
+                self._calculate_demographic_features(student_info),
+                student_ids, self._get_default_demographic_features()
             )
-            features.update(temporal_features)
-            
-            # Demographic features - with defaults for missing data
-            if not student_info.empty and student_id in student_info['id_student'].values:
-                student_rows = student_info[student_info['id_student'] == student_id]
-                if not student_rows.empty:
-                    student_row = student_rows.iloc[0]
-                    demographic_features = self._calculate_demographic_features(student_row)
-                    features.update(demographic_features)
-                else:
-                    features.update(self._get_default_demographic_features())
-            else:
-                features.update(self._get_default_demographic_features())
-            
-            all_features.append(features)
-        
-        # Create dataframe
-        features_df = pd.DataFrame(all_features)
+        ], axis=1).infer_objects()
         
         # Ensure all features are present
         for feature in self.feature_order:
@@ -154,35 +148,59 @@ class UnifiedFeatureCalculator:
             'has_disability': 0
         }
     
+    @staticmethod
+    def _align(
+        features: pd.DataFrame,
+        index: pd.Index,
+        defaults: Dict[str, Union[int, float]]
+    ) -> pd.DataFrame:
+        """Reindex grouped features onto the student list, filling defaults for absent groups"""
+        aligned = features.reindex(columns=list(defaults)).reindex(index)
+        missing = ~index.isin(features.index)
+        if missing.any():
+            aligned.loc[missing, list(defaults)] = list(defaults.values())
+        return aligned.reset_index(drop=True)
+    
+    @staticmethod
+    def _empty_features(columns: List[str], keys: List[str]) -> pd.DataFrame:
+        """Empty grouped-feature frame, so every student falls back to defaults"""
+        index = pd.MultiIndex.from_arrays([[] for _ in keys], names=keys) if len(keys) > 1 else pd.Index([], name=keys[0])
+        return pd.DataFrame(columns=columns, index=index, dtype=float)
+    
+    def _prepare_vle(
+        self,
+        student_vle: pd.DataFrame,
+        calculation_point: Optional[int] = None
+    ) -> pd.DataFrame:
+        """VLE rows usable for activity features, cut off at the calculation point"""
+        if student_vle.empty or not all(col in student_vle.columns for col in STUDENT_KEYS + ['date']):
+            return pd.DataFrame(columns=STUDENT_KEYS + ['id_site', 'date', 'sum_click'])
+        
+        if calculation_point is not None:
+            student_vle = student_vle[student_vle['date'] <= calculation_point]
+        
+        return student_vle
+    
     def _calculate_activity_features(
         self,
         vle_data: pd.DataFrame,
         course_length: Optional[int] = None,
         calculation_point: Optional[int] = None
-    ) -> Dict[str, float]:
-        """Calculate activity-based features"""
-        features = {}
-        
-        # Filter data up to calculation point if specified
-        if calculation_point is not None and not vle_data.empty and 'date' in vle_data.columns:
-            vle_data = vle_data[vle_data['date'] <= calculation_point]
-        
-        if vle_data.empty or 'date' not in vle_data.columns:
-            # Return zeros for all activity features
-            return {
-                'days_active': 0,
-                'total_clicks': 0,
-                'unique_materials': 0,
-                'activity_rate': 0.0,
-                'avg_clicks_per_active_day': 0.0,
-                'first_activity_day': 0,
-                'last_activity_day': 0
-            }
-        
-        # Basic activity metrics
-        features['days_active'] = vle_data['date'].nunique()
-        features['total_clicks'] = vle_data['sum_click'].sum() if 'sum_click' in vle_data.columns else 0
-        features['unique_materials'] = vle_data['id_site'].nunique() if 'id_site' in vle_data.columns else 0
+    ) -> pd.DataFrame:
+        """Calculate activity-based features for every student, indexed by STUDENT_KEYS"""
+        if vle_data.empty:
+            return self._empty_features(list(ACTIVITY_DEFAULTS), STUDENT_KEYS)
+        
+        grouped = vle_data.groupby(STUDENT_KEYS, sort=False, observed=True)
+        dates = grouped['date']
+        
+        features = pd.DataFrame({
+            'days_active': dates.nunique(),
+            'total_clicks': grouped['sum_click'].sum() if 'sum_click' in vle_data.columns else 0,
+            'unique_materials': grouped['id_site'].nunique() if 'id_site' in vle_data.columns else 0,
+            'first_activity_day': dates.min(),
+            'last_activity_day': dates.max()
+        })
         
         # Calculate activity rate
         if calculation_point is not None:
@@ -190,52 +208,46 @@ class UnifiedFeatureCalculator:
         elif course_length is not None:
             days_elapsed = course_length
         else:
-            days_elapsed = max(vle_data['date'].max() - vle_data['date'].min() + 1, 1)
+            days_elapsed = (features['last_activity_day'] - features['first_activity_day'] + 1).clip(lower=1)
         
         features['activity_rate'] = (features['days_active'] / days_elapsed) * 100
         
         # Average clicks per active day
         features['avg_clicks_per_active_day'] = (
             features['total_clicks'] / features['days_active']
-            if features['days_active'] > 0 else 0
-        )
-        
-        # First and last activity
-        features['first_activity_day'] = vle_data['date'].min() if not vle_data.empty else 0
-        features['last_activity_day'] = vle_data['date'].max() if not vle_data.empty else 0
+        ).where(features['days_active'] > 0, 0)
         
-        return features
+        return features[list(ACTIVITY_DEFAULTS)]
     
     def _calculate_assessment_features(
         self,
         assessment_data: pd.DataFrame,
         assessments_meta: pd.DataFrame,
         calculation_point: Optional[int] = None
-    ) -> Dict[str, float]:
-        """Calculate assessment-based features"""
-        features = {}
-        
+    ) -> pd.DataFrame:
+        """Calculate assessment-based features for every student, indexed by id_student"""
         # Filter assessments up to calculation point
         if calculation_point is not None and not assessments_meta.empty and 'date' in assessments_meta.columns:
             valid_assessments = assessments_meta[
                 assessments_meta['date'] <= calculation_point
-            ]['id_assessment'].tolist()
+            ]['id_assessment']
             
             if not assessment_data.empty and 'id_assessment' in assessment_data.columns:
                 assessment_data = assessment_data[
                     assessment_data['id_assessment'].isin(valid_assessments)
                 ]
         
-        # Basic counts
-        features['submitted_assessments'] = len(assessment_data) if not assessment_data.empty else 0
+        if assessment_data.empty or 'id_student' not in assessment_data.columns:
+            return self._empty_features(list(ASSESSMENT_DEFAULTS), ['id_student'])
+        
+        grouped = assessment_data.groupby('id_student', sort=False)
+        features = pd.DataFrame({'submitted_assessments': grouped.size()})
         
         # Submission rate
         if not assessments_meta.empty:
             total_assessments = len(assessments_meta)
             if calculation_point is not None and 'date' in assessments_meta.columns:
-                total_assessments = len(
-                    assessments_meta[assessments_meta['date'] <= calculation_point]
-                )
+                total_assessments = int((assessments_meta['date'] <= calculation_point).sum())
             features['submission_rate'] = (
                 features['submitted_assessments'] / total_assessments * 100
                 if total_assessments > 0 else 0
@@ -243,21 +255,14 @@ class UnifiedFeatureCalculator:
         else:
             features['submission_rate'] = 0
         
-        if assessment_data.empty or 'score' not in assessment_data.columns:
-            # Return zeros for score features
-            return {
-                **features,
-                'avg_score': 0.0,
-                'avg_score_cma': 0.0,
-                'avg_score_tma': 0.0,
-                'avg_score_exam': 0.0,
-                'on_time_submissions': 0,
-                'avg_days_early': 0.0,
-                'late_submission_count': 0
-            }
+        for column in list(ASSESSMENT_DEFAULTS)[2:]:
+            features[column] = 0
+        
+        if 'score' not in assessment_data.columns:
+            return features[list(ASSESSMENT_DEFAULTS)]
         
         # Average scores
-        features['avg_score'] = assessment_data['score'].mean()
+        features['avg_score'] = grouped['score'].mean()
         
         # Scores by assessment type
         if not assessments_meta.empty and 'assessment_type' in assessments_meta.columns:
@@ -267,20 +272,13 @@ class UnifiedFeatureCalculator:
                 how='left'
             )
             
-            for assess_type in ['CMA', 'TMA', 'Exam']:
-                if 'assessment_type' in merged.columns:
-                    type_scores = merged[
-                        merged['assessment_type'] == assess_type
-                    ]['score']
+            if 'assessment_type' in merged.columns:
+                for assess_type in ['CMA', 'TMA', 'Exam']:
+                    type_rows = merged[merged['assessment_type'] == assess_type].groupby('id_student')['score']
+                    has_rows = type_rows.size().reindex(features.index, fill_value=0) > 0
                     features[f'avg_score_{assess_type.lower()}'] = (
-                        type_scores.mean() if len(type_scores) > 0 else 0
+                        type_rows.mean().reindex(features.index).where(has_rows, 0)
                     )
-                else:
-                    features[f'avg_score_{assess_type.lower()}'] = 0
-        else:
-            features['avg_score_cma'] = 0
-            features['avg_score_tma'] = 0
-            features['avg_score_exam'] = 0
         
         # Submission timing
         if (not assessments_meta.empty and 'date_submitted' in assessment_data.columns 
@@ -292,108 +290,72 @@ class UnifiedFeatureCalculator:
             )
             
             if 'date' in merged.columns and 'date_submitted' in merged.columns:
-                merged['days_early'] = merged['date'] - merged['date_submitted']
+                days_early = merged['date'] - merged['date_submitted']
+                by_student = merged['id_student']
                 
-                features['on_time_submissions'] = len(merged[merged['days_early'] >= 0])
-                features['avg_days_early'] = merged['days_early'].mean() if len(merged) > 0 else 0
-                features['late_submission_count'] = len(merged[merged['days_early'] < 0])
-            else:
-                features['on_time_submissions'] = 0
-                features['avg_days_early'] = 0
-                features['late_submission_count'] = 0
-        else:
-            features['on_time_submissions'] = 0
-            features['avg_days_early'] = 0
-            features['late_submission_count'] = 0
+                features['on_time_submissions'] = (days_early >= 0).groupby(by_student).sum()
+                features['avg_days_early'] = days_early.groupby(by_student).mean()
+                features['late_submission_count'] = (days_early < 0).groupby(by_student).sum()
         
-        return features
+        return features[list(ASSESSMENT_DEFAULTS)]
     
-    def _calculate_temporal_features(
-        self,
-        vle_data: pd.DataFrame,
-        calculation_point: Optional[int] = None
-    ) -> Dict[str, float]:
-        """Calculate temporal pattern features"""
-        features = {}
-        
-        if vle_data.empty or 'date' not in vle_data.columns:
-            return {
-                'weekly_activity_std': 0.0,
-                'activity_regularity': 0.0,
-                'longest_inactivity_gap': 0,
-                'weekend_activity_ratio': 0.0,
-                'activity_trend': 0.0
-            }
-        
-        # Filter data
-        if calculation_point is not None:
-            vle_data = vle_data[vle_data['date'] <= calculation_point]
-        
+    def _calculate_temporal_features(self, vle_data: pd.DataFrame) -> pd.DataFrame:
+        """Calculate temporal pattern features for every student, indexed by STUDENT_KEYS"""
         if vle_data.empty:
-            return {
-                'weekly_activity_std': 0.0,
-                'activity_regularity': 0.0,
-                'longest_inactivity_gap': 0,
-                'weekend_activity_ratio': 0.0,
-                'activity_trend': 0.0
-            }
-        
-        # Weekly activity standard deviation
-        vle_data = vle_data.copy()  # Avoid SettingWithCopyWarning
-        vle_data['week'] = vle_data['date'] // 7
-        
-        if 'sum_click' in vle_data.columns:
-            weekly_clicks = vle_data.groupby('week')['sum_click'].sum()
-        else:
-            weekly_clicks = vle_data.groupby('week').size()
-            
-        features['weekly_activity_std'] = weekly_clicks.std() if len(weekly_clicks) > 1 else 0
+            return self._empty_features(list(TEMPORAL_DEFAULTS), STUDENT_KEYS)
         
-        # Activity regularity (inverse of coefficient of variation)
-        if weekly_clicks.mean() > 0 and len(weekly_clicks) > 1:
-            cv = weekly_clicks.std() / weekly_clicks.mean()
-            features['activity_regularity'] = 1 / (1 + cv)
-        else:
-            features['activity_regularity'] = 0
+        has_clicks = 'sum_click' in vle_data.columns
+        clicks = vle_data['sum_click'] if has_clicks else pd.Series(1, index=vle_data.index)
+        keys = [vle_data[key] for key in STUDENT_KEYS]
         
-        # Longest inactivity gap
-        if len(vle_data) > 1:
-            sorted_dates = sorted(vle_data['date'].unique())
-            gaps = [sorted_dates[i+1] - sorted_dates[i] for i in range(len(sorted_dates)-1)]
-            features['longest_inactivity_gap'] = max(gaps) if gaps else 0
-        else:
-            features['longest_inactivity_gap'] = 0
+        # Weekly clicks per student, weeks in ascending order
+        weekly_clicks = clicks.groupby(keys + [vle_data['date'] // 7], observed=True).sum()
+        weeks = weekly_clicks.groupby(level=STUDENT_KEYS, observed=True)
+        n_weeks = weeks.size()
+        weekly_mean = weeks.mean()
+        weekly_std = weeks.std()
         
-        # Weekend activity ratio (assuming course starts on Monday)
-        vle_data['day_of_week'] = vle_data['date'] % 7
+        features = pd.DataFrame(index=n_weeks.index)
+        features['weekly_activity_std'] = weekly_std.where(n_weeks > 1, 0)
         
-        if 'sum_click' in vle_data.columns:
-            weekend_clicks = vle_data[vle_data['day_of_week'].isin([5, 6])]['sum_click'].sum()
-            total_clicks = vle_data['sum_click'].sum()
-        else:
-            weekend_clicks = len(vle_data[vle_data['day_of_week'].isin([5, 6])])
-            total_clicks = len(vle_data)
-            
-        features['weekend_activity_ratio'] = (
-            weekend_clicks / total_clicks if total_clicks > 0 else 0
+        # Activity regularity (inverse of coefficient of variation)
+        features['activity_regularity'] = (1 / (1 + weekly_std / weekly_mean)).where(
+            (weekly_mean > 0) & (n_weeks > 1), 0
         )
         
-        # Activity trend (linear regression slope)
-        if len(weekly_clicks) > 2:
-            weeks = np.arange(len(weekly_clicks))
-            slope, _, _, _, _ = stats.linregress(weeks, weekly_clicks.values)
-            features['activity_trend'] = slope
-        else:
-            features['activity_trend'] = 0
+        # Longest inactivity gap between distinct active days
+        active_days = vle_data[STUDENT_KEYS + ['date']].drop_duplicates().sort_values(STUDENT_KEYS + ['date'])
+        gaps = active_days['date'].diff().where(
+            active_days[STUDENT_KEYS].eq(active_days[STUDENT_KEYS].shift()).all(axis=1)
+        )
+        longest_gap = gaps.groupby([active_days[key] for key in STUDENT_KEYS], observed=True).max()
+        row_counts = vle_data.groupby(STUDENT_KEYS, observed=True).size()
+        features['longest_inactivity_gap'] = longest_gap.where(row_counts > 1, 0).fillna(0)
         
-        return features
+        # Weekend activity ratio (assuming course starts on Monday)
+        weekend_clicks = clicks.where((vle_data['date'] % 7).isin([5, 6]), 0).groupby(keys, observed=True).sum()
+        total_clicks = clicks.groupby(keys, observed=True).sum()
+        features['weekend_activity_ratio'] = (weekend_clicks / total_clicks).where(total_clicks > 0, 0)
+        
+        # Activity trend: least-squares slope of weekly clicks over week position
+        position = weeks.cumcount().to_numpy()
+        centred = position - (n_weeks.reindex(weekly_clicks.index.droplevel(-1)).to_numpy() - 1) / 2
+        numerator = pd.Series(centred * weekly_clicks.to_numpy(), index=weekly_clicks.index).groupby(
+            level=STUDENT_KEYS, observed=True
+        ).sum()
+        denominator = n_weeks * (n_weeks ** 2 - 1) / 12
+        features['activity_trend'] = (numerator / denominator).where(n_weeks > 2, 0)
+        
+        return features[list(TEMPORAL_DEFAULTS)]
     
-    def _calculate_demographic_features(
-        self,
-        student_row: pd.Series
-    ) -> Dict[str, Union[int, float]]:
-        """Calculate demographic features"""
-        features = {}
+    def _calculate_demographic_features(self, student_info: pd.DataFrame) -> pd.DataFrame:
+        """Calculate demographic features for every student, indexed by id_student"""
+        defaults = self._get_default_demographic_features()
+        if student_info.empty or 'id_student' not in student_info.columns:
+            return self._empty_features(list(defaults), ['id_student'])
+        
+        info = student_info.drop_duplicates('id_student').set_index('id_student')
+        features = pd.DataFrame(index=info.index)
         
         # Age band encoding
         age_band_map = {
@@ -401,9 +363,9 @@ class UnifiedFeatureCalculator:
             '35-55': 1,
             '55+': 2
         }
-        features['age_band_encoded'] = age_band_map.get(
-            student_row.get('age_band', '0-35'),
-            0
+        features['age_band_encoded'] = (
+            info['age_band'].map(age_band_map).fillna(0).astype(int)
+            if 'age_band' in info.columns else 0
         )
         
         # Education level encoding
@@ -414,23 +376,25 @@ class UnifiedFeatureCalculator:
             'HE Qualification': 3,
             'Post Graduate Qualification': 4
         }
-        features['highest_education_encoded'] = education_map.get(
-            student_row.get('highest_education', 'A Level or Equivalent'),
-            2
+        features['highest_education_encoded'] = (
+            info['highest_education'].map(education_map).fillna(2).astype(int)
+            if 'highest_education' in info.columns else 2
         )
         
         # Direct features
-        features['num_of_prev_attempts'] = int(
-            student_row.get('num_of_prev_attempts', 0)
+        features['num_of_prev_attempts'] = (
+            info['num_of_prev_attempts'].astype(int) if 'num_of_prev_attempts' in info.columns else 0
         )
-        features['studied_credits'] = int(
-            student_row.get('studied_credits', 60)
+        features['studied_credits'] = (
+            info['studied_credits'].astype(int) if 'studied_credits' in info.columns else 60
         )
         
         # Disability flag
-        features['has_disability'] = 1 if student_row.get('disability', 'N') == 'Y' else 0
+        features['has_disability'] = (
+            (info['disability'] == 'Y').astype(int) if 'disability' in info.columns else 0
+        )
         
-        return features
+        return features[list(defaults)]
     
     def get_feature_vector(
         self,
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+from flask import current_app
+from sqlalchemy import func
+from backend.extensions import db
+from backend.models import Enrollment
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of pool workers, set up by _init_worker
+_worker_app = None
+_worker_services = {}
+
+
+def _init_worker(config_name):
+    """Build this worker process's own app, engine and connection pool"""
+    global _worker_app
+    from backend.app import create_app
+    _worker_app = create_app(config_name)
+
+
+def _prediction_service():
+    """One PredictionService per process, so the model is loaded once"""
+    service = _worker_services.get('prediction')
+    if service is None:
+        from backend.services.prediction_service import PredictionService
+        service = _worker_services['prediction'] = PredictionService()
+    return service
+
+
+def cache_offering_features(offering_id: int) -> int:
+    """Partition job: refresh today's feature cache for an offering's enrolled students"""
+    service = _prediction_service()
+    watermarks = service._data_watermarks(Enrollment.offering_id == offering_id)
+    enrollment_ids, feature_matrix = service.bulk_feature_calculator.calculate_features_for_offering(
+        offering_id
+    )
+    if enrollment_ids:
+        service._cache_features_bulk(enrollment_ids, feature_matrix, watermarks)
+        db.session.commit()
+    return len(enrollment_ids)
+
+
+def predict_offering(offering_id: int) -> int:
+    """Partition job: score and save predictions for an offering's enrolled students"""
+    return len(_prediction_service().batch_generate_predictions(offering_id))
+
+
+def _run_partition(job: Callable[[int], int], offering_id: int):
+    """Run a job for one offering; returns (rows, seconds)"""
+    if _worker_app is None:
+        return _timed(job, offering_id)
+    
+    with _worker_app.app_context():
+        return _timed(job, offering_id)
+
+
+def _timed(job: Callable[[int], int], offering_id: int):
+    """Run a job, rolling its session back if it fails"""
+    started = time.monotonic()
+    try:
+        rows = job(offering_id)
+    except Exception:
+        db.session.rollback()
+        raise
+    return rows or 0, time.monotonic() - started
+
+
+class PartitionedJobRunner:
+    """
+    Run a per-offering job over every offering with enrolled students
+    
+    Partitions are fanned out to a process pool, largest offering first.
+    Each worker process creates its own app, so it has its own app context,
+    engine and session. Failed partitions are retried; the ones that still
+    fail are reported without stopping the rest.
+    """
+    
+    def __init__(self, job: Callable[[int], int], name: Optional[str] = None,
+                 workers: Optional[int] = None, retries: Optional[int] = None):
+        """
+        Args:
+            job: Module-level function taking an offering_id and returning rows processed
+            name: Label for logs (default the job's name)
+            workers: Worker processes (default JOB_RUNNER_WORKERS, else one per core)
+            retries: Extra attempts per failed partition (default JOB_RUNNER_RETRIES)
+        """
+        self.job = job
+        self.name = name or job.__name__
+        self.workers = workers or current_app.config.get('JOB_RUNNER_WORKERS') or os.cpu_count() or 1
+        self.retries = retries if retries is not None else current_app.config.get('JOB_RUNNER_RETRIES', 2)
+    
+    @staticmethod
+    def offering_partitions() -> List[int]:
+        """Offerings with enrolled students, largest first so big partitions start early"""
+        enrolled = func.count(Enrollment.enrollment_id)
+        rows = db.session.query(
+            Enrollment.offering_id
+        ).filter(
+            Enrollment.enrollment_status == 'enrolled'
+        ).group_by(Enrollment.offering_id).order_by(enrolled.desc()).all()
+        return [row.offering_id for row in rows]
+    
+    def run(self, offering_ids: Optional[Iterable[int]] = None) -> Dict:
+        """
+        Run the job over the given offerings, or every offering with enrolled students
+        
+        Returns:
+            Dict with partition counts, rows, retries, throughput and a
+            per-offering error map for partitions that failed every attempt
+        """
+        partitions = list(offering_ids) if offering_ids is not None else self.offering_partitions()
+        workers = min(self.workers, len(partitions)) if partitions else 0
+        
+        logger.info(f"[{self.name}] Running {len(partitions)} partitions on {max(workers, 1)} workers")
+        
+        report = {
+            'job': self.name,
+            'partitions': len(partitions),
+            'succeeded': 0,
+            'failed': {},
+            'rows': 0,
+            'retries': 0
+        }
+        started = time.monotonic()
+        
+        if workers <= 1:
+            self._run_serial(partitions, report)
+        else:
+            self._run_pool(partitions, workers, report)
+        
+        elapsed = time.monotonic() - started
+        report['seconds'] = round(elapsed, 2)
+        report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+        
+        if report['failed']:
+            logger.error(f"[{self.name}] {len(report['failed'])} partitions failed: {report['failed']}")
+        logger.info(
+            f"[{self.name}] {report['succeeded']}/{report['partitions']} partitions, "
+            f"{report['rows']} rows in {report['seconds']}s ({report['rows_per_second']} rows/sec)"
+        )
+        return report
+    
+    def _run_serial(self, partitions: List[int], report: Dict):
+        """Run partitions one by one in this process and app context"""
+        for offering_id in partitions:
+            for attempt in range(self.retries + 1):
+                try:
+                    rows, seconds = _run_partition(self.job, offering_id)
+                except Exception as e:
+                    if attempt < self.retries:
+                        report['retries'] += 1
+                        continue
+                    self._record_failure(report, offering_id, e)
+                else:
+                    self._record_success(report, offering_id, rows, seconds)
+                break
+    
+    def _run_pool(self, partitions: List[int], workers: int, report: Dict):
+        """Run partitions on a process pool, resubmitting failures"""
+        config_name = current_app.config.get('CONFIG_NAME')
+        context = multiprocessing.get_context('spawn')
+        attempts = {}
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(config_name,)) as executor:
+            pending = {}
+            for offering_id in partitions:
+                attempts[offering_id] = 1
+                pending[executor.submit(_run_partition, self.job, offering_id)] = offering_id
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    offering_id = pending.pop(future)
+                    try:
+                        rows, seconds = future.result()
+                    except Exception as e:
+                        if attempts[offering_id] <= self.retries:
+                            attempts[offering_id] += 1
+                            report['retries'] += 1
+                            logger.warning(f"[{self.name}] Retrying offering {offering_id}: {str(e)}")
+                            pending[executor.submit(_run_partition, self.job, offering_id)] = offering_id
+                        else:
+                            self._record_failure(report, offering_id, e)
+                    else:
+                        self._record_success(report, offering_id, rows, seconds)
+    
+    def _record_success(self, report: Dict, offering_id: int, rows: int, seconds: float):
+        """Count a finished partition and log progress"""
+        report['succeeded'] += 1
+        report['rows'] += rows
+        finished = report['succeeded'] + len(report['failed'])
+        logger.info(
+            f"[{self.name}] {finished}/{report['partitions']} offering {offering_id}: "
+            f"{rows} rows in {seconds:.1f}s"
+        )
+    
+    def _record_failure(self, report: Dict, offering_id: int, error: Exception):
+        """Record a partition that failed every attempt"""
+        report['failed'][offering_id] = str(error)
+        logger.error(f"[{self.name}] Offering {offering_id} failed: {str(error)}")
@@ -1,7 +1,10 @@
 from datetime import datetime, timedelta
+from backend.extensions import db
 from backend.services.lms_summary_service import LMSSummaryService
 from backend.services.prediction_service import PredictionService
 from backend.services.alert_service import AlertService
+from backend.services.engagement_stats_service import EngagementStatsService
+from backend.services.activity_accumulator_service import ActivityAccumulatorService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,12 +24,20 @@ def run_daily_tasks():
         # 2. Update feature cache for all students
         PredictionService.update_feature_cache_for_all_students()
         
-        # 3. Check and create alerts for all students
+        # 3. Refresh per-offering engagement baselines used by the alert sweep;
+        # on failure the sweep still runs against the previous baselines
+        try:
+            EngagementStatsService.refresh()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error refreshing engagement statistics: {str(e)}")
+        
+        # 4. Check and create alerts for all students
         alert_service = AlertService()
         alert_service.check_and_create_alerts()
         logger.info("Alert checking completed")
         
-        # 4. Generate predictions for at-risk detection (optional)
+        # 5. Generate predictions for at-risk detection (optional)
         # generate_weekly_predictions()
         
         logger.info("Daily tasks completed successfully")
@@ -42,6 +53,9 @@ def run_hourly_tasks():
     logger.info("Starting hourly tasks...")
     
     try:
+        # Rebuild activity accumulators that missed writes made outside the ORM
+        ActivityAccumulatorService.reconcile()
+        
         # Check alerts for critical conditions
         alert_service = AlertService()
         alert_service.check_and_create_alerts()
@@ -51,27 +65,16 @@ def run_hourly_tasks():
     except Exception as e:
         logger.error(f"Error in hourly tasks: {str(e)}")
 
-def generate_weekly_predictions():
+def generate_weekly_predictions(workers=None):
     """
     Generate predictions for all active students
     Run this weekly
-    """
-    from backend.models import Enrollment
-    
-    active_enrollments = Enrollment.query.filter(
-        Enrollment.enrollment_status == 'enrolled'
-    ).all()
     
-    prediction_service = PredictionService()
+    Each offering is scored in one batch on a process pool.
+    """
+    from backend.tasks.job_runner import PartitionedJobRunner, predict_offering
     
-    for enrollment in active_enrollments:
-        try:
-            prediction_service.generate_prediction(
-                enrollment.enrollment_id,
-                save=True
-            )
-        except Exception as e:
-            logger.error(f"Error generating prediction for {enrollment.enrollment_id}: {str(e)}")
+    return PartitionedJobRunner(predict_offering, workers=workers).run()
 
 def send_weekly_summaries():
     """
@@ -104,7 +107,7 @@ def send_weekly_summaries():
             )
         
         logger.info("Weekly summaries sent successfully")
-        
+    
     except Exception as e:
         logger.error(f"Error sending weekly summaries: {str(e)}")
 
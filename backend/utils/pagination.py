@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+from backend.utils.cache import TTLCache
+
+# (name, filters) -> {'name', 'total'}; per process, stale by up to COUNT_CACHE_TTL
+# seconds unless the listing's writers call invalidate_count
+COUNT_CACHE_TTL = 300
+_count_cache = TTLCache(maxsize=512, ttl=COUNT_CACHE_TTL)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values):
+    """Encode the sort key values of a page's last row as an opaque cursor"""
+    payload = [
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return [
+            datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_paginate(query, keys, key_values, limit, cursor=None, offset=0):
+    """
+    Fetch one page of a query ordered newest first by a unique key
+    
+    The page starts right after the cursor's row through a WHERE on the key
+    columns instead of an OFFSET, so page 1000 costs the same as page 1.
+    
+    Args:
+        query: Query to page through, without ORDER BY
+        keys: Key columns, most significant first; the last must be unique
+        key_values: Function returning a row's values for keys
+        limit: Page size
+        cursor: Cursor returned with the previous page, or None for the first
+        offset: Rows to skip when no cursor is given (legacy page numbers)
+    
+    Returns:
+        Tuple of (rows, next_cursor); next_cursor is None on the last page
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise InvalidCursor(f"Invalid cursor: {cursor}")
+        query = query.filter(_before(keys, values))
+    
+    query = query.order_by(*[key.desc() for key in keys])
+    if offset and not cursor:
+        query = query.offset(offset)
+    
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    return rows, encode_cursor(key_values(rows[-1]))
+
+
+def cached_count(name, filters, query):
+    """
+    Approximate row count for a filtered listing
+    
+    Counts are cached per listing and filter set for COUNT_CACHE_TTL seconds,
+    so paging does not re-run the COUNT on every request. The cache is per
+    process, so other workers may report an older total until it expires.
+    """
+    cache_key = (name, tuple(sorted((filters or {}).items())))
+    entry = _count_cache.get(cache_key)
+    if entry is None:
+        entry = {'name': name, 'total': query.order_by(None).count()}
+        _count_cache.set(cache_key, entry)
+    return entry['total']
+
+
+def invalidate_count(name):
+    """Forget this process's cached counts for a listing (e.g. after rows are added)"""
+    _count_cache.pop_where(lambda entry: entry['name'] == name)
+
+
+def _before(keys, values):
+    """(k1, k2, ...) < (v1, v2, ...) as index-friendly OR of ANDs"""
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        equal = [keys[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, key < value))
+    return or_(*clauses)
+
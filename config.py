@@ -54,6 +54,21 @@ class Config:
     
     # CORS
     CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:5000']
+    
+    # Activity tracking (write-behind buffer for tracked LMS activities)
+    ACTIVITY_TRACKER_ASYNC = os.environ.get('ACTIVITY_TRACKER_ASYNC', 'true').lower() == 'true'
+    ACTIVITY_BUFFER_MAX_SIZE = int(os.environ.get('ACTIVITY_BUFFER_MAX_SIZE', 10000))
+    ACTIVITY_BUFFER_BATCH_SIZE = int(os.environ.get('ACTIVITY_BUFFER_BATCH_SIZE', 500))
+    ACTIVITY_BUFFER_FLUSH_INTERVAL_MS = int(os.environ.get('ACTIVITY_BUFFER_FLUSH_INTERVAL_MS', 1000))
+    ACTIVITY_BUFFER_MAX_RETRIES = int(os.environ.get('ACTIVITY_BUFFER_MAX_RETRIES', 3))
+    ACTIVITY_SESSION_CACHE_TTL = int(os.environ.get('ACTIVITY_SESSION_CACHE_TTL', 300))  # seconds
+    
+    # Auth identity cache (user_id -> user_type/is_active/profile ids)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))  # seconds
+    
+    # Partitioned nightly jobs (0 workers = one per CPU core)
+    JOB_RUNNER_WORKERS = int(os.environ.get('JOB_RUNNER_WORKERS', 0))
+    JOB_RUNNER_RETRIES = int(os.environ.get('JOB_RUNNER_RETRIES', 2))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -79,6 +94,9 @@ class TestingConfig(Config):
     
     # No email in testing
     MAIL_SUPPRESS_SEND = True
+    
+    # Write tracked activities synchronously in tests
+    ACTIVITY_TRACKER_ASYNC = False
 
 class ProductionConfig(Config):
     """Production configuration"""
@@ -0,0 +1,30 @@
+"""prediction feature hash for the prediction memo
+
+Revision ID: a7e1c4f2b9d5
+Revises: f4d9b3e7a1c8
+Create Date: 2026-10-18 10:52:13.370482
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e1c4f2b9d5'
+down_revision = 'f4d9b3e7a1c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Predictions made before this have no hash and are never reused
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('predictions')}
+    if 'feature_hash' in columns:
+        return
+    with op.batch_alter_table('predictions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('feature_hash', sa.String(length=40), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('predictions', schema=None) as batch_op:
+        batch_op.drop_column('feature_hash')
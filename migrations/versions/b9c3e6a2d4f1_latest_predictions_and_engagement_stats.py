@@ -0,0 +1,69 @@
+"""latest prediction pointers and offering engagement statistics
+
+Revision ID: b9c3e6a2d4f1
+Revises: a7e1c4f2b9d5
+Create Date: 2026-10-18 14:20:46.815309
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9c3e6a2d4f1'
+down_revision = 'a7e1c4f2b9d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('latest_predictions'):
+        op.create_table('latest_predictions',
+        sa.Column('enrollment_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('prediction_id', sa.Integer(), nullable=False),
+        sa.Column('prediction_date', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['enrollment_id'], ['enrollments.enrollment_id'], ),
+        sa.PrimaryKeyConstraint('enrollment_id')
+        )
+        with op.batch_alter_table('latest_predictions', schema=None) as batch_op:
+            batch_op.create_index('idx_prediction', ['prediction_id'], unique=False)
+
+        # Point every enrollment at its newest existing prediction; ties on
+        # prediction_date go to the highest id, as in LatestPrediction.latest_select
+        op.execute("""
+            INSERT INTO latest_predictions (enrollment_id, prediction_id, prediction_date)
+            SELECT p.enrollment_id, MAX(p.prediction_id), MAX(p.prediction_date)
+            FROM predictions p
+            JOIN (
+                SELECT enrollment_id, MAX(prediction_date) AS max_date
+                FROM predictions
+                GROUP BY enrollment_id
+            ) latest ON latest.enrollment_id = p.enrollment_id
+                AND latest.max_date = p.prediction_date
+            GROUP BY p.enrollment_id
+        """)
+
+    if not inspector.has_table('offering_engagement_stats'):
+        op.create_table('offering_engagement_stats',
+        sa.Column('stats_id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('offering_id', sa.Integer(), nullable=False),
+        sa.Column('stats_date', sa.Date(), nullable=False),
+        sa.Column('window_days', sa.Integer(), server_default='7', nullable=False),
+        sa.Column('enrollment_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('mean_activity', sa.Float(), server_default='0', nullable=False),
+        sa.Column('median_activity', sa.Float(), server_default='0', nullable=False),
+        sa.Column('p25_activity', sa.Float(), server_default='0', nullable=False),
+        sa.Column('p75_activity', sa.Float(), server_default='0', nullable=False),
+        sa.Column('p90_activity', sa.Float(), server_default='0', nullable=False),
+        sa.Column('computed_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['offering_id'], ['course_offerings.offering_id'], ),
+        sa.PrimaryKeyConstraint('stats_id'),
+        sa.UniqueConstraint('offering_id', name='unique_offering_stats')
+        )
+
+
+def downgrade():
+    op.drop_table('offering_engagement_stats')
+    op.drop_table('latest_predictions')
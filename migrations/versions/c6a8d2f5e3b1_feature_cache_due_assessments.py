@@ -0,0 +1,35 @@
+"""feature cache watermark covers due assessments
+
+Revision ID: c6a8d2f5e3b1
+Revises: b9c3e6a2d4f1
+Create Date: 2026-10-18 14:48:09.227561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a8d2f5e3b1'
+down_revision = 'b9c3e6a2d4f1'
+branch_labels = None
+depends_on = None
+
+
+DUE_ASSESSMENT_COLUMNS = ('due_assessments', 'max_due_assessment_id')
+
+
+def upgrade():
+    # Cached rows without these read as no assessments due, so any offering
+    # with a due assessment recomputes its vectors on the next read
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('feature_cache')}
+    with op.batch_alter_table('feature_cache', schema=None) as batch_op:
+        for name in DUE_ASSESSMENT_COLUMNS:
+            if name not in columns:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('feature_cache', schema=None) as batch_op:
+        for name in reversed(DUE_ASSESSMENT_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,57 @@
+"""unique alert type names
+
+Revision ID: d3b7f1a9c2e4
+Revises: c1a4e2f7d9b3
+Create Date: 2026-10-18 09:47:05.532816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b7f1a9c2e4'
+down_revision = 'c1a4e2f7d9b3'
+branch_labels = None
+depends_on = None
+
+
+def _has_unique_type_name(inspector):
+    """Check whether some unique constraint or index already covers type_name alone"""
+    keys = inspector.get_unique_constraints('alert_types') + [
+        index for index in inspector.get_indexes('alert_types') if index.get('unique')
+    ]
+    return any(key['column_names'] == ['type_name'] for key in keys)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if _has_unique_type_name(sa.inspect(bind)):
+        return
+
+    # The alert type registry resolves names to a single type, so fold
+    # duplicate names into their oldest row before enforcing uniqueness
+    op.execute("""
+        UPDATE alerts a
+        JOIN alert_types t ON t.type_id = a.type_id
+        JOIN (
+            SELECT type_name, MIN(type_id) AS keep_id
+            FROM alert_types
+            GROUP BY type_name
+            HAVING COUNT(*) > 1
+        ) k ON k.type_name = t.type_name
+        SET a.type_id = k.keep_id
+        WHERE a.type_id <> k.keep_id
+    """)
+    op.execute("""
+        DELETE t FROM alert_types t
+        JOIN alert_types older ON older.type_name = t.type_name AND older.type_id < t.type_id
+    """)
+
+    with op.batch_alter_table('alert_types', schema=None) as batch_op:
+        batch_op.create_unique_constraint('unique_type_name', ['type_name'])
+
+
+def downgrade():
+    with op.batch_alter_table('alert_types', schema=None) as batch_op:
+        batch_op.drop_constraint('unique_type_name', type_='unique')
@@ -0,0 +1,38 @@
+"""keyset pagination indexes for predictions and alerts
+
+Revision ID: e8c2a5d1f6b7
+Revises: d3b7f1a9c2e4
+Create Date: 2026-10-18 10:05:51.264390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c2a5d1f6b7'
+down_revision = 'd3b7f1a9c2e4'
+branch_labels = None
+depends_on = None
+
+
+# table -> (index name, columns) matching the (date, id) keyset order
+KEYSET_INDEXES = {
+    'predictions': ('idx_date_id', ['prediction_date', 'prediction_id']),
+    'alerts': ('idx_triggered_id', ['triggered_date', 'alert_id']),
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, (name, columns) in KEYSET_INDEXES.items():
+        if any(index['name'] == name for index in inspector.get_indexes(table)):
+            continue
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    for table, (name, _) in KEYSET_INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
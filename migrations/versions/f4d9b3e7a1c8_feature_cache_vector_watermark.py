@@ -0,0 +1,49 @@
+"""feature cache vectors with a data watermark
+
+Revision ID: f4d9b3e7a1c8
+Revises: e8c2a5d1f6b7
+Create Date: 2026-10-18 10:31:27.904615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d9b3e7a1c8'
+down_revision = 'e8c2a5d1f6b7'
+branch_labels = None
+depends_on = None
+
+
+WATERMARK_COLUMNS = (
+    ('attendance_rows', sa.Integer()),
+    ('attendance_id_sum', sa.BigInteger()),
+    ('activity_rows', sa.Integer()),
+    ('activity_id_sum', sa.BigInteger()),
+    ('submission_rows', sa.Integer()),
+    ('submission_id_sum', sa.BigInteger()),
+)
+
+# Newest-id watermark columns of earlier builds; a late commit with a lower id hid behind them
+MAX_ID_COLUMNS = ('max_attendance_id', 'max_activity_id', 'max_submission_id')
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('feature_cache')}
+    with op.batch_alter_table('feature_cache', schema=None) as batch_op:
+        if 'feature_vector' not in columns:
+            batch_op.add_column(sa.Column('feature_vector', sa.JSON(), nullable=True))
+        for name, type_ in WATERMARK_COLUMNS:
+            if name not in columns:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+        for name in MAX_ID_COLUMNS:
+            if name in columns:
+                batch_op.drop_column(name)
+
+
+def downgrade():
+    with op.batch_alter_table('feature_cache', schema=None) as batch_op:
+        for name, _ in reversed(WATERMARK_COLUMNS):
+            batch_op.drop_column(name)
+        batch_op.drop_column('feature_vector')
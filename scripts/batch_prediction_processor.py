@@ -4,6 +4,7 @@ Batch prediction processor using ML Feature Staging table
 """
 import sys
 import os
+import time
 from datetime import datetime, date, timedelta
 
 # Add project root to path
@@ -11,11 +12,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from backend.app import create_app
 from backend.extensions import db
-from backend.models.prediction import MLFeatureStaging, Prediction
+from backend.models.prediction import MLFeatureStaging, Prediction, LatestPrediction
+from backend.models.alert import Alert
+from backend.models.system import ModelVersion
 from backend.models.academic import Enrollment
 from backend.services.feature_calculator_service import FeatureCalculator
 from backend.services.prediction_service import PredictionService
 import logging
+import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -65,39 +69,130 @@ def stage_features_for_all_enrollments():
         db.session.commit()
         logger.info("Feature staging complete")
 
-def process_staged_predictions(batch_size=10):
-    """Process staged features and generate predictions"""
+def process_staged_predictions(batch_size=1000, max_rows=None):
+    """
+    Score staged features page by page without recomputing them
+    
+    Each page of unprocessed staging rows becomes one feature matrix built
+    from feature_data, one vectorized model call, one bulk insert of
+    predictions (and at-risk alerts) and one UPDATE marking the page
+    processed. Rows whose feature_data lacks model features are left
+    unprocessed and reported.
+    """
     app = create_app()
     
     with app.app_context():
         prediction_service = PredictionService()
+        feature_names = prediction_service.feature_calculator.get_feature_names()
         
-        # Get unprocessed staged features
-        staged_features = MLFeatureStaging.query.filter_by(
-            is_processed=False
-        ).limit(batch_size).all()
-        
-        logger.info(f"Processing {len(staged_features)} staged predictions")
+        last_id = 0
+        processed = 0
+        skipped = 0
+        started = time.monotonic()
         
-        for staged in staged_features:
+        while max_rows is None or processed < max_rows:
+            limit = batch_size if max_rows is None else min(batch_size, max_rows - processed)
+            page = db.session.query(
+                MLFeatureStaging.staging_id,
+                MLFeatureStaging.enrollment_id,
+                MLFeatureStaging.feature_data
+            ).filter(
+                MLFeatureStaging.is_processed == False,
+                MLFeatureStaging.staging_id > last_id
+            ).order_by(MLFeatureStaging.staging_id).limit(limit).all()
+            
+            if not page:
+                break
+            last_id = page[-1].staging_id
+            
             try:
-                # Generate prediction using staged features
-                prediction_result = prediction_service.generate_prediction(
-                    staged.enrollment_id,
-                    save=True
-                )
-                
-                # Mark as processed
-                staged.mark_processed()
-                
-                logger.info(f"Processed prediction for enrollment {staged.enrollment_id}: "
-                          f"{prediction_result['predicted_grade']} "
-                          f"(confidence: {prediction_result['confidence_score']:.2f})")
-                
+                scored, invalid = score_staged_page(prediction_service, feature_names, page)
+                db.session.commit()
             except Exception as e:
-                logger.error(f"Error processing staged prediction {staged.staging_id}: {str(e)}")
+                db.session.rollback()
+                logger.error(f"Error processing staged page ending at {last_id}: {str(e)}")
+                continue
+            
+            processed += scored
+            skipped += invalid
+            elapsed = time.monotonic() - started
+            logger.info(f"Processed {processed} staged predictions "
+                        f"({processed / elapsed if elapsed > 0 else 0:.0f} rows/sec)")
         
-        logger.info("Batch processing complete")
+        logger.info(f"Batch processing complete: {processed} scored, {skipped} skipped")
+        return processed
+
+def score_staged_page(prediction_service, feature_names, page):
+    """
+    Score one page of staging rows and write the results in bulk
+    
+    Returns:
+        Tuple of (rows scored, rows skipped for incomplete feature_data)
+    """
+    valid = []
+    rows = []
+    for staged in page:
+        feature_data = staged.feature_data or {}
+        if not all(name in feature_data for name in feature_names):
+            logger.warning(f"Staged row {staged.staging_id} is missing features, skipping")
+            continue
+        valid.append(staged)
+        rows.append([feature_data[name] for name in feature_names])
+    
+    if not valid:
+        return 0, len(page)
+    
+    features = np.asarray(rows, dtype=float)
+    grades, confidences, risk_levels = prediction_service.model_service.predict_matrix(features)
+    model_info = prediction_service.model_service.get_model_info()
+    
+    model_version = ModelVersion.query.filter_by(is_active=True).first()
+    model_accuracy = model_version.accuracy if model_version and model_version.accuracy else None
+    
+    prediction_date = datetime.now()
+    predictions = []
+    alerts = []
+    alert_type = None
+    
+    for row, staged in enumerate(valid):
+        predictions.append({
+            'enrollment_id': staged.enrollment_id,
+            'prediction_date': prediction_date,
+            'predicted_grade': grades[row],
+            'confidence_score': float(confidences[row]),
+            'risk_level': risk_levels[row],
+            'model_version': model_info['version'],
+            'feature_snapshot': dict(zip(feature_names, features[row].tolist())),
+            'model_accuracy': model_accuracy,
+            'feature_version': 'v1.0'
+        })
+        
+        if risk_levels[row] in ['medium', 'high']:
+            if alert_type is None:
+                alert_type = prediction_service._get_or_create_alert_type(risk_levels[row])
+            alerts.append({
+                'enrollment_id': staged.enrollment_id,
+                'type_id': alert_type.type_id,
+                'triggered_date': prediction_date,
+                'alert_message': f"Student predicted to {grades[row]} with {risk_levels[row]} risk level",
+                'severity': alert_type.severity
+            })
+    
+    # Core inserts bypass the ORM flush, so latest-prediction pointers are refreshed here
+    connection = db.session.connection()
+    connection.execute(Prediction.__table__.insert(), predictions)
+    if alerts:
+        connection.execute(Alert.__table__.insert(), alerts)
+    LatestPrediction.refresh(connection, {staged.enrollment_id for staged in valid})
+    
+    staging = MLFeatureStaging.__table__
+    connection.execute(
+        staging.update().where(
+            staging.c.staging_id.in_([staged.staging_id for staged in valid])
+        ).values(is_processed=True)
+    )
+    
+    return len(valid), len(page) - len(valid)
 
 def cleanup_old_staging_records(days_to_keep=30):
     """Clean up old processed staging records"""
@@ -128,8 +223,10 @@ if __name__ == '__main__':
                        help='Stage features for all enrollments')
     parser.add_argument('--process', action='store_true', 
                        help='Process staged predictions')
-    parser.add_argument('--batch-size', type=int, default=10,
-                       help='Batch size for processing')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                       help='Staged rows scored per page')
+    parser.add_argument('--max-rows', type=int, default=None,
+                       help='Stop after scoring this many staged rows')
     parser.add_argument('--cleanup', action='store_true',
                        help='Clean up old staging records')
     parser.add_argument('--all', action='store_true',
@@ -140,14 +237,14 @@ if __name__ == '__main__':
     if args.all:
         logger.info("Running complete batch prediction pipeline")
         stage_features_for_all_enrollments()
-        process_staged_predictions(args.batch_size)
+        process_staged_predictions(args.batch_size, args.max_rows)
         cleanup_old_staging_records()
     else:
         if args.stage:
             stage_features_for_all_enrollments()
         
         if args.process:
-            process_staged_predictions(args.batch_size)
+            process_staged_predictions(args.batch_size, args.max_rows)
         
         if args.cleanup:
             cleanup_old_staging_records()
@@ -64,4 +64,42 @@ CREATE TABLE IF NOT EXISTS lms_daily_summary (
     FOREIGN KEY (enrollment_id) REFERENCES enrollments(enrollment_id),
     UNIQUE KEY unique_daily (enrollment_id, summary_date),
     INDEX idx_date (summary_date)
-);
\ No newline at end of file
+);
+
+-- Running activity aggregates per enrollment (for incremental feature calculation)
+CREATE TABLE IF NOT EXISTS activity_accumulators (
+    accumulator_id INT PRIMARY KEY AUTO_INCREMENT,
+    enrollment_id INT NOT NULL,
+    course_start_date DATE NOT NULL,
+    daily_clicks JSON NOT NULL, -- {day offset: clicks}
+    weekly_clicks JSON NOT NULL, -- {week offset: clicks}
+    site_counts JSON NOT NULL, -- {id_site: contributing records}
+    unnamed_sites INT DEFAULT 0, -- Activities without a resource_id, one site each
+    sum_x DOUBLE DEFAULT 0,
+    sum_y DOUBLE DEFAULT 0,
+    sum_xy DOUBLE DEFAULT 0,
+    sum_xx DOUBLE DEFAULT 0,
+    activity_count INT DEFAULT 0, -- Source row fingerprint
+    attendance_count INT DEFAULT 0,
+    attendance_clicks INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(enrollment_id),
+    UNIQUE KEY unique_accumulator (enrollment_id)
+);
+
+-- Rolling per-offering engagement baseline (refreshed nightly)
+CREATE TABLE IF NOT EXISTS offering_engagement_stats (
+    stats_id INT PRIMARY KEY AUTO_INCREMENT,
+    offering_id INT NOT NULL,
+    stats_date DATE NOT NULL, -- Last day of the window
+    window_days INT NOT NULL DEFAULT 7,
+    enrollment_count INT NOT NULL DEFAULT 0,
+    mean_activity DOUBLE NOT NULL DEFAULT 0, -- Per enrollment, per active day
+    median_activity DOUBLE NOT NULL DEFAULT 0,
+    p25_activity DOUBLE NOT NULL DEFAULT 0,
+    p75_activity DOUBLE NOT NULL DEFAULT 0,
+    p90_activity DOUBLE NOT NULL DEFAULT 0,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (offering_id) REFERENCES course_offerings(offering_id),
+    UNIQUE KEY unique_offering_stats (offering_id)
+);
@@ -8,10 +8,21 @@ CREATE TABLE IF NOT EXISTS predictions (
     risk_level ENUM('low', 'medium', 'high') NOT NULL,
     model_version VARCHAR(20) NOT NULL,
     feature_snapshot JSON NULL, -- Store features used for prediction
+    feature_hash VARCHAR(40) NULL, -- SHA-1 of the feature vector, for the prediction memo
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (enrollment_id) REFERENCES enrollments(enrollment_id),
     INDEX idx_enrollment_date (enrollment_id, prediction_date),
-    INDEX idx_risk_level (risk_level)
+    INDEX idx_risk_level (risk_level),
+    INDEX idx_date_id (prediction_date, prediction_id)
+);
+
+-- Newest prediction per enrollment (maintained by the application on flush)
+CREATE TABLE IF NOT EXISTS latest_predictions (
+    enrollment_id INT PRIMARY KEY,
+    prediction_id INT NOT NULL,
+    prediction_date DATETIME NOT NULL,
+    FOREIGN KEY (enrollment_id) REFERENCES enrollments(enrollment_id),
+    INDEX idx_prediction (prediction_id)
 );
 
 -- Feature cache (for performance)
@@ -29,6 +40,15 @@ CREATE TABLE IF NOT EXISTS feature_cache (
     study_consistency_score DECIMAL(5,2),
     last_login_days_ago INT,
     total_study_minutes INT,
+    feature_vector JSON NULL, -- Full model feature vector by name
+    attendance_rows INT NULL, -- Data watermark of the vector: row count and id sum per source
+    attendance_id_sum BIGINT NULL,
+    activity_rows INT NULL,
+    activity_id_sum BIGINT NULL,
+    submission_rows INT NULL,
+    submission_id_sum BIGINT NULL,
+    due_assessments INT NULL, -- Assessments of the offering due so far: count and newest id
+    max_due_assessment_id INT NULL,
     calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (enrollment_id) REFERENCES enrollments(enrollment_id),
     UNIQUE KEY unique_cache (enrollment_id, feature_date),
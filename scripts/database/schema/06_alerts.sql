@@ -3,7 +3,8 @@ CREATE TABLE IF NOT EXISTS alert_types (
     type_id INT PRIMARY KEY AUTO_INCREMENT,
     type_name VARCHAR(50) NOT NULL,
     severity ENUM('info', 'warning', 'critical') NOT NULL,
-    description TEXT
+    description TEXT,
+    UNIQUE KEY unique_type_name (type_name)
 );
 
 -- Alerts
@@ -23,7 +24,8 @@ CREATE TABLE IF NOT EXISTS alerts (
     FOREIGN KEY (type_id) REFERENCES alert_types(type_id),
     INDEX idx_enrollment (enrollment_id),
     INDEX idx_unread (is_read, enrollment_id),
-    INDEX idx_severity (severity)
+    INDEX idx_severity (severity),
+    INDEX idx_triggered_id (triggered_date, alert_id)
 );
 
 -- Interventions